@@ -1,14 +1,18 @@
-import itertools
 import json
 import logging
 import os
 import platform
+import queue
 import random
 import shutil
 import signal
 import sys
+import threading
 import time
+import traceback
 import typing
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
@@ -20,12 +24,15 @@ from mdc.core.core import core_main, core_main_no_net_op, debug_print
 from mdc.core.scraper import get_data_from_json
 from mdc.file.file_utils import (
     create_failed_folder,
+    finishMovie,
     mode3_should_execute_by_nfo,
     moveFailedFolder,
     rm_empty_folder,
 )
 from mdc.file.movie_list import movie_lists
+from mdc.file.watcher import movie_watcher, watch_movies
 from mdc.utils.http import get_html
+from mdc.utils.logger import grouped_output
 from mdc.utils.mapping_organizer import run_mode4
 from mdc.utils.number_parser import get_number
 from mdc.utils.system import WindowsInhibitor
@@ -212,7 +219,8 @@ def sigdebug_handler(*args) -> None:
     print(f"[!]Debug {('oFF', 'On')[int(conf.debug())]}")
 
 
-def create_data_and_move(movie_path: str, zero_op: bool, no_net_op: bool, oCC: typing.Optional[OpenCC]) -> None:
+def create_data_and_move(movie_path: str, zero_op: bool, no_net_op: bool, oCC: typing.Optional[OpenCC]) -> bool:
+    """处理一部影片, 成功(包括已有 NFO 跳过)返回 True, 失败或试运行返回 False"""
     # Normalized number, eg: 111xxx-222.mp4 -> xxx-222.mp4
     debug = config.getInstance().debug()
     n_number = get_number(debug, os.path.basename(movie_path))
@@ -221,12 +229,12 @@ def create_data_and_move(movie_path: str, zero_op: bool, no_net_op: bool, oCC: t
     if debug is True:
         print(f"[!] [{n_number}] As Number Processing for '{movie_path}'")
         if zero_op:
-            return
+            return False
         if config.getInstance().main_mode() == 3 and not no_net_op:
             nfo_path = str(Path(movie_path).with_suffix(".nfo"))
             if not mode3_should_execute_by_nfo(nfo_path):
                 print(f"[!]Skip by existing NFO: '{movie_path}'")
-                return
+                return True
         if n_number:
             if no_net_op:
                 core_main_no_net_op(movie_path, n_number)
@@ -234,18 +242,18 @@ def create_data_and_move(movie_path: str, zero_op: bool, no_net_op: bool, oCC: t
                 core_main(movie_path, n_number, oCC)
         else:
             print("[-] number empty ERROR")
-            moveFailedFolder(movie_path)
+            moveFailedFolder(movie_path, "number empty")
         print("[*]======================================================")
     else:
         try:
             print(f"[!] [{n_number}] As Number Processing for '{movie_path}'")
             if zero_op:
-                return
+                return False
             if config.getInstance().main_mode() == 3 and not no_net_op:
                 nfo_path = str(Path(movie_path).with_suffix(".nfo"))
                 if not mode3_should_execute_by_nfo(nfo_path):
                     print(f"[!]Skip by existing NFO: '{movie_path}'")
-                    return
+                    return True
             if n_number:
                 if no_net_op:
                     core_main_no_net_op(movie_path, n_number)
@@ -259,9 +267,11 @@ def create_data_and_move(movie_path: str, zero_op: bool, no_net_op: bool, oCC: t
             print("[-]", err)
 
             try:
-                moveFailedFolder(movie_path)
+                moveFailedFolder(movie_path, str(err))
             except Exception as err:
                 print("[!]", err)
+                return False
+    return finishMovie(movie_path)
 
 
 def create_data_and_move_with_custom_number(
@@ -295,6 +305,80 @@ def create_data_and_move_with_custom_number(
                 print("[!]", err)
 
 
+def sleep_between_movies() -> None:
+    """影片间等待。开启 [rate_limit] 后由 mdc.utils.http 按站点限速, 不再固定等待"""
+    conf = config.getInstance()
+    if conf.rate_limit_switch():
+        return
+    time.sleep(random.randint(conf.sleep(), conf.sleep() + 2))
+
+
+def progress_text(count: int, count_all_int: typing.Optional[int], count_all: str) -> str:
+    if count_all_int:
+        percentage = str(count / count_all_int * 100)[:4] + "%"
+        progress_str = "- " + percentage + " [" + str(count) + "/" + count_all + "] -"
+    else:
+        progress_str = "- [" + str(count) + "/" + count_all + "] -"
+    return "[!] {:>30}{:>21}".format(progress_str, time.strftime("%H:%M:%S"))
+
+
+def create_data_and_move_concurrently(
+    movie_iter: typing.Iterable[str],
+    count_all_int: typing.Optional[int],
+    count_all: str,
+    stop_count: int,
+    zero_op: bool,
+    no_net_op: bool,
+    oCC: typing.Optional[OpenCC],
+    mark_done: typing.Optional[typing.Callable[[str], None]] = None,
+) -> None:
+    """
+    多线程模式: 用有界线程池同时处理多部影片
+
+    - 每个线程调用 create_data_and_move 时都会新建自己的 Scraping 对象, 刮削状态互不共享
+    - 同一番号的文件(例如 -CD1/-CD2 分段)由番号锁保证按顺序处理, 避免同时写入相同的封面和目录
+    - 每部影片的输出在处理完成后整体写入日志, 不会与其他线程交错
+
+    :param mark_done: 影片处理成功后调用, 用于记入增量扫描索引
+    """
+    conf = config.getInstance()
+    workers = conf.concurrent_movies()
+    # 限制已提交但未完成的任务数, movie_iter 仍按需惰性读取
+    pending = threading.BoundedSemaphore(workers * 2)
+    number_locks = defaultdict(threading.Lock)
+    number_locks_guard = threading.Lock()
+
+    def _worker(movie_path: str, progress: str) -> None:
+        try:
+            number_key = (get_number(False, os.path.basename(movie_path)) or movie_path).upper()
+            with number_locks_guard:
+                number_lock = number_locks[number_key]
+            with number_lock:
+                with grouped_output():
+                    print(progress)
+                    try:
+                        if create_data_and_move(movie_path, zero_op, no_net_op, oCC) and mark_done is not None:
+                            mark_done(movie_path)
+                    except Exception:
+                        # debug模式下 create_data_and_move 不捕获异常, 在这里输出以免被线程池吞掉
+                        print(f"[-] [{movie_path}] ERROR:")
+                        traceback.print_exc()
+            # 释放番号锁后再等待, 同一番号的其他分段不必等这段时间
+            if not zero_op:
+                sleep_between_movies()
+        finally:
+            pending.release()
+
+    print(f"[+]Multi threading with {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mdc-movie") as pool:
+        for count, movie_path in enumerate(movie_iter, start=1):
+            pending.acquire()
+            pool.submit(_worker, movie_path, progress_text(count, count_all_int, count_all))
+            if count >= stop_count:
+                print("[!]Stop counter triggered!")
+                break
+
+
 def main(args: tuple) -> typing.Optional[Path]:
     (
         single_file_path,
@@ -383,7 +467,8 @@ def main(args: tuple) -> typing.Optional[Path]:
         for i in search_list:
             json_data = get_data_from_json(i, oCC, None, None)
             debug_print(json_data)
-            time.sleep(int(config.getInstance().sleep()))
+            if not conf.rate_limit_switch():
+                time.sleep(int(conf.sleep()))
         os_inhibitor.uninhibit()
         os._exit(0)
 
@@ -413,44 +498,60 @@ def main(args: tuple) -> typing.Optional[Path]:
             stop_count = conf.stop_counter()
             if stop_count < 1:
                 stop_count = 999999
+            # 监视模式在首次扫描前开始监视, 扫描期间新出现的影片也会处理
+            watcher = None
+            if conf.watch_mode() and not zero_op:
+                watcher = movie_watcher(folder_path, regexstr)
+                watcher.start()
             movie_iter = movie_lists(folder_path, regexstr)
-            peek_limit = 100
-            peeked_movies = list(itertools.islice(movie_iter, peek_limit))
-            movie_iter = itertools.chain(peeked_movies, movie_iter)
-
             count = 0
-            count_all_int = None
-            if stop_count != 999999:
-                if len(peeked_movies) < stop_count:
-                    count_all_int = len(peeked_movies)
-                elif stop_count <= peek_limit:
-                    count_all_int = stop_count
-            elif len(peeked_movies) < peek_limit:
-                count_all_int = len(peeked_movies)
-
-            count_all = str(count_all_int) if count_all_int is not None else "99+"
+            count_all_int = min(movie_iter.total(), stop_count)
+            count_all = str(count_all_int)
             print("[+]Find", count_all, "movies.")
             print("[*]======================================================")
 
-            for movie_path in movie_iter:  # 遍历电影列表 交给core处理
-                count = count + 1
-                if count_all_int:
-                    percentage = str(count / count_all_int * 100)[:4] + "%"
-                    progress_str = "- " + percentage + " [" + str(count) + "/" + count_all + "] -"
-                else:
-                    progress_str = "- [" + str(count) + "/" + count_all + "] -"
-                print(
-                    "[!] {:>30}{:>21}".format(
-                        progress_str,
-                        time.strftime("%H:%M:%S"),
-                    )
+            if conf.multi_threading():
+                create_data_and_move_concurrently(
+                    movie_iter, count_all_int, count_all, stop_count, zero_op, no_net_op, oCC, movie_iter.mark_done
                 )
-                create_data_and_move(movie_path, zero_op, no_net_op, oCC)
-                if count >= stop_count:
-                    print("[!]Stop counter triggered!")
-                    break
-                sleep_seconds = random.randint(conf.sleep(), conf.sleep() + 2)
-                time.sleep(sleep_seconds)
+            else:
+                for movie_path in movie_iter:  # 遍历电影列表 交给core处理
+                    count = count + 1
+                    print(progress_text(count, count_all_int, count_all))
+                    if create_data_and_move(movie_path, zero_op, no_net_op, oCC):
+                        movie_iter.mark_done(movie_path)
+                    if count >= stop_count:
+                        print("[!]Stop counter triggered!")
+                        break
+                    sleep_between_movies()
+            # 试运行(-z)时影片未被处理, 不更新增量扫描索引
+            if not zero_op:
+                movie_iter.save_index()
+
+            # 监视模式: 同一进程内继续处理新影片, 会话、缓存和映射表保持加载
+            if watcher is not None:
+                # 首次扫描已经交给处理的影片不再处理
+                watcher.mark_known(movie_iter.taken())
+                new_movies: typing.Optional[queue.Queue] = None
+                if conf.multi_threading():
+                    # 多线程模式下新影片交给同一个有界线程池处理
+                    new_movies = queue.Queue()
+                    threading.Thread(
+                        target=create_data_and_move_concurrently,
+                        args=(iter(new_movies.get, None), None, "?", 999999, zero_op, no_net_op, oCC),
+                        name="mdc-watch",
+                        daemon=True,
+                    ).start()
+
+                def _process_new_movie(movie_path: str) -> None:
+                    print("[*]======================================================")
+                    print(f"[+]New movie '{movie_path}'")
+                    if new_movies is not None:
+                        new_movies.put(movie_path)
+                    else:
+                        create_data_and_move(movie_path, zero_op, no_net_op, oCC)
+
+                watch_movies(folder_path, _process_new_movie, regexstr, watcher=watcher)
 
     end_time = time.time()
     print("[+]Finish at", time.strftime("%Y-%m-%d %H:%M:%S"))
@@ -81,7 +81,7 @@ def argparse_function(
         "-i",
         "--ignore-failed-list",
         action="store_true",
-        help="Ignore failed list '{}'".format(os.path.join(os.path.abspath(conf.failed_folder()), "failed_list.txt")),
+        help="Ignore failed list '{}'".format(os.path.join(os.path.abspath(conf.failed_folder()), "failed_list.db")),
     )
     parser.add_argument(
         "-a",
@@ -101,6 +101,12 @@ def argparse_function(
         action="store_true",
         help="No network query, do not get metadata, for cover cropping purposes, only takes effect when main mode is 3.",
     )
+    parser.add_argument(
+        "-F",
+        "--force-refresh",
+        action="store_true",
+        help="Ignore metadata in local database, fetch from websites and update it.",
+    )
     parser.add_argument(
         "-w",
         "--website",
@@ -132,6 +138,12 @@ def argparse_function(
         help="""Only show job list of files and numbers, and **NO** actual operation
         is performed. It may help you correct wrong numbers before real job.""",
     )
+    parser.add_argument(
+        "-W",
+        "--watch",
+        action="store_true",
+        help="Keep running after the analysis folder is processed, and process new movies as they arrive.",
+    )
     parser.add_argument("-v", "--version", action="version", version=ver)
     parser.add_argument("-s", "--search", default="", nargs="?", help="Search number")
     parser.add_argument("-ss", "--specified-source", default="", nargs="?", help="specified Source.")
@@ -158,6 +170,8 @@ def argparse_function(
     set_natural_number_or_none("common:nfo_skip_days", args.days)
     set_natural_number_or_none("advenced_sleep:stop_counter", args.cnt)
     set_bool_or_none("common:ignore_failed_list", args.ignore_failed_list)
+    set_bool_or_none("database:refresh", args.force_refresh)
+    set_bool_or_none("common:watch_mode", args.watch)
     set_str_or_none("advenced_sleep:rerun_delay", args.delaytm)
     set_str_or_none("priority:website", args.site)
     if isinstance(args.dnimg, bool) and args.dnimg:
@@ -190,6 +190,25 @@ class Config:
     def link_mode(self) -> int:
         return self.conf.getint("common", "link_mode")
 
+    def scan_workers(self) -> int:
+        return max(1, self.conf.getint("common", "scan_workers", fallback=8))
+
+    def incremental_scan(self) -> bool:
+        return self.conf.getboolean("common", "incremental_scan", fallback=False)
+
+    def scan_index_file(self) -> str:
+        value = self.conf.get("common", "scan_index_file", fallback="")
+        return value or str(Path.home() / ".local/share/mdc/scan_index.db")
+
+    def watch_mode(self) -> bool:
+        return self.conf.getboolean("common", "watch_mode", fallback=False)
+
+    def watch_settle(self) -> float:
+        return max(0.0, self.conf.getfloat("common", "watch_settle", fallback=10))
+
+    def watch_poll_interval(self) -> float:
+        return max(1.0, self.conf.getfloat("common", "watch_poll_interval", fallback=5))
+
     def scan_hardlink(self) -> bool:
         return self.conf.getboolean("common", "scan_hardlink", fallback=False)  # 未找到配置选项,默认不刮削
 
@@ -205,6 +224,11 @@ class Config:
     def multi_threading(self) -> bool:
         return self.conf.getboolean("common", "multi_threading")
 
+    def concurrent_movies(self) -> int:
+        """多线程模式下同时处理的影片数"""
+        v = self.conf.getint("common", "concurrent_movies", fallback=4)
+        return v if v > 0 else 1
+
     def del_empty_folder(self) -> bool:
         return self.conf.getboolean("common", "del_empty_folder")
 
@@ -214,9 +238,18 @@ class Config:
     def ignore_failed_list(self) -> bool:
         return self.conf.getboolean("common", "ignore_failed_list")
 
+    def failed_retry_days(self) -> float:
+        return self.conf.getfloat("common", "failed_retry_days", fallback=1)
+
+    def failed_retry_max_days(self) -> float:
+        return self.conf.getfloat("common", "failed_retry_max_days", fallback=30)
+
     def download_only_missing_images(self) -> bool:
         return self.conf.getboolean("common", "download_only_missing_images")
 
+    def image_store(self) -> bool:
+        return self.conf.getboolean("common", "image_store", fallback=True)
+
     def mapping_table_validity(self) -> int:
         return self.conf.getint("common", "mapping_table_validity")
 
@@ -253,6 +286,24 @@ class Config:
     def is_trailer(self) -> bool:
         return self.conf.getboolean("trailer", "switch")
 
+    def trailer_segments(self) -> int:
+        """预告片分段下载的段数, <=1 表示单连接下载"""
+        return self.conf.getint("trailer", "segments", fallback=4)
+
+    def trailer_host_connections(self) -> int:
+        """同一站点同时下载的最大连接数"""
+        return max(1, self.conf.getint("trailer", "host_connections", fallback=4))
+
+    def trailer_min_size(self) -> int:
+        """小于该大小(MB)的预告片不分段"""
+        return self.conf.getint("trailer", "min_size", fallback=8)
+
+    def download_workers(self) -> int:
+        return max(1, self.conf.getint("download", "workers", fallback=10))
+
+    def download_host_workers(self) -> int:
+        return max(1, self.conf.getint("download", "host_workers", fallback=4))
+
     def is_watermark(self) -> bool:
         return self.conf.getboolean("watermark", "switch")
 
@@ -326,6 +377,59 @@ class Config:
             return False
         return value
 
+    def http_pool_connections(self) -> int:
+        return max(1, self.conf.getint("proxy", "pool_connections", fallback=20))
+
+    def http_pool_maxsize(self) -> int:
+        return max(1, self.conf.getint("proxy", "pool_maxsize", fallback=10))
+
+    def http_cache_switch(self) -> bool:
+        return self.conf.getboolean("http_cache", "switch", fallback=False)
+
+    def http_cache_folder(self) -> str:
+        value = self.conf.get("http_cache", "folder", fallback="")
+        return value or str(Path.home() / ".local/share/mdc/http_cache")
+
+    def http_cache_ttl(self) -> float:
+        return self.conf.getfloat("http_cache", "ttl", fallback=72)
+
+    def http_cache_hosts(self) -> str:
+        return self.conf.get("http_cache", "hosts", fallback="")
+
+    def http_cache_max_size(self) -> int:
+        return self.conf.getint("http_cache", "max_size", fallback=500)
+
+    def database_switch(self) -> bool:
+        return self.conf.getboolean("database", "switch", fallback=False)
+
+    def database_file(self) -> str:
+        value = self.conf.get("database", "file", fallback="")
+        return value or str(Path.home() / ".local/share/mdc/metadata.db")
+
+    def database_ttl(self) -> float:
+        return self.conf.getfloat("database", "ttl", fallback=30)
+
+    def database_refresh(self) -> bool:
+        return self.conf.getboolean("database", "refresh", fallback=False)
+
+    def database_miss_ttl(self) -> float:
+        return self.conf.getfloat("database", "miss_ttl", fallback=7)
+
+    def database_route_samples(self) -> int:
+        return self.conf.getint("database", "route_samples", fallback=3)
+
+    def rate_limit_switch(self) -> bool:
+        return self.conf.getboolean("rate_limit", "switch", fallback=True)
+
+    def rate_limit_rate(self) -> float:
+        return self.conf.getfloat("rate_limit", "rate", fallback=1.0)
+
+    def rate_limit_burst(self) -> int:
+        return self.conf.getint("rate_limit", "burst", fallback=3)
+
+    def rate_limit_hosts(self) -> str:
+        return self.conf.get("rate_limit", "hosts", fallback="")
+
     def media_type(self) -> str:
         return self.conf.get("media", "media_type")
 
@@ -374,6 +478,25 @@ class Config:
     def sources(self) -> str:
         return self.conf.get("priority", "website")
 
+    def concurrent_sources(self) -> int:
+        return max(0, self.conf.getint("priority", "concurrent", fallback=0))
+
+    def field_priority_switch(self) -> bool:
+        return self.conf.getboolean("field_priority", "switch", fallback=True)
+
+    def field_priority(self) -> typing.Dict[str, typing.List[str]]:
+        """
+        各字段的数据源优先级, 空列表表示使用主结果
+        未配置 cover 时沿用以前的规则: javdb 的封面有水印, 排在最后
+        """
+        sources = [s for s in self.sources().split(",") if s]
+        default_cover = ",".join([s for s in sources if s != "javdb"] + ["javdb"])
+        priority = {}
+        for field in ("cover", "outline", "actor_photo", "extrafanart", "trailer", "tag", "runtime"):
+            value = self.conf.get("field_priority", field, fallback=default_cover if field == "cover" else "")
+            priority[field] = [s.strip() for s in value.split(",") if s.strip()]
+        return priority
+
     def escape_literals(self) -> str:
         return self.conf.get("escape", "literals")
 
@@ -417,6 +540,10 @@ class Config:
     def storyline_mode(self) -> int:
         return 1 if self.conf.getint("storyline", "run_mode", fallback=1) > 0 else 0
 
+    def storyline_timeout(self) -> float:
+        """每个剧情简介站点最多等待的秒数, <=0 表示不限制"""
+        return self.conf.getfloat("storyline", "timeout", fallback=20)
+
     def cc_convert_mode(self) -> int:
         v = self.conf.getint("cc_convert", "mode", fallback=1)
         return v if v in (0, 1, 2) else 2 if v > 2 else 0
@@ -449,6 +576,13 @@ class Config:
     def download_actor_photo_for_kodi(self) -> bool:
         return self.conf.getboolean("actor_photo", "download_for_kodi", fallback=False)
 
+    def actor_photo_store_switch(self) -> bool:
+        return self.conf.getboolean("actor_photo", "store_switch", fallback=True)
+
+    def actor_photo_store_folder(self) -> str:
+        value = self.conf.get("actor_photo", "store_folder", fallback="")
+        return value or str(Path.home() / ".local/share/mdc/images")
+
     @staticmethod
     def _exit(sec: str) -> None:
         print("[-] Read config error! Please check the {} section in config.ini", sec)
@@ -467,15 +601,26 @@ class Config:
         conf.set(sec1, "success_output_folder", "JAV_output")
         conf.set(sec1, "link_mode", "0")
         conf.set(sec1, "scan_hardlink", "0")
+        conf.set(sec1, "scan_workers", "8")
+        conf.set(sec1, "incremental_scan", "0")
+        conf.set(sec1, "scan_index_file", "")
+        conf.set(sec1, "watch_mode", "0")
+        conf.set(sec1, "watch_settle", "10")
+        conf.set(sec1, "watch_poll_interval", "5")
         conf.set(sec1, "failed_move", "1")
         conf.set(sec1, "auto_exit", "0")
         conf.set(sec1, "translate_to_sc", "1")
+        conf.set(sec1, "multi_threading", "0")
+        conf.set(sec1, "concurrent_movies", "4")
         # actor_gender value: female or male or both or all(含人妖)
         conf.set(sec1, "actor_gender", "female")
         conf.set(sec1, "del_empty_folder", "1")
         conf.set(sec1, "nfo_skip_days", "30")
         conf.set(sec1, "ignore_failed_list", "0")
+        conf.set(sec1, "failed_retry_days", "1")
+        conf.set(sec1, "failed_retry_max_days", "30")
         conf.set(sec1, "download_only_missing_images", "1")
+        conf.set(sec1, "image_store", "1")
         conf.set(sec1, "mapping_table_validity", "7")
         conf.set(sec1, "jellyfin", "0")
         conf.set(sec1, "actor_only_tag", "0")
@@ -494,6 +639,32 @@ class Config:
         conf.set(sec3, "retry", "3")
         conf.set(sec3, "type", "socks5")
         conf.set(sec3, "cacert_file", "")
+        conf.set(sec3, "pool_connections", "20")
+        conf.set(sec3, "pool_maxsize", "10")
+
+        sec3_2 = "http_cache"
+        conf.add_section(sec3_2)
+        conf.set(sec3_2, "switch", "0")
+        conf.set(sec3_2, "folder", "")
+        conf.set(sec3_2, "ttl", "72")
+        conf.set(sec3_2, "hosts", "javdb:24,airav:168")
+        conf.set(sec3_2, "max_size", "500")
+
+        sec3_3 = "database"
+        conf.add_section(sec3_3)
+        conf.set(sec3_3, "switch", "1")
+        conf.set(sec3_3, "file", "")
+        conf.set(sec3_3, "ttl", "30")
+        conf.set(sec3_3, "refresh", "0")
+        conf.set(sec3_3, "miss_ttl", "7")
+        conf.set(sec3_3, "route_samples", "3")
+
+        sec3_1 = "rate_limit"
+        conf.add_section(sec3_1)
+        conf.set(sec3_1, "switch", "1")
+        conf.set(sec3_1, "rate", "1")
+        conf.set(sec3_1, "burst", "3")
+        conf.set(sec3_1, "hosts", "javdb:0.5:2,javbus:1:3,fanza:1:3,dmm:1:3,airav:1:3")
 
         sec4 = "Name_Rule"
         conf.add_section(sec4)
@@ -515,6 +686,14 @@ class Config:
             "website",
             "airav,javbus,javdb,fanza,xcity,mgstage,fc2,fc2club,avsox,jav321,xcity",
         )
+        conf.set(sec6, "concurrent", "3")
+
+        sec6_1 = "field_priority"
+        conf.add_section(sec6_1)
+        conf.set(sec6_1, "switch", "1")
+        conf.set(sec6_1, "cover", "airav,javbus,fanza,xcity,mgstage,fc2,avsox,jav321,javdb")
+        for field in ("outline", "actor_photo", "extrafanart", "trailer", "tag", "runtime"):
+            conf.set(sec6_1, field, "")
 
         sec7 = "escape"
         conf.add_section(sec7)
@@ -539,6 +718,14 @@ class Config:
         sec10 = "trailer"
         conf.add_section(sec10)
         conf.set(sec10, "switch", "0")
+        conf.set(sec10, "segments", "4")
+        conf.set(sec10, "host_connections", "4")
+        conf.set(sec10, "min_size", "8")
+
+        sec10_1 = "download"
+        conf.add_section(sec10_1)
+        conf.set(sec10_1, "workers", "10")
+        conf.set(sec10_1, "host_workers", "4")
 
         sec11 = "uncensored"
         conf.add_section(sec11)
@@ -572,6 +759,7 @@ class Config:
         conf.set(sec15, "uncensored_site", "3:58avgo")
         conf.set(sec15, "show_result", "0")
         conf.set(sec15, "run_mode", "1")
+        conf.set(sec15, "timeout", "20")
         conf.set(sec15, "cc_convert", "1")
 
         sec16 = "cc_convert"
@@ -597,6 +785,8 @@ class Config:
         sec20 = "actor_photo"
         conf.add_section(sec20)
         conf.set(sec20, "download_for_kodi", "0")
+        conf.set(sec20, "store_switch", "1")
+        conf.set(sec20, "store_folder", "")
 
         return conf
 
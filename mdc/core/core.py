@@ -24,7 +24,9 @@ from mdc.download.downloader import (
 from mdc.download.subtitles import download_subtitles
 
 # 导入拆分的模块
+from mdc.file.common_utils import unshare_file
 from mdc.file.file_utils import create_folder, moveFailedFolder
+from mdc.file.subtitle_index import get_subtitle_index, subtitle_key
 from mdc.image.imgproc import cutImage
 from mdc.utils import cn_space, get_html
 from mdc.utils.logger import warn
@@ -70,6 +72,8 @@ def add_mark_thread(pic_path, cn_sub, leak, uncensored, hack, _4k, iso):
         return
     img_pic = None
     try:
+        # 图片可能链接自图片库或同目录的其他图片, 水印只加在这一个文件上
+        unshare_file(pic_path)
         img_pic = Image.open(pic_path)
         # 获取自定义位置，取余配合pos达到顺时针添加的效果
         # 左上 0, 右上 1, 右下 2， 左下 3
@@ -207,7 +211,7 @@ def paste_file_to_folder(
 
     except FileExistsError as fee:
         print(f"[-]FileExistsError: {fee}")
-        moveFailedFolder(filepath)
+        moveFailedFolder(filepath, f"FileExistsError: {fee}")
         return
     except PermissionError:
         print("[-]Error! Please run as administrator!")
@@ -398,28 +402,57 @@ def core_main_no_net_op(movie_path, number):
         linkImage(path, number, part, leak_word, c_word, hack_word, ext)
 
 
+def _source_subtitles(filepath_obj: Path, sub_res) -> list:
+    """影片所在目录及其子目录中文件名前缀与影片相同的字幕. 扫描源文件夹时建立了字幕索引则直接查找, 不遍历目录"""
+    key = subtitle_key(filepath_obj.name)
+    index = get_subtitle_index()
+    if index is not None and index.covers(str(filepath_obj.parent)):
+        return [Path(p) for p in index.find(str(filepath_obj.parent), key)]
+    return [
+        subfile
+        for subfile in filepath_obj.parent.glob("**/*")
+        if subfile.is_file() and subfile.suffix.lower() in sub_res and subtitle_key(subfile.name) == key
+    ]
+
+
+def _dir_subtitles(path, sub_res) -> list:
+    """目录中(不含子目录)的字幕"""
+    index = get_subtitle_index()
+    if index is not None and index.covers(str(path)):
+        return [Path(p) for p in index.list_dir(str(path))]
+    try:
+        with os.scandir(path) as it:
+            return [
+                Path(entry.path)
+                for entry in it
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in sub_res
+            ]
+    except OSError:
+        return []
+
+
 def move_subtitles(filepath, path, multi_part, number, part, leak_word, c_word, hack_word) -> bool:
     filepath_obj = pathlib.Path(filepath)
     link_mode = config.getInstance().link_mode()
     sub_res = config.getInstance().sub_rule()
     result = False
-    for subfile in filepath_obj.parent.glob("**/*"):
-        if subfile.is_file() and subfile.suffix.lower() in sub_res:
-            if multi_part and part.lower() not in subfile.name.lower():
-                continue
-            if filepath_obj.stem.split(".")[0].lower() != subfile.stem.split(".")[0].lower():
-                continue
-            sub_targetpath = Path(path) / f"{number}{leak_word}{c_word}{hack_word}{''.join(subfile.suffixes)}"
-            if link_mode not in (1, 2):
-                shutil.move(str(subfile), str(sub_targetpath))
-                print(f"[+]Sub Moved!        {sub_targetpath.name}")
-                result = True
-            else:
-                shutil.copyfile(str(subfile), str(sub_targetpath))
-                print(f"[+]Sub Copied!       {sub_targetpath.name}")
-                result = True
-            if result:
-                break
+    for subfile in _source_subtitles(filepath_obj, sub_res):
+        if multi_part and part.lower() not in subfile.name.lower():
+            continue
+        sub_targetpath = Path(path) / f"{number}{leak_word}{c_word}{hack_word}{''.join(subfile.suffixes)}"
+        if link_mode not in (1, 2):
+            shutil.move(str(subfile), str(sub_targetpath))
+            print(f"[+]Sub Moved!        {sub_targetpath.name}")
+            index = get_subtitle_index()
+            if index is not None:
+                index.discard(str(subfile))
+            result = True
+        else:
+            shutil.copyfile(str(subfile), str(sub_targetpath))
+            print(f"[+]Sub Copied!       {sub_targetpath.name}")
+            result = True
+        if result:
+            break
     return result
 
 
@@ -427,22 +460,15 @@ def has_subtitles(filepath, path, multi_part, number, part, leak_word, c_word, h
     filepath_obj = pathlib.Path(filepath)
     sub_res = config.getInstance().sub_rule()
     prefix = f"{number}{leak_word}{c_word}{hack_word}".lower()
-    for subfile in Path(path).glob("*"):
-        if not subfile.is_file():
-            continue
-        if subfile.suffix.lower() not in sub_res:
-            continue
+    for subfile in _dir_subtitles(path, sub_res):
         if multi_part and part and part.lower() not in subfile.name.lower():
             continue
         if subfile.name.lower().startswith(prefix):
             return True
-    for subfile in filepath_obj.parent.glob("**/*"):
-        if subfile.is_file() and subfile.suffix.lower() in sub_res:
-            if multi_part and part.lower() not in subfile.name.lower():
-                continue
-            if filepath_obj.stem.split(".")[0].lower() != subfile.stem.split(".")[0].lower():
-                continue
-            return True
+    for subfile in _source_subtitles(filepath_obj, sub_res):
+        if multi_part and part.lower() not in subfile.name.lower():
+            continue
+        return True
     return False
 
 
@@ -467,7 +493,8 @@ def core_main(movie_path, number_th, oCC, specified_source=None, specified_url=N
 
     # Return if blank dict returned (data not found)
     if not json_data:
-        moveFailedFolder(movie_path)
+        sources = [specified_source] if specified_source else conf.sources().split(",")
+        moveFailedFolder(movie_path, "metadata not found", sources)
         return
 
     if json_data["number"] != number:
@@ -626,10 +653,6 @@ def core_main(movie_path, number_th, oCC, specified_source=None, specified_url=N
             bool(conf.face_uncensored_only() and not uncensored),
         )
 
-        # 兼容Jellyfin封面图文件名规则
-        if multi_part and conf.jellyfin_multi_part_fanart():
-            linkImage(path, number_th, part, leak_word, c_word, hack_word, ext)
-
         # 移动电影
         paste_file_to_folder(movie_path, path, multi_part, number, part, leak_word, c_word, hack_word)
 
@@ -654,6 +677,10 @@ def core_main(movie_path, number_th, oCC, specified_source=None, specified_url=N
                 iso,
             )
 
+        # 兼容Jellyfin封面图文件名规则, 在加水印之后建立链接, 水印加在独立的文件上
+        if multi_part and conf.jellyfin_multi_part_fanart():
+            linkImage(path, number_th, part, leak_word, c_word, hack_word, ext)
+
         # 最后输出.nfo元数据文件，以完成.nfo文件创建作为任务成功标志
         print_files(
             path,
@@ -376,4 +376,4 @@ def print_files(
             print("</movie>", file=code)
     except Exception as e:
         print(f"[-]Error writing NFO file: {e}")
-        moveFailedFolder(filepath)
+        moveFailedFolder(filepath, f"write NFO failed: {e}")
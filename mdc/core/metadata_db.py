@@ -0,0 +1,192 @@
+# build-in lib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# project wide
+from mdc.config import config
+
+
+def normalize_number(number: str) -> str:
+    """数据库中统一使用大写番号作为键"""
+    return str(number or "").strip().upper()
+
+
+def sources_signature(sources) -> str:
+    """数据源列表("a,b" 或 ["a", "b"])的规范形式, 顺序影响合并结果, 保留顺序"""
+    if isinstance(sources, str):
+        sources = sources.split(",")
+    return ",".join(s.strip() for s in sources or () if s and s.strip())
+
+
+class MetadataDB:
+    """
+    本地元数据数据库
+
+    metadata 表保存 search() 返回的合并结果, source_result 表保存各数据源 dictformat 的原始结果,
+    都以番号为键并记录获取时间, 超过有效期或 refresh 为真时视为不存在.
+    合并结果同时记录当时的数据源列表, 数据源设置改变后不再使用.
+    source_miss 表记录数据源没有该番号(404/查询异常/数据无效), 到期前不再向该数据源查询.
+    source_stats 表按番号系列前缀统计各数据源的查询次数、命中次数和耗时
+
+    :param path: 数据库文件路径
+    :param ttl: 有效秒数, <=0 表示永久有效
+    :param refresh: 强制刷新, 只写入不读取
+    :param miss_ttl: 未找到记录的有效秒数, <=0 表示不记录
+    """
+
+    def __init__(self, path: str, ttl: float = 0, refresh: bool = False, miss_ttl: float = 0):
+        self.path = path
+        self.ttl = ttl
+        self.refresh = refresh
+        self.miss_ttl = miss_ttl
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                "kind TEXT, number TEXT, source TEXT, data TEXT, fetched REAL, sources TEXT, "
+                "PRIMARY KEY (kind, number))"
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(metadata)")]
+            if "sources" not in columns:
+                # 旧版数据库没有数据源列表, 这些记录视为不匹配, 下次重新获取
+                self._conn.execute("ALTER TABLE metadata ADD COLUMN sources TEXT")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS source_result ("
+                "source TEXT, number TEXT, data TEXT, fetched REAL, PRIMARY KEY (source, number))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS source_miss ("
+                "source TEXT, number TEXT, reason TEXT, expires REAL, PRIMARY KEY (source, number))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS source_stats ("
+                "prefix TEXT, source TEXT, attempts INTEGER, hits INTEGER, elapsed REAL, PRIMARY KEY (prefix, source))"
+            )
+
+    def _fresh(self, fetched: float) -> bool:
+        return self.ttl <= 0 or time.time() - fetched < self.ttl
+
+    def _query_one(self, sql: str, params: tuple) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _execute(self, sql: str, params: tuple) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def get_metadata(self, number: str, kind: str = "adult", sources: str = "") -> Optional[dict]:
+        """
+        :param sources: 本次查询的数据源列表(sources_signature), 与保存时不同则视为不存在
+        """
+        if self.refresh:
+            return None
+        row = self._query_one(
+            "SELECT data, fetched, sources FROM metadata WHERE kind = ? AND number = ?",
+            (kind, normalize_number(number)),
+        )
+        if row is None or not self._fresh(row[1]) or row[2] != sources:
+            return None
+        return json.loads(row[0])
+
+    def put_metadata(self, number: str, json_data: dict, kind: str = "adult", sources: str = "") -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO metadata (kind, number, source, data, fetched, sources) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                kind,
+                normalize_number(number),
+                json_data.get("source"),
+                json.dumps(json_data, ensure_ascii=False),
+                time.time(),
+                sources,
+            ),
+        )
+
+    def get_source_result(self, source: str, number: str) -> Optional[dict]:
+        if self.refresh:
+            return None
+        row = self._query_one(
+            "SELECT data, fetched FROM source_result WHERE source = ? AND number = ?",
+            (source, normalize_number(number)),
+        )
+        if row is None or not self._fresh(row[1]):
+            return None
+        return json.loads(row[0])
+
+    def put_source_result(self, source: str, number: str, data: dict) -> None:
+        with self._lock, self._conn:
+            params = (source, normalize_number(number))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO source_result (source, number, data, fetched) VALUES (?, ?, ?, ?)",
+                params + (json.dumps(data, ensure_ascii=False), time.time()),
+            )
+            self._conn.execute("DELETE FROM source_miss WHERE source = ? AND number = ?", params)
+
+    def is_miss(self, source: str, number: str) -> bool:
+        """数据源近期没有找到过该番号"""
+        if self.refresh or self.miss_ttl <= 0:
+            return False
+        row = self._query_one(
+            "SELECT expires FROM source_miss WHERE source = ? AND number = ?", (source, normalize_number(number))
+        )
+        return row is not None and row[0] > time.time()
+
+    def put_miss(self, source: str, number: str, reason: str = "") -> None:
+        if self.miss_ttl <= 0:
+            return
+        self._execute(
+            "INSERT OR REPLACE INTO source_miss (source, number, reason, expires) VALUES (?, ?, ?, ?)",
+            (source, normalize_number(number), reason, time.time() + self.miss_ttl),
+        )
+
+    def record_attempt(self, prefix: str, source: str, hit: bool, elapsed: float) -> None:
+        self._execute(
+            "INSERT INTO source_stats (prefix, source, attempts, hits, elapsed) VALUES (?, ?, 1, ?, ?) "
+            "ON CONFLICT (prefix, source) DO UPDATE SET "
+            "attempts = attempts + 1, hits = hits + excluded.hits, elapsed = elapsed + excluded.elapsed",
+            (prefix, source, int(hit), elapsed),
+        )
+
+    def source_stats(self, prefix: str) -> Dict[str, Tuple[int, int, float]]:
+        """{数据源: (查询次数, 命中次数, 总耗时秒数)}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source, attempts, hits, elapsed FROM source_stats WHERE prefix = ?", (prefix,)
+            ).fetchall()
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_db: Optional[MetadataDB] = None
+_db_lock = threading.Lock()
+
+
+def get_metadata_db() -> Optional[MetadataDB]:
+    """按配置打开全局数据库, 未开启或无法打开时返回 None"""
+    global _db
+    conf = config.getInstance()
+    if not conf.database_switch():
+        return None
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                try:
+                    _db = MetadataDB(
+                        conf.database_file(),
+                        conf.database_ttl() * 86400,
+                        conf.database_refresh(),
+                        conf.database_miss_ttl() * 86400,
+                    )
+                except sqlite3.Error as e:
+                    print(f"[-]Open metadata database '{conf.database_file()}' failed: {e}")
+                    return None
+    return _db
@@ -1,21 +1,26 @@
 # build-in lib
-import importlib
 import json
 import re
 import secrets
+import time
 import traceback
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 from pathlib import Path
 
 # third party lib
-import opencc
+import requests
 
 # project wide definitions
 from mdc.config import config
+from mdc.core.metadata_db import MetadataDB, get_metadata_db, sources_signature
 from mdc.file.file_utils import file_modification_days
+from mdc.scraping import registry
 from mdc.scraping.custom_exceptions import QueryError
 from mdc.scraping.parser import Parser
+from mdc.scraping.result import ScrapeResult
+from mdc.scraping.run_cache import get_run_cache
 from mdc.utils.actor_mapping import (
     get_actor_mapping,
     get_info_mapping,
@@ -23,41 +28,15 @@ from mdc.utils.actor_mapping import (
     process_text_mappings,
 )
 from mdc.utils.cookie import load_cookies
-from mdc.utils.number_parser import is_number_equivalent
-from mdc.utils.translation import translate
+from mdc.utils.number_parser import get_number_prefix, is_number_equivalent
+
+if typing.TYPE_CHECKING:
+    import opencc
 
 
 class Scraping:
     """ """
 
-    adult_full_sources = [
-        "javlibrary",
-        "javdb",
-        "javbus",
-        "airav",
-        "fanza",
-        "xcity",
-        "jav321",
-        "mgstage",
-        "fc2",
-        "avsox",
-        "dlsite",
-        "carib",
-        "madou",
-        "msin",
-        "av123",
-        "getchu",
-        "gcolle",
-        "javday",
-        "pissplay",
-        "javmenu",
-        "pcolle",
-        "caribpr",
-        "madouji",
-    ]
-
-    general_full_sources = ["tmdb", "imdb"]
-
     debug = False
 
     proxies = None
@@ -69,6 +48,10 @@ class Scraping:
     dbsite = None
     # 使用storyline方法进一步获取故事情节
     morestoryline = False
+    # 同时查询的数据源数量, 0或1为逐个查询
+    concurrent = 0
+    # 本地元数据数据库
+    db: typing.Optional[MetadataDB] = None
     # 新增方法：根据爬虫名称加载对应cookie
 
     def load_cookies_for_source(self, source, dbsite):
@@ -101,14 +84,27 @@ class Scraping:
         specifiedUrl=None,
         dbsite=None,
         morestoryline=False,
+        concurrent=0,
         debug=False,
     ):
         self.debug = debug
+        self.concurrent = concurrent
         self.proxies = proxies
         self.verify = verify
         self.specifiedSource = specifiedSource
         self.specifiedUrl = specifiedUrl
         self.morestoryline = morestoryline
+        # 指定数据源或网址时总是重新获取
+        self.db = get_metadata_db()
+        use_db = self.db is not None and not specifiedSource and not specifiedUrl
+        signature = sources_signature(sources)
+        if use_db:
+            json_data = self.db.get_metadata(number, type, signature)
+            if json_data:
+                if debug:
+                    print(f"[+]Load [{number}] metadata from local database, source '{json_data.get('source')}'")
+                return json_data
+
         # 动态加载各爬虫的cookie
         valid_cookies = {}
         if sources:
@@ -122,9 +118,12 @@ class Scraping:
 
         print(f"当前爬虫sources: {sources}")
         if type == "adult":
-            return self.searchAdult(number, tuple(sources) if sources else ())
+            json_data = self.searchAdult(number, tuple(sources) if sources else ())
         else:
-            return self.searchGeneral(number, tuple(sources) if sources else ())
+            json_data = self.searchGeneral(number, tuple(sources) if sources else ())
+        if use_db and isinstance(json_data, dict) and json_data:
+            self.db.put_metadata(number, json_data, type, signature)
+        return json_data
 
     @lru_cache(maxsize=None)
     def searchGeneral(self, name, sources):
@@ -137,29 +136,12 @@ class Scraping:
             sources = self.checkGeneralSources(sources, name)
         json_data = {}
         for source in sources:
-            try:
+            json_data = self._scrape_source(source, name)
+            # if any service return a valid return, break
+            if self.get_data_state(json_data):
                 if self.debug:
-                    print("[+]select", source)
-                try:
-                    module = importlib.import_module("." + source, "mdc.scraping")
-                    parser_type = getattr(module, source.capitalize())
-                    parser: Parser = parser_type()
-                    data = parser.scrape(name, self)
-                    if data == 404:
-                        continue
-                    json_data = json.loads(data)
-                except QueryError as e:
-                    print(f"[!] 查询异常: {str(e)}")
-                except BaseException as e:
-                    if self.debug:
-                        traceback.print_exception(e)
-                # if any service return a valid return, break
-                if self.get_data_state(json_data):
-                    if self.debug:
-                        print(f"[+]Find movie [{name}] metadata on website '{source}'")
-                    break
-            except Exception:
-                continue
+                    print(f"[+]Find movie [{name}] metadata on website '{source}'")
+                break
 
         # Return if data not found in all sources
         if not json_data or json_data.get("title") == "":
@@ -186,53 +168,28 @@ class Scraping:
             pass
         else:
             sources = self.checkAdultSources(sources, number)
-        json_data = {}
-        for source in sources:
-            try:
-                if self.debug:
-                    print("[+]select", source)
-                try:
-                    module = importlib.import_module("." + source, "mdc.scraping")
-                    parser_type = getattr(module, source.capitalize())
-                    parser: Parser = parser_type()
-                    data = parser.scrape(number, self)
-                    if data == 404:
-                        continue
-                    json_data = json.loads(data)
-                except QueryError as e:
-                    print(f"[!] 查询异常: {str(e)}")
-                except BaseException as e:
-                    if self.debug:
-                        traceback.print_exception(e)
-                    # json_data = self.func_mapping[source](number, self)
+        if not self.specifiedSource:
+            sources = self.routeSources(sources, number)
+        # 各数据源的查询结果, 合并字段时复用
+        results = {}
+        if self.concurrent > 1 and len(sources) > 1:
+            json_data = self._search_sources_concurrently(number, sources, self.concurrent, results)
+        else:
+            json_data = {}
+            for source in sources:
+                json_data = self._scrape_source(source, number)
+                results[source] = json_data
                 # if any service return a valid return, break
                 if self.get_data_state(json_data):
                     if self.debug:
                         print(f"[+]Find movie [{number}] metadata on website '{source}'")
                     break
-            except Exception:
-                continue
 
-        # javdb的封面有水印，如果可以用其他源的封面来替换javdb的封面
-        if "source" in json_data and json_data["source"] == "javdb":
-            # If cover not found in other source, then skip using other sources using javdb cover instead
-            try:
-                # search other sources
-                if "javdb" in sources:
-                    other_sources = sources[sources.index("javdb") + 1 :]
-                    # 避免空列表导致无限递归
-                    if other_sources:
-                        other_json_data = self.searchAdult(number, other_sources)
-                        if (
-                            other_json_data is not None
-                            and "cover" in other_json_data
-                            and other_json_data["cover"] != ""
-                        ):
-                            json_data["cover"] = other_json_data["cover"]
-                            if self.debug:
-                                print(f"[+]Replace javdb cover with {other_json_data['source']} cover")
-            except Exception:
-                pass
+        # 按字段优先级用其他数据源的字段替换, 例如javdb的封面有水印, 优先使用其他源的封面
+        if not self.specifiedSource and self.get_data_state(json_data):
+            conf = config.getInstance()
+            if conf.field_priority_switch():
+                self._merge_fields(number, sources, json_data, results, conf.field_priority())
 
         # Return if data not found in all sources
         if not json_data or json_data.get("title") == "":
@@ -251,12 +208,189 @@ class Scraping:
 
         return json_data
 
+    def _scrape_source(self, source, number) -> dict:
+        """用单个数据源刮削, 未找到或出错时返回空字典"""
+        if self.debug:
+            print("[+]select", source)
+        use_db = self.db is not None and not self.specifiedUrl
+        if use_db:
+            json_data = self.db.get_source_result(source, number)
+            if json_data is not None:
+                if self.debug:
+                    print(f"[+]Load [{number}] '{source}' result from local database")
+                get_run_cache().put_result(source, number, json_data)
+                return json_data
+            if self.db.is_miss(source, number):
+                if self.debug:
+                    print(f"[-]Skip '{source}', [{number}] not found there recently")
+                return {}
+        hit = False
+        start = time.monotonic()
+        try:
+            parser: Parser = registry.get_parser(source)
+            data = parser.scrape(number, self)
+            if data == 404:
+                if use_db:
+                    self.db.put_miss(source, number, "404")
+                return {}
+            if isinstance(data, ScrapeResult):
+                json_data = data.to_dict()
+            else:
+                # 第三方数据源可能仍然返回 JSON 字符串
+                json_data = json.loads(data)
+            if not self.specifiedUrl and self.get_data_state(json_data):
+                # 剧情简介查询同一数据源时直接使用
+                get_run_cache().put_result(source, number, json_data)
+            if use_db:
+                # 没有标题的结果可能是限流、验证或登录页面, 不记为未找到
+                hit = self.get_data_state(json_data)
+                if hit:
+                    self.db.put_source_result(source, number, json_data)
+            return json_data
+        except QueryError as e:
+            print(f"[!] 查询异常: {str(e)}")
+            # 部分数据源把网络错误包装为 QueryError 抛出, 这种情况不记录
+            if use_db and not isinstance(e.__context__, (requests.RequestException, OSError)):
+                self.db.put_miss(source, number, str(e)[:200])
+        except BaseException as e:
+            # 网络错误等其他异常可能只是暂时的, 不记为未找到
+            if self.debug:
+                traceback.print_exception(e)
+        finally:
+            # 统计各系列番号在该数据源的命中率和耗时, 用于调整数据源顺序
+            if use_db:
+                self.db.record_attempt(get_number_prefix(number), source, hit, time.monotonic() - start)
+        return {}
+
+    def routeSources(self, sources, number):
+        """
+        按历史统计调整数据源顺序
+
+        查询次数达到 route_samples 且有命中的数据源按 命中次数/总耗时 从高到低排在最前,
+        统计不足的保持原顺序排在其后, 从未命中的排在最后
+        """
+        min_samples = config.getInstance().database_route_samples()
+        if self.db is None or min_samples <= 0 or len(sources) <= 1:
+            return sources
+        stats = self.db.source_stats(get_number_prefix(number))
+        learned, unknown, missed = [], [], []
+        for source in sources:
+            attempts, hits, elapsed = stats.get(source, (0, 0, 0.0))
+            if attempts < min_samples:
+                unknown.append(source)
+            elif hits:
+                learned.append((hits / max(elapsed, 0.001), source))
+            else:
+                missed.append(source)
+        learned.sort(key=lambda x: x[0], reverse=True)
+        routed = [source for _, source in learned] + unknown + missed
+        if self.debug and routed != list(sources):
+            print(f"[+]Route sources for [{get_number_prefix(number)}]: {routed}")
+        return tuple(routed) if isinstance(sources, tuple) else routed
+
+    def _search_sources_concurrently(self, number, sources, workers, results=None) -> dict:
+        """
+        同时查询优先级最高的 workers 个数据源
+
+        按优先级顺序等待结果, 排在前面的数据源全部失败后, 第一个有效结果才被采用,
+        所以结果与逐个查询相同. 每有一个数据源失败就补充查询下一个,
+        确定结果后取消尚未开始的查询
+        """
+        sources = list(sources)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scraping")
+        futures = {}
+
+        def submit_until(end):
+            for i in range(len(futures), min(end, len(sources))):
+                futures[i] = executor.submit(self._scrape_source, sources[i], number)
+
+        json_data = {}
+        try:
+            for i, source in enumerate(sources):
+                submit_until(i + workers)
+                json_data = futures[i].result()
+                if self.get_data_state(json_data):
+                    if self.debug:
+                        print(f"[+]Find movie [{number}] metadata on website '{source}'")
+                    break
+        finally:
+            # 已开始的请求无法中断, 结果直接丢弃
+            executor.shutdown(wait=False, cancel_futures=True)
+        if results is not None:
+            for i, future in futures.items():
+                if future.done() and not future.cancelled():
+                    results[sources[i]] = future.result()
+        return json_data
+
+    @staticmethod
+    def _has_value(value) -> bool:
+        return value is not None and value != "null" and (not isinstance(value, (str, list, dict)) or len(value) > 0)
+
+    def _merge_fields(self, number, sources, json_data, results, field_priority) -> None:
+        """
+        按字段优先级合并多个数据源的结果
+
+        先找出每个字段中排在当前结果之前、还未查询的数据源, 一次性并发查询,
+        再逐个字段取优先级最高的有效值. 未配置优先级的字段只在当前结果为空时,
+        用已查询到的其他结果按数据源顺序补全
+
+        :param json_data: 主结果, 直接修改
+        :param results: {数据源: 查询结果}, 补充查询的结果也写入这里
+        :param field_priority: {字段: [数据源]}
+        """
+        winner = json_data.get("source")
+
+        def usable(source, field):
+            data = results.get(source)
+            if not data or not self._has_value(data.get(field)):
+                return False
+            return source == winner or (
+                self.get_data_state(data) and is_number_equivalent(data.get("number"), json_data.get("number"))
+            )
+
+        needed = []
+        for field, priority in field_priority.items():
+            for source in priority:
+                if source not in sources:
+                    continue
+                if source == winner and self._has_value(json_data.get(field)):
+                    break
+                if source in results:
+                    if usable(source, field):
+                        break
+                elif source not in needed:
+                    needed.append(source)
+
+        if needed:
+            if self.debug:
+                print(f"[+]Merge fields: query {needed}")
+            workers = min(len(needed), self.concurrent) if self.concurrent > 1 else len(needed)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scraping") as executor:
+                for source, data in zip(needed, executor.map(lambda src: self._scrape_source(src, number), needed)):
+                    results[source] = data
+
+        for field, priority in field_priority.items():
+            if not priority:
+                if self._has_value(json_data.get(field)):
+                    continue
+                priority = sources
+            for source in priority:
+                if source not in sources:
+                    continue
+                if source == winner and self._has_value(json_data.get(field)):
+                    break
+                if usable(source, field):
+                    json_data[field] = results[source][field]
+                    if self.debug:
+                        print(f"[+]Use {field} from {source}")
+                    break
+
     def checkGeneralSources(self, sources, name):
         sources = list(sources)
         # check sources in func_mapping
         todel = []
         for s in sources:
-            if s not in self.general_full_sources:
+            if s not in registry.sources("general"):
                 print("[!] Source Not Exist : " + s)
                 todel.append(s)
         for d in todel:
@@ -273,7 +407,8 @@ class Scraping:
                 sources.insert(0, sources.pop(sources.index(source)))
             return sources
 
-        if len(sources) <= len(self.adult_full_sources):
+        adult_sources = registry.sources("adult")
+        if len(sources) <= len(adult_sources):
             # if the input file name matches certain rules,
             # move some web service to the beginning of the list
             lo_file_number = file_number.lower()
@@ -318,7 +453,7 @@ class Scraping:
         # check sources in func_mapping
         todel = []
         for s in sources:
-            if s not in self.adult_full_sources and config.getInstance().debug():
+            if s not in adult_sources and config.getInstance().debug():
                 print("[!] Source Not Exist : " + s)
                 todel.append(s)
         for d in todel:
@@ -369,6 +504,7 @@ def _build_search_kwargs(conf: config, specified_source: str, specified_url: str
         "verify": ca_cert,
         "dbsite": secrets.choice(javdb_sites),
         "morestoryline": conf.is_storyline(),
+        "concurrent": conf.concurrent_sources(),
         "specifiedSource": specified_source,
         "specifiedUrl": specified_url,
         "debug": conf.debug(),
@@ -466,6 +602,8 @@ def _maybe_translate(json_data: dict, conf: config, title_lookup_number: str) ->
     """按配置翻译字段；title 会优先查本地番号字典缓存。"""
     if not conf.is_translate():
         return
+    # 翻译模块只在开启翻译时导入
+    from mdc.utils.translation import translate
 
     translate_values = conf.translate_values().split(",")
     for translate_value in translate_values:
@@ -537,7 +675,7 @@ def _apply_info_mappings(json_data: dict, info_mapping_data: dict) -> None:
                 print(f"[-]处理{field}信息失败: {e}")
 
 
-def _apply_opencc(open_cc: opencc.OpenCC, conf: config, json_data: dict) -> None:
+def _apply_opencc(open_cc: "opencc.OpenCC", conf: config, json_data: dict) -> None:
     """对配置指定的字段做繁简转换；支持 list[str] / str。"""
     if not open_cc:
         return
@@ -577,7 +715,7 @@ def _build_naming_rules(conf: config, json_data: dict) -> None:
 
 
 def get_data_from_json(
-    file_number: str, open_cc: opencc.OpenCC, specified_source: str, specified_url: str
+    file_number: str, open_cc: "opencc.OpenCC", specified_source: str, specified_url: str
 ) -> typing.Optional[dict]:
     """
     从网站抓取并标准化元数据。
@@ -9,11 +9,15 @@ from .downloader import (
     image_download,
     image_ext,
     parallel_download_files,
+    segmented_download,
+    stream_download,
     trailer_download,
 )
 
 # Define __all__ to control what gets imported when using "from mdc.download import *"
 __all__ = [
+    "stream_download",
+    "segmented_download",
     "download_file_with_filename",
     "download_one_file",
     "parallel_download_files",
@@ -1,66 +1,255 @@
 # build-in lib
+import functools
 import os
 import re
 import shutil
+import sqlite3
+import threading
 import time
 import typing
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlsplit
 
 # third party lib
 import requests
 
 # project wide
 from mdc.config import config
-from mdc.file.common_utils import file_not_exist_or_empty
+from mdc.download.image_store import get_image_store
+from mdc.download.manager import (
+    PRIORITY_ACTOR_PHOTO,
+    PRIORITY_COVER,
+    PRIORITY_EXTRAFANART,
+    PRIORITY_TRAILER,
+    get_download_manager,
+)
+from mdc.file.common_utils import file_not_exist_or_empty, link_or_copy
 from mdc.file.file_utils import moveFailedFolder
-from mdc.utils.http.request import get_html
+from mdc.utils.http.request import request_session
 
 # ------------------------------
 # Common download functions
 # ------------------------------
 
 
-def download_file_with_filename(url: str, filename: str, path: str, filepath=None, json_headers=None) -> None:
+# 流式下载每次写入的块大小, 内存占用与文件大小无关
+CHUNK_SIZE = 64 * 1024
+
+
+class IncompleteDownload(requests.exceptions.RequestException):
+    """下载的字节数与服务器声明的长度不一致, 未完成部分保留在 .part 文件中供续传"""
+
+
+def _content_range_total(value: str) -> typing.Optional[int]:
+    """解析 Content-Range 头部中的文件总长度, 如 'bytes 100-199/200' -> 200"""
+    match = re.match(r"bytes\s+(\d+)-\d+/(\d+)", value or "")
+    return int(match.group(2)) if match else None
+
+
+def stream_download(url: str, fullpath, headers: typing.Optional[dict] = None) -> bool:
     """
-    download file save to give path with given name from given url
+    流式下载文件到 fullpath
+
+    先写入同目录的 <文件名>.part, 已有 .part 时用 Range 请求续传,
+    长度与 Content-Length/Content-Range 一致后才原子改名为目标文件, 中断时目标文件不会出现不完整内容
+
+    :return: 下载成功返回 True, 服务器返回错误状态或内容为空返回 False
+    :raise IncompleteDownload: 传输中断, 可再次调用续传
     """
-    conf = config.getInstance()
-    config_proxy = conf.proxy()
+    fullpath = Path(fullpath)
+    part = fullpath.with_name(fullpath.name + ".part")
+    offset = part.stat().st_size if part.is_file() else 0
+    request_headers = dict(headers or {})
+    if offset:
+        request_headers["Range"] = f"bytes={offset}-"
+    session = request_session(retry=0, rate_limited=False)
+    with session.get(str(url), headers=request_headers, stream=True) as r:
+        if r.status_code == 416 and offset:
+            # .part 已失效(文件已变化或已完整), 重新下载
+            part.unlink()
+            return stream_download(url, fullpath, headers)
+        if r.status_code == 206 and offset:
+            mode = "ab"
+            expected = _content_range_total(r.headers.get("Content-Range"))
+        elif r.status_code == 200:
+            # 服务器不支持续传时从头下载
+            mode, offset = "wb", 0
+            expected = None
+            if r.headers.get("Content-Length", "").isdigit() and not r.headers.get("Content-Encoding"):
+                expected = int(r.headers["Content-Length"])
+        else:
+            return False
+        with part.open(mode) as f:
+            for chunk in r.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+    size = part.stat().st_size
+    if expected is not None and size != expected:
+        raise IncompleteDownload(f"received {size}/{expected} bytes")
+    if not size:
+        part.unlink()
+        return False
+    os.replace(part, fullpath)
+    return True
+
+
+_host_slots: typing.Dict[str, threading.BoundedSemaphore] = {}
+_host_slots_lock = threading.Lock()
+
+
+def host_slot(url: str) -> threading.BoundedSemaphore:
+    """同一站点共用的连接数限制, 上限为配置 [trailer]host_connections"""
+    host = (urlsplit(str(url)).hostname or "").lower()
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(config.getInstance().trailer_host_connections())
+        return slot
+
+
+def _probe_size(session: requests.Session, url: str, headers: typing.Optional[dict]) -> typing.Optional[int]:
+    """请求第一个字节, 服务器支持 Range 时返回文件总长度, 否则返回 None"""
+    request_headers = dict(headers or {})
+    request_headers["Range"] = "bytes=0-0"
+    with host_slot(url), session.get(str(url), headers=request_headers, stream=True) as r:
+        if r.status_code != 206:
+            return None
+        return _content_range_total(r.headers.get("Content-Range"))
+
+
+def _download_segment(session, url, headers, part: Path, start: int, end: int, retry: int) -> None:
+    """下载 [start, end] 字节到 part, 已下载部分保留并续传, 每段单独重试"""
+    length = end - start + 1
+    error = None
+    for _ in range(max(1, retry)):
+        done = part.stat().st_size if part.is_file() else 0
+        if done > length:
+            part.unlink()
+            done = 0
+        if done == length:
+            return
+        request_headers = dict(headers or {})
+        request_headers["Range"] = f"bytes={start + done}-{end}"
+        try:
+            with host_slot(url), session.get(str(url), headers=request_headers, stream=True) as r:
+                if r.status_code != 206:
+                    raise IncompleteDownload(f"segment {start}-{end} got status {r.status_code}")
+                remaining = length - done
+                with part.open("ab") as f:
+                    for chunk in r.iter_content(CHUNK_SIZE):
+                        f.write(chunk[:remaining])
+                        remaining -= len(chunk)
+                        if remaining <= 0:
+                            break
+        except requests.exceptions.RequestException as e:
+            error = e
+    if (part.stat().st_size if part.is_file() else 0) != length:
+        raise IncompleteDownload(f"segment {start}-{end} failed: {error}")
+
+
+def segmented_download(url: str, fullpath, segments: int, min_size: int = 0, headers: typing.Optional[dict] = None):
+    """
+    分段并行下载
+
+    按字节范围把文件分成 segments 段同时下载到 <文件名>.part<序号>, 每段单独重试和续传,
+    全部完成后合并并原子改名. 服务器不支持 Range 或文件小于 min_size 字节时改为 stream_download 单连接下载
 
-    for i in range(config_proxy.retry):
+    :return: 同 stream_download
+    """
+    fullpath = Path(fullpath)
+    session = request_session(retry=0, rate_limited=False)
+    size = _probe_size(session, url, headers) if segments > 1 else None
+    if not size or size < max(min_size, segments):
+        return stream_download(url, fullpath, headers)
+    step = size // segments
+    ranges = [(i * step, size - 1 if i == segments - 1 else (i + 1) * step - 1) for i in range(segments)]
+    parts = [fullpath.with_name(f"{fullpath.name}.part{i}") for i in range(segments)]
+    retry = config.getInstance().proxy().retry
+    with ThreadPoolExecutor(segments, thread_name_prefix="segment") as pool:
+        futures = [
+            pool.submit(_download_segment, session, url, headers, part, start, end, retry)
+            for part, (start, end) in zip(parts, ranges)
+        ]
+        for future in futures:
+            future.result()
+    merged = fullpath.with_name(fullpath.name + ".part")
+    with merged.open("wb") as out:
+        for part in parts:
+            with part.open("rb") as f:
+                shutil.copyfileobj(f, out, CHUNK_SIZE)
+    if merged.stat().st_size != size:
+        merged.unlink()
+        raise IncompleteDownload(f"merged {merged.stat().st_size}/{size} bytes")
+    os.replace(merged, fullpath)
+    for part in parts:
+        part.unlink()
+    return True
+
+
+def fetch_with_retry(
+    url: str, fullpath, headers: typing.Optional[dict] = None, segments: int = 1, min_size: int = 0, verbose=True
+) -> bool:
+    """
+    下载管理器使用的下载函数, 网络错误时按配置次数重试(续传)
+
+    :return: 同 stream_download
+    :raise: 重试次数用完后抛出最后一次的异常
+    """
+    retry = config.getInstance().proxy().retry
+    error = requests.exceptions.RequestException(f"Download '{url}' failed")
+    for i in range(1, retry + 1):
         try:
-            if not os.path.exists(path):
-                try:
-                    os.makedirs(path)
-                except OSError:
-                    print(f"[-]Fatal error! Can not make folder '{path}'")
-                    os._exit(0)
-            r = get_html(url=url, return_type="object", json_headers=json_headers)
-            if r.status_code != 200 or r.content == "":
-                print("[-]Movie Download Data not found!")
-                return
-            with open(os.path.join(path, filename), "wb") as code:
-                code.write(r.content)
-            return
-        except requests.exceptions.ProxyError:
-            i += 1
-            print("[-]Download :  Proxy error " + str(i) + "/" + str(config_proxy.retry))
-        except requests.exceptions.ConnectTimeout:
-            i += 1
-            print("[-]Download :  Connect retry " + str(i) + "/" + str(config_proxy.retry))
-        except requests.exceptions.ConnectionError:
-            i += 1
-            print("[-]Download :  Connect retry " + str(i) + "/" + str(config_proxy.retry))
-        except requests.exceptions.RequestException:
-            i += 1
-            print("[-]Download :  Connect retry " + str(i) + "/" + str(config_proxy.retry))
+            if segments > 1:
+                return segmented_download(url, fullpath, segments, min_size, headers)
+            return stream_download(url, fullpath, headers)
+        except requests.exceptions.ProxyError as e:
+            error, msg = e, "[-]Download :  Proxy error " + str(i) + "/" + str(retry)
+        except IncompleteDownload as e:
+            error, msg = e, f"[-]Download :  Incomplete ({e}), resume " + str(i) + "/" + str(retry)
+        except requests.exceptions.RequestException as e:
+            error, msg = e, "[-]Download :  Connect retry " + str(i) + "/" + str(retry)
         except Exception as e:
-            print("[-]Image Download :Error", e)
+            error, msg = e, f"[-]Image Download :Error {e}"
+        if verbose or config.getInstance().debug():
+            print(msg)
+    raise error
+
+
+def download_file_with_filename(
+    url: str,
+    filename: str,
+    path: str,
+    filepath=None,
+    json_headers=None,
+    segments: int = 1,
+    min_size: int = 0,
+    priority: int = PRIORITY_COVER,
+) -> bool:
+    """
+    download file save to give path with given name from given url
+    通过下载管理器排队下载并等待完成, segments > 1 时使用 segmented_download 分段并行下载
+
+    :return: 下载成功返回 True, 文件不存在或重试后仍失败返回 False
+    """
+    if not os.path.exists(path):
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError:
+            print(f"[-]Fatal error! Can not make folder '{path}'")
+            os._exit(0)
+    fetch = functools.partial(fetch_with_retry, headers=json_headers, segments=segments, min_size=min_size)
+    future = get_download_manager().submit(url, os.path.join(path, filename), fetch, priority)
+    try:
+        if future.result() is None:
+            print("[-]Movie Download Data not found!")
+            return False
+        return True
+    except Exception:
+        pass
     print("[-]Connect Failed! Please check your Proxy or Network!")
     if filepath:
-        moveFailedFolder(filepath)
-    return
+        moveFailedFolder(filepath, f"download '{url}' failed")
+    return False
 
 
 def download_one_file(args) -> str:
@@ -70,17 +259,26 @@ def download_one_file(args) -> str:
     """
 
     (url, save_path, json_headers) = args
-    if json_headers is not None:
-        filebytes = get_html(url, return_type="content", json_headers=json_headers["headers"])
-    else:
-        filebytes = get_html(url, return_type="content")
-    if isinstance(filebytes, bytes) and len(filebytes):
-        with save_path.open("wb") as fpbyte:
-            if len(filebytes) == fpbyte.write(filebytes):
-                return str(save_path)
+    return _wait_quietly(_submit_quietly(url, save_path, json_headers))
+
+
+def _submit_quietly(url, save_path, json_headers=None, priority=PRIORITY_EXTRAFANART):
+    headers = json_headers["headers"] if json_headers is not None else None
+    fetch = functools.partial(fetch_with_retry, headers=headers, verbose=False)
+    return get_download_manager().submit(url, save_path, fetch, priority)
 
 
-def parallel_download_files(dn_list: typing.Iterable[typing.Sequence], parallel: int = 0, json_headers=None):
+def _wait_quietly(future) -> typing.Optional[str]:
+    try:
+        result = future.result()
+    except Exception:
+        return None
+    return None if result is None else str(result)
+
+
+def parallel_download_files(
+    dn_list: typing.Iterable[typing.Sequence], parallel: int = 0, json_headers=None, priority=PRIORITY_EXTRAFANART
+):
     """
     download files in parallel 多线程下载文件
 
@@ -91,9 +289,10 @@ def parallel_download_files(dn_list: typing.Iterable[typing.Sequence], parallel:
     ])
 
     :dn_list: 可以是 tuple或者list: ((url1, save_fullpath1),(url2, save_fullpath2),) fullpath可以是str或Path
-    :parallel: 并行下载的线程池线程数，为0则由函数自己决定
+    :parallel: 保留参数, 并发数由下载管理器统一限制
+    :priority: 下载管理器中的优先级
     """
-    mp_args = []
+    futures = []
     for url, fullpath in dn_list:
         if (
             url
@@ -105,14 +304,8 @@ def parallel_download_files(dn_list: typing.Iterable[typing.Sequence], parallel:
         ):
             fullpath = Path(fullpath)
             fullpath.parent.mkdir(parents=True, exist_ok=True)
-            mp_args.append((url, fullpath, json_headers))
-    if not len(mp_args):
-        return []
-    if not isinstance(parallel, int) or parallel not in range(1, 200):
-        parallel = min(5, len(mp_args))
-    with ThreadPoolExecutor(parallel) as pool:
-        results = list(pool.map(download_one_file, mp_args))
-    return results
+            futures.append(_submit_quietly(url, fullpath, json_headers, priority))
+    return [_wait_quietly(future) for future in futures]
 
 
 # ------------------------------
@@ -121,35 +314,61 @@ def parallel_download_files(dn_list: typing.Iterable[typing.Sequence], parallel:
 
 
 def trailer_download(trailer, leak_word, c_word, hack_word, number, path, filepath):
-    if (
-        download_file_with_filename(
-            trailer,
-            number + leak_word + c_word + hack_word + "-trailer.mp4",
-            path,
-            filepath,
-        )
-        == "failed"
-    ):
+    conf = config.getInstance()
+    filename = number + leak_word + c_word + hack_word + "-trailer.mp4"
+    # 分段下载时每段单独重试, 失败后保留已下载的分段, 下次运行继续续传
+    downloaded = download_file_with_filename(
+        trailer,
+        filename,
+        path,
+        filepath,
+        segments=conf.trailer_segments(),
+        min_size=conf.trailer_min_size() * 1024 * 1024,
+        priority=PRIORITY_TRAILER,
+    )
+    if not downloaded or file_not_exist_or_empty(path + "/" + filename):
+        print("[-]Video Download Failed!")
         return
-    configProxy = config.getInstance().proxy()
-    for i in range(configProxy.retry):
-        if file_not_exist_or_empty(path + "/" + number + leak_word + c_word + hack_word + "-trailer.mp4"):
-            print("[!]Video Download Failed! Trying again. [{}/3]", i + 1)
-            download_file_with_filename(
-                trailer,
-                number + leak_word + c_word + hack_word + "-trailer.mp4",
-                path,
-                filepath,
-            )
+    print("[+]Video Downloaded!", path + "/" + filename)
+
+
+def _download_via_store(store, dn_list, parallel):
+    """
+    通过图片库下载: 库中没有的 URL 只下载一次, 再链接到各自的保存路径
+
+    :return: 与 parallel_download_files 相同, 每项为保存路径, 失败为 None
+    """
+    blobs = {}
+    missing = {}
+    for url, _ in dn_list:
+        if url in blobs or url in missing:
             continue
+        blob = store.lookup(url)
+        if blob is not None:
+            blobs[url] = blob
         else:
-            break
-    if file_not_exist_or_empty(path + "/" + number + leak_word + c_word + hack_word + "-trailer.mp4"):
-        return
-    print(
-        "[+]Video Downloaded!",
-        path + "/" + number + leak_word + c_word + hack_word + "-trailer.mp4",
-    )
+            missing[url] = store.staging_path(url)
+    if missing:
+        fetched = parallel_download_files(missing.items(), parallel, priority=PRIORITY_ACTOR_PHOTO)
+        for (url, staging), r in zip(missing.items(), fetched):
+            if not r:
+                continue
+            try:
+                blobs[url] = store.add(url, staging)
+            except (OSError, sqlite3.Error) as e:
+                print(f"[-]Add '{url}' to image store failed: {e}")
+    result = []
+    for url, fullpath in dn_list:
+        blob = blobs.get(url)
+        if blob is None:
+            result.append(None)
+            continue
+        try:
+            link_or_copy(blob, fullpath)
+            result.append(str(fullpath))
+        except OSError:
+            result.append(None)
+    return result
 
 
 def actor_photo_download(actors, save_dir, number):
@@ -176,7 +395,11 @@ def actor_photo_download(actors, save_dir, number):
     parallel = min(len(dn_list), conf.extrafanart_thread_pool_download())
     if parallel > 100:
         print("[!]Warrning: Parallel download thread too large may cause website ban IP!")
-    result = parallel_download_files(dn_list, parallel)
+    store = get_image_store() if conf.actor_photo_store_switch() else None
+    if store is not None:
+        result = _download_via_store(store, dn_list, parallel)
+    else:
+        result = parallel_download_files(dn_list, parallel, priority=PRIORITY_ACTOR_PHOTO)
     failed = 0
     for i, r in enumerate(result):
         if not r:
@@ -201,23 +424,15 @@ def extrafanart_download_one_by_one(data, path, filepath, json_data=None):
     j = 1
     conf = config.getInstance()
     path = os.path.join(path, conf.get_extrafanart())
-    configProxy = conf.proxy()
     download_only_missing_images = conf.download_only_missing_images()
+    headers = json_data["headers"] if json_data is not None else None
     for url in data:
         jpg_filename = f"extrafanart-{j}.jpg"
         jpg_fullpath = os.path.join(path, jpg_filename)
         if download_only_missing_images and not file_not_exist_or_empty(jpg_fullpath):
             continue
-        if download_file_with_filename(url, jpg_filename, path, filepath, json_data) == "failed":
-            moveFailedFolder(filepath)
-            return
-        for i in range(configProxy.retry):
-            if file_not_exist_or_empty(jpg_fullpath):
-                print(f"[!]Image Download Failed! Trying again. [{i + 1}/3]")
-                download_file_with_filename(url, jpg_filename, path, filepath, json_data)
-                continue
-            else:
-                break
+        # 下载管理器内已按配置重试, 未完成的文件不会出现在目标路径
+        download_file_with_filename(url, jpg_filename, path, filepath, headers, priority=PRIORITY_EXTRAFANART)
         if file_not_exist_or_empty(jpg_fullpath):
             return
         print("[+]Image Downloaded!", Path(jpg_fullpath).name)
@@ -269,34 +484,31 @@ def image_ext(url):
 
 
 def image_download(cover, fanart_path, thumb_path, path, filepath, json_headers=None):
+    conf = config.getInstance()
     full_filepath = os.path.join(path, thumb_path)
-    if config.getInstance().download_only_missing_images() and not file_not_exist_or_empty(full_filepath):
+    if conf.download_only_missing_images() and not file_not_exist_or_empty(full_filepath):
         return
-    if json_headers is not None:
-        if download_file_with_filename(cover, thumb_path, path, filepath, json_headers["headers"]) == "failed":
-            moveFailedFolder(filepath)
-            return
+    # 同一封面(分段文件、重新刮削到其他目录)已在图片库中时直接链接
+    store = get_image_store() if conf.image_store() else None
+    blob = store.lookup(cover) if store is not None and cover else None
+    if blob is not None:
+        link_or_copy(blob, full_filepath)
+        print("[+]Image Linked!", Path(full_filepath).name)
     else:
-        if download_file_with_filename(cover, thumb_path, path, filepath) == "failed":
-            moveFailedFolder(filepath)
-            return
-
-    configProxy = config.getInstance().proxy()
-    for i in range(configProxy.retry):
+        headers = json_headers["headers"] if json_headers is not None else None
+        # 下载管理器内已按配置重试, 未完成的文件不会出现在目标路径
+        download_file_with_filename(cover, thumb_path, path, filepath, headers, priority=PRIORITY_COVER)
         if file_not_exist_or_empty(full_filepath):
-            print(f"[!]Image Download Failed! Trying again. [{i + 1}/3]")
-            if json_headers is not None:
-                download_file_with_filename(cover, thumb_path, path, filepath, json_headers["headers"])
-            else:
-                download_file_with_filename(cover, thumb_path, path, filepath)
-            continue
-        else:
-            break
-    if file_not_exist_or_empty(full_filepath):
-        return
-    print("[+]Image Downloaded!", Path(full_filepath).name)
-    if not config.getInstance().jellyfin():
-        shutil.copyfile(full_filepath, os.path.join(path, fanart_path))
+            return
+        print("[+]Image Downloaded!", Path(full_filepath).name)
+        if store is not None:
+            try:
+                store.add(cover, full_filepath, keep=True)
+            except (OSError, sqlite3.Error) as e:
+                print(f"[-]Add '{cover}' to image store failed: {e}")
+    if not conf.jellyfin():
+        # 内容相同, 加水印前会先断开链接
+        link_or_copy(full_filepath, os.path.join(path, fanart_path))
 
 
 # ------------------------------
@@ -304,6 +516,9 @@ def image_download(cover, fanart_path, thumb_path, path, filepath, json_headers=
 # ------------------------------
 __all__ = [
     # Common download functions
+    "stream_download",
+    "segmented_download",
+    "fetch_with_retry",
     "download_file_with_filename",
     "download_one_file",
     "parallel_download_files",
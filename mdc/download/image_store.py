@@ -0,0 +1,155 @@
+# build-in lib
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# project wide
+from mdc.config import config
+from mdc.file.common_utils import link_or_copy
+
+# 计算内容哈希时每次读取的块大小
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path) -> str:
+    """文件内容的 sha256"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ImageStore:
+    """
+    按内容寻址的本地图片库
+
+    图片按内容的 sha256 保存为 <root>/<哈希前两位>/<哈希><扩展名>, 内容相同的图片只保存一份.
+    index.db 记录 URL 到内容哈希的对应关系, 库中已有的 URL 不再请求网络;
+    derived 表记录由图片生成的图片(如按封面裁剪的海报), 相同输入和参数不再重新生成.
+    影片目录中的文件是库文件的硬链接或 reflink, 原地修改影片目录中的文件会同时改变库文件
+
+    :param root: 图片库目录
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # 放入文件的操作逐个进行, 合并下载的多个调用方依次处理同一个临时文件
+        self._add_lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.root / "index.db"), timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS image (url TEXT PRIMARY KEY, digest TEXT, ext TEXT, stored REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS derived (key TEXT PRIMARY KEY, digest TEXT, ext TEXT, stored REAL)"
+            )
+
+    def blob_path(self, digest: str, ext: str) -> Path:
+        return self.root / digest[:2] / f"{digest}{ext}"
+
+    def _find(self, table: str, column: str, value: str) -> Optional[Path]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT digest, ext FROM {table} WHERE {column} = ?", (value,)).fetchone()
+        if row is None:
+            return None
+        path = self.blob_path(*row)
+        if not path.is_file() or path.stat().st_size == 0:
+            return None
+        return path
+
+    def lookup(self, url: str) -> Optional[Path]:
+        """URL 对应的库文件, 没有记录或文件已被删除时返回 None"""
+        return self._find("image", "url", url)
+
+    def get_derived(self, key: str) -> Optional[Path]:
+        """生成参数 key 对应的库文件, 没有时返回 None"""
+        return self._find("derived", "key", key)
+
+    def staging_path(self, url: str) -> Path:
+        """下载中的临时文件路径, 同一 URL 总是相同, 便于下载管理器合并重复请求"""
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self.root / "tmp" / f"{name}{os.path.splitext(url.split('?')[0])[1]}"
+
+    def _store(self, path: Path, keep: bool) -> Path:
+        digest = file_digest(path)
+        blob = self.blob_path(digest, path.suffix)
+        if blob.is_file():
+            if keep:
+                link_or_copy(blob, path)
+            else:
+                path.unlink()
+        elif keep:
+            link_or_copy(path, blob)
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, blob)
+        return blob
+
+    def _record(self, table: str, column: str, value: str, blob: Path) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {table} ({column}, digest, ext, stored) VALUES (?, ?, ?, ?)",
+                (value, blob.stem, blob.suffix, time.time()),
+            )
+
+    def add(self, url: str, path, keep: bool = False) -> Path:
+        """
+        把下载好的文件放入图片库并记录 URL
+
+        keep 为假时文件移入图片库, 库中已有相同内容时删除该文件;
+        keep 为真时文件保留在原处并与库文件链接.
+        同一 URL 的下载被下载管理器合并时, 每个调用方都会用同一个临时文件调用,
+        第一个调用已经把文件移入图片库后, 其余调用直接返回库文件
+
+        :return: 库文件路径
+        """
+        path = Path(path)
+        with self._add_lock:
+            if not keep and not path.exists():
+                blob = self.lookup(url)
+                if blob is not None:
+                    return blob
+            blob = self._store(path, keep)
+            self._record("image", "url", url, blob)
+        return blob
+
+    def put_derived(self, key: str, path) -> Path:
+        """记录生成的图片, 文件保留在原处"""
+        blob = self._store(Path(path), True)
+        self._record("derived", "key", key, blob)
+        return blob
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[ImageStore] = None
+_store_lock = threading.Lock()
+
+
+def get_image_store() -> Optional[ImageStore]:
+    """
+    打开全局图片库, 无法打开时返回 None
+
+    是否使用图片库由调用方按各自的开关([actor_photo] store_switch, [common] image_store)决定
+    """
+    global _store
+    conf = config.getInstance()
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    _store = ImageStore(conf.actor_photo_store_folder())
+                except (OSError, sqlite3.Error) as e:
+                    print(f"[-]Open image store '{conf.actor_photo_store_folder()}' failed: {e}")
+                    return None
+    return _store
@@ -0,0 +1,165 @@
+# build-in lib
+import heapq
+import itertools
+import os
+import shutil
+import threading
+import typing
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# project wide
+from mdc.config import config
+
+# 下载优先级, 数字小的先下载
+PRIORITY_COVER = 0
+PRIORITY_SUBTITLE = 1
+PRIORITY_ACTOR_PHOTO = 2
+PRIORITY_EXTRAFANART = 3
+PRIORITY_TRAILER = 4
+
+
+class _Job:
+    __slots__ = ("url", "dest", "fetch", "waiters")
+
+    def __init__(self, url: str, dest, fetch: Callable[[str, str], bool]):
+        self.url = url
+        self.dest = dest
+        self.fetch = fetch
+        # [(保存路径, Future)], 第一个是实际下载的路径
+        self.waiters: List[Tuple[typing.Any, Future]] = [(dest, Future())]
+
+
+class DownloadManager:
+    """
+    全局下载管理器
+
+    所有图片、预告片、字幕下载都提交到这里, 按优先级排队(封面 > 字幕 > 演员照片 > 剧照 > 预告片),
+    总并发数和同一站点的并发数都有上限. 每个站点一个队列, 空闲的下载线程只从还有空位的站点中
+    取优先级最高的任务, 不会因为等待某个慢站点而耽误其他站点的任务.
+    同一 URL 正在下载时再次提交不会重复下载, 完成后复制到各自的保存路径
+
+    :param workers: 同时下载的最大数量
+    :param host_workers: 同一站点同时下载的最大数量
+    """
+
+    def __init__(self, workers: int = 10, host_workers: int = 4):
+        self.workers = max(1, workers)
+        self.host_workers = max(1, host_workers)
+        self._seq = itertools.count()
+        self._inflight: Dict[str, _Job] = {}
+        # 站点 -> [(优先级, 序号, 任务)] 堆
+        self._host_queues: Dict[str, list] = {}
+        # 站点 -> 正在下载的数量
+        self._host_active: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, url: str, dest, fetch: Callable[[str, str], bool], priority: int = PRIORITY_EXTRAFANART) -> Future:
+        """
+        提交下载任务
+
+        :param fetch: fetch(url, 保存路径) 实际下载, 成功返回 True, 文件不存在返回 False, 失败抛出异常
+        :param dest: 保存路径, str 或 Path, 原样传给 fetch
+        :return: Future, 结果为 dest, 文件不存在时为 None
+        """
+        with self._lock:
+            job = self._inflight.get(url)
+            if job is not None:
+                future = Future()
+                job.waiters.append((dest, future))
+                return future
+            job = self._inflight[url] = _Job(url, dest, fetch)
+            future = job.waiters[0][1]
+            self._start_workers()
+            heapq.heappush(self._host_queues.setdefault(_host(url), []), (priority, next(self._seq), job))
+            self._cond.notify()
+        return future
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, name=f"download_{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _take(self) -> Optional[Tuple[str, _Job]]:
+        """取出有空位的站点中优先级最高的任务, 调用时持有 _lock"""
+        best = None
+        for host, jobs in self._host_queues.items():
+            if jobs and self._host_active.get(host, 0) < self.host_workers:
+                if best is None or jobs[0][:2] < self._host_queues[best][0][:2]:
+                    best = host
+        if best is None:
+            return None
+        job = heapq.heappop(self._host_queues[best])[2]
+        if not self._host_queues[best]:
+            del self._host_queues[best]
+        self._host_active[best] = self._host_active.get(best, 0) + 1
+        return best, job
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                taken = self._take()
+                while taken is None:
+                    self._cond.wait()
+                    taken = self._take()
+            host, job = taken
+            ok, error = False, None
+            try:
+                ok = job.fetch(job.url, job.dest)
+            except BaseException as e:
+                error = e
+            with self._cond:
+                self._host_active[host] -= 1
+                if not self._host_active[host]:
+                    del self._host_active[host]
+                # 该站点空出位置, 等待它的任务可以开始
+                self._cond.notify_all()
+            self._finish(job, ok, error)
+
+    def _finish(self, job: _Job, ok: bool, error: Optional[BaseException]) -> None:
+        with self._lock:
+            self._inflight.pop(job.url, None)
+            waiters = list(job.waiters)
+        for dest, future in waiters:
+            if error is not None:
+                future.set_exception(error)
+            elif not ok:
+                future.set_result(None)
+            elif str(dest) == str(job.dest):
+                future.set_result(dest)
+            else:
+                try:
+                    _copy_atomic(job.dest, dest)
+                    future.set_result(dest)
+                except OSError as e:
+                    future.set_exception(e)
+
+
+def _host(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def _copy_atomic(src, dest) -> None:
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    tmp = f"{dest}.part"
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+_manager: Optional[DownloadManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_download_manager() -> DownloadManager:
+    """按配置创建全局下载管理器"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                conf = config.getInstance()
+                _manager = DownloadManager(conf.download_workers(), conf.download_host_workers())
+    return _manager
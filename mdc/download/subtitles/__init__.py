@@ -4,6 +4,7 @@ import requests
 from lxml import html
 
 from mdc.config import config
+from mdc.download.manager import PRIORITY_SUBTITLE, get_download_manager
 from mdc.utils.http.ssl_warnings import disable_insecure_request_warning
 
 headers = {
@@ -73,19 +74,27 @@ def open_download(subtitle_link, path, number, leak_word, c_word, hack_word):
     download_link = download_links[0]
     print(f"找到下载链接: {download_link}")
     subtitle_download_url = f"https://subtitlecat.com/{download_link}"
+    sub_targetpath = Path(path) / f"{number}{leak_word}{c_word}{hack_word}.{ext}"
+    future = get_download_manager().submit(subtitle_download_url, sub_targetpath, _fetch_subtitle, PRIORITY_SUBTITLE)
+    if future.result() is None:
+        print("字幕文件下载失败")
+        return False
+    print(f"保存字幕至: {sub_targetpath}")
+    return True
+
+
+def _fetch_subtitle(url, target) -> bool:
+    """下载管理器使用的字幕下载函数"""
+    config_proxy = config.getInstance().proxy()
     if config_proxy.enable:
-        proxies = config_proxy.proxies()
-        subtitle_response = requests.get(subtitle_download_url, headers=headers, proxies=proxies)
+        subtitle_response = requests.get(url, headers=headers, proxies=config_proxy.proxies())
     else:
-        subtitle_response = requests.get(subtitle_page_url, headers=headers)
-    print(f"下载字幕: {subtitle_download_url}, 状态码: {subtitle_response.status_code}")
+        subtitle_response = requests.get(url, headers=headers)
+    print(f"下载字幕: {url}, 状态码: {subtitle_response.status_code}")
     if subtitle_response.status_code != 200:
         return False
     if "404 未找到".encode("utf-8") in subtitle_response.content:
-        print("字幕文件下载失败")
         return False
-    sub_targetpath = Path(path) / f"{number}{leak_word}{c_word}{hack_word}.{ext}"
-    print(f"保存字幕至: {sub_targetpath}")
-    with open(sub_targetpath, "wb") as file:
+    with open(target, "wb") as file:
         file.write(subtitle_response.content)
     return True
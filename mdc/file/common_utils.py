@@ -1,6 +1,10 @@
 import os
+import shutil
 from pathlib import Path
 
+# Linux 下 ioctl(FICLONE) 请求号, 用于在 btrfs/xfs 等文件系统上创建写时复制的副本
+FICLONE = 0x40049409
+
 
 def file_not_exist_or_empty(filepath):
     if not os.path.exists(filepath):
@@ -10,6 +14,71 @@ def file_not_exist_or_empty(filepath):
     return False
 
 
+def _reflink(src, dst) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        return False
+
+
+def link_or_copy(src, dst) -> str:
+    """
+    让 dst 成为 src 的副本, 依次尝试硬链接、reflink(写时复制)、复制文件
+
+    dst 已存在时被替换, 先写入临时文件再重命名, 中断时不会留下不完整的 dst
+
+    :return: 实际使用的方式 "link" / "reflink" / "copy"
+    """
+    src, dst = str(src), str(dst)
+    # 已经是同一个文件的硬链接, rename 到同一个 inode 时什么也不做, 会留下临时文件
+    if os.path.isfile(dst) and os.path.samefile(src, dst):
+        return "link"
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    tmp = f"{dst}.link"
+    if os.path.lexists(tmp):
+        os.unlink(tmp)
+    try:
+        os.link(src, tmp)
+        mode = "link"
+    except OSError:
+        if _reflink(src, tmp):
+            mode = "reflink"
+        else:
+            shutil.copyfile(src, tmp)
+            mode = "copy"
+    try:
+        os.replace(tmp, dst)
+    except OSError:
+        os.unlink(tmp)
+        raise
+    return mode
+
+
+def unshare_file(path) -> bool:
+    """
+    原地修改文件前调用, 文件有多个硬链接时替换为独立的副本, 避免同时修改图片库或其他影片中的文件
+
+    :return: 是否进行了替换
+    """
+    path = str(path)
+    if not os.path.isfile(path) or os.stat(path).st_nlink <= 1:
+        return False
+    tmp = f"{path}.unshare"
+    shutil.copyfile(path, tmp)
+    os.replace(tmp, path)
+    return True
+
+
 def windows_long_path(path: Path) -> Path:
     if os.name != "nt":
         return path
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import threading
+import time
+import typing
+from pathlib import Path
+
+from mdc.config import config
+
+DAY = 86400
+
+
+class FailedList:
+    """
+    刮削失败的影片列表
+
+    模式3或链接模式下失败的影片留在原处, 记录在这里, 扫描时逐个查询, 在重试时间之前跳过.
+    每条记录保存失败原因、查询过的数据源、失败次数和时间. 第n次失败后等待 retry_days * 2^(n-1) 天再重试,
+    最多等待 retry_max_days 天, retry_days <= 0 时不再重试.
+    首次打开时导入旧版的 failed_list.txt, 导入后改名为 failed_list.txt.imported
+
+    :param path: 数据库文件路径
+    :param retry_days: 第一次失败后等待重试的天数
+    :param retry_max_days: 最长等待天数
+    """
+
+    def __init__(self, path: str, retry_days: float = 1, retry_max_days: float = 30):
+        self.path = path
+        self.retry_days = retry_days
+        self.retry_max_days = retry_max_days
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS failed ("
+                "path TEXT PRIMARY KEY, reason TEXT, sources TEXT, attempts INTEGER, first_failed REAL, last_failed REAL)"
+            )
+        self._import_txt(os.path.join(os.path.dirname(path), "failed_list.txt"))
+
+    def _import_txt(self, txt: str) -> None:
+        try:
+            lines = Path(txt).read_text(encoding="utf-8").splitlines()
+            mtime = os.path.getmtime(txt)
+        except OSError:
+            return
+        rows = [(line, "failed_list.txt", "", 1, mtime, mtime) for line in dict.fromkeys(lines) if line.strip()]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO failed (path, reason, sources, attempts, first_failed, last_failed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        os.replace(txt, f"{txt}.imported")
+        print(f"[+]Imported {len(rows)} movies from '{txt}' into failed list '{self.path}'.")
+
+    def record(self, path: str, reason: str = "", sources: typing.Iterable[str] = ()) -> None:
+        """记录一次失败, 已有记录时失败次数加一"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO failed (path, reason, sources, attempts, first_failed, last_failed) "
+                "VALUES (?, ?, ?, 1, ?, ?) ON CONFLICT(path) DO UPDATE SET "
+                "reason = excluded.reason, sources = excluded.sources, "
+                "attempts = attempts + 1, last_failed = excluded.last_failed",
+                (str(path), reason, ",".join(sources), now, now),
+            )
+
+    def remove(self, path: str) -> None:
+        """影片重试成功后删除记录"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM failed WHERE path = ?", (str(path),))
+
+    def get(self, path: str) -> typing.Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT reason, sources, attempts, first_failed, last_failed FROM failed WHERE path = ?", (str(path),)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("reason", "sources", "attempts", "first_failed", "last_failed"), row))
+
+    def paths_under(self, root: str) -> typing.List[str]:
+        """root 目录下所有记录的影片路径"""
+        prefix = os.path.join(str(root), "")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM failed WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def retry_after(self, attempts: int, last_failed: float) -> float:
+        """可以重试的时间, 不再重试时为 inf"""
+        if self.retry_days <= 0:
+            return float("inf")
+        wait = min(self.retry_days * 2 ** max(attempts - 1, 0), self.retry_max_days)
+        return last_failed + wait * DAY
+
+    def should_skip(self, path: str, now: typing.Optional[float] = None) -> bool:
+        """失败过且还没到重试时间"""
+        record = self.get(path)
+        if record is None:
+            return False
+        now = time.time() if now is None else now
+        return now < self.retry_after(record["attempts"], record["last_failed"])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_failed_lists: typing.Dict[str, FailedList] = {}
+_failed_lists_lock = threading.Lock()
+
+
+def get_failed_list() -> typing.Optional[FailedList]:
+    """打开失败输出文件夹中的失败列表, 无法打开时返回 None"""
+    conf = config.getInstance()
+    path = os.path.abspath(os.path.join(conf.failed_folder(), "failed_list.db"))
+    with _failed_lists_lock:
+        failed = _failed_lists.get(path)
+        if failed is None:
+            try:
+                failed = _failed_lists[path] = FailedList(path, conf.failed_retry_days(), conf.failed_retry_max_days())
+            except sqlite3.Error as e:
+                print(f"[-]Open failed list '{path}' failed: {e}")
+                return None
+        return failed
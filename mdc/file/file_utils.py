@@ -1,15 +1,22 @@
 import os
 import shutil
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Iterator, Optional
+from typing import Iterable, Iterator, Optional
 from xml.etree import ElementTree as ET
 
 from mdc.config import config
 from mdc.file.common_utils import windows_long_path
+from mdc.file.failed_list import get_failed_list
 from mdc.utils.translation import is_japanese
 
+# 多线程刮削时多个线程可能同时追加失败记录
+_failed_record_lock = threading.Lock()
+# 本次运行中处理失败、尚未由 finishMovie 取走的影片
+_failed_in_run = set()
+
 
 def escape_path(path, escape_literals: str):  # Remove escape literals
     backslash = "\\"
@@ -18,22 +25,30 @@ def escape_path(path, escape_literals: str):  # Remove escape literals
     return path
 
 
-def moveFailedFolder(filepath):
+def moveFailedFolder(filepath, reason: str = "", sources: Iterable[str] = ()):
+    """
+    处理刮削失败的影片
+
+    :param reason: 失败原因, 记入失败列表
+    :param sources: 查询过的数据源, 记入失败列表
+    """
     conf = config.getInstance()
     failed_folder = conf.failed_folder()
     link_mode = conf.link_mode()
-    # 模式3或软连接，改为维护一个失败列表，启动扫描时加载用于排除该路径，以免反复处理
+    with _failed_record_lock:
+        _failed_in_run.add(os.path.abspath(filepath))
+    # 模式3或软连接，改为维护一个失败列表，扫描时查询用于排除该路径，以免反复处理
     # 原先的创建软连接到失败目录，并不直观，不方便找到失败文件位置，不如直接记录该文件路径
     if conf.main_mode() == 3 or link_mode:
-        ftxt = os.path.abspath(os.path.join(failed_folder, "failed_list.txt"))
-        print("[-]Add to Failed List file, see '%s'" % ftxt)
-        with open(ftxt, "a", encoding="utf-8") as flt:
-            flt.write(f"{filepath}\n")
+        failed = get_failed_list()
+        if failed is not None:
+            print(f"[-]Add to Failed List, see '{failed.path}'")
+            failed.record(os.path.abspath(filepath), reason, sources)
     elif conf.failed_move() and not link_mode:
         failed_name = os.path.join(failed_folder, os.path.basename(filepath))
         mtxt = os.path.abspath(os.path.join(failed_folder, "where_was_i_before_being_moved.txt"))
         print("'[-]Move to Failed output folder, see '%s'" % mtxt)
-        with open(mtxt, "a", encoding="utf-8") as wwibbmt:
+        with _failed_record_lock, open(mtxt, "a", encoding="utf-8") as wwibbmt:
             tmstr = datetime.now().strftime("%Y-%m-%d %H:%M")
             wwibbmt.write(f"{tmstr} FROM[{filepath}]TO[{failed_name}]\n")
         try:
@@ -45,6 +60,25 @@ def moveFailedFolder(filepath):
             print("[-]File Moving to FailedFolder unsuccessful!")
 
 
+def finishMovie(filepath) -> bool:
+    """
+    一部影片处理结束后调用, 返回本次处理是否成功(期间没有调用 moveFailedFolder)
+
+    模式3或软连接模式下成功时从失败列表中删除该影片, 以前失败过的影片重试成功后不再按失败重试
+    """
+    path = os.path.abspath(filepath)
+    with _failed_record_lock:
+        if path in _failed_in_run:
+            _failed_in_run.discard(path)
+            return False
+    conf = config.getInstance()
+    if conf.main_mode() == 3 or conf.link_mode():
+        failed = get_failed_list()
+        if failed is not None:
+            failed.remove(path)
+    return True
+
+
 def create_folder(json_data):  # 创建文件夹
     (
         title,
@@ -78,12 +112,13 @@ def create_folder(json_data):  # 创建文件夹
     if not os.path.exists(path):
         path = escape_path(path, conf.escape_literals())
         try:
-            os.makedirs(path)
+            # 多线程时同演员的不同影片可能同时创建同一目录
+            os.makedirs(path, exist_ok=True)
         except OSError:
             path = success_folder + "/" + location_rule.replace("/[" + number + ")-" + title, "/number")
             path = escape_path(path, conf.escape_literals())
             try:
-                os.makedirs(path)
+                os.makedirs(path, exist_ok=True)
             except OSError:
                 print(f"[-]Fatal error! Can not make folder '{path}'")
                 os._exit(0)
@@ -1,17 +1,223 @@
+import json
 import os
 import re
+import sqlite3
+import threading
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from mdc.config import config
+from mdc.file.failed_list import FailedList, get_failed_list
+from mdc.file.scan_index import DirRecord, ScanIndex, open_scan_index
+from mdc.file.subtitle_index import SubtitleIndex, set_subtitle_index
 
 
-def movie_lists(source_folder: str, regexstr: str) -> typing.Iterator[str]:
+def _list_dir(path: str, file_type: typing.Collection[str]) -> typing.Tuple[typing.List[str], typing.List[str], int]:
+    """
+    列出一个目录, 返回 (扩展名匹配的文件名, 子目录名, 条目总数), 文件名和目录名按名称排序. 无法访问时返回空列表
+
+    与 os.walk 相同: 指向目录的符号链接不进入, 也不作为文件返回
+    """
+    files, dirs = [], []
+    entries = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                entries += 1
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if is_dir:
+                    if not entry.is_symlink():
+                        dirs.append(entry.name)
+                elif os.path.splitext(entry.name)[1].lower() in file_type:
+                    files.append(entry.name)
+    except OSError:
+        pass
+    files.sort()
+    dirs.sort()
+    return files, dirs, entries
+
+
+def _scan_dir(
+    path: str, file_type: typing.Collection[str], index: typing.Optional[ScanIndex]
+) -> typing.Tuple[DirRecord, typing.List[str]]:
+    """
+    扫描一个目录, 返回 (目录记录, 需要返回的文件名)
+
+    有索引时修改时间未变的目录不再列出, 沿用上次的记录, 没有需要返回的文件;
+    变化的目录重新列出, 只返回上次没有的文件
+    """
+    if index is None:
+        files, dirs, entries = _list_dir(path, file_type)
+        return DirRecord(None, entries, tuple(files), tuple(dirs)), files
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return DirRecord(None, 0, (), ()), []
+    old = index.get(path)
+    if old is not None and old.mtime == mtime and index.trusted(mtime):
+        return old, []
+    files, dirs, entries = _list_dir(path, file_type)
+    # 内容变化而修改时间不变, 说明该文件系统的目录修改时间不可靠
+    if mtime == 0 or (old is not None and old.mtime == mtime and old.entries != entries):
+        index.mark_unreliable(path)
+    if old is not None:
+        seen = set(old.files)
+        new_files = [f for f in files if f not in seen]
+    else:
+        new_files = files
+    return DirRecord(mtime, entries, tuple(files), tuple(dirs)), new_files
+
+
+def walk_movies(
+    source: str,
+    file_type: typing.Collection[str],
+    escape_folders: typing.Collection[str] = (),
+    workers: int = 8,
+    index: typing.Optional[ScanIndex] = None,
+    subtitles: typing.Optional[SubtitleIndex] = None,
+) -> typing.Iterator[str]:
+    """
+    多线程遍历目录, 按名称排序的深度优先顺序返回扩展名匹配的文件完整路径
+
+    目录被处理时即把它的子目录提交到线程池列出, 网络文件系统(SMB/NFS)上多个目录同时等待响应.
+    每个目录先返回其中的文件再进入子目录, 与 os.walk 的顺序一致, 每次运行的顺序相同
+
+    :param file_type: 小写的扩展名集合, 如 {".mp4", ".mkv"}
+    :param escape_folders: 不进入的目录名
+    :param workers: 同时列出的目录数
+    :param index: 增量扫描索引, 给出时只返回上次扫描后新出现的文件, 并把本次结果记入索引
+    :param subtitles: 字幕索引, 给出时同一次遍历中记录所有字幕文件(包括增量扫描时未变化的目录中的)
+    """
+    list_type = file_type
+    if subtitles is not None:
+        list_type = set(file_type) | set(subtitles.sub_types)
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="scan")
+    try:
+        stack = [(source, pool.submit(_scan_dir, source, list_type, index))]
+        while stack:
+            path, future = stack.pop()
+            record, files = future.result()
+            if index is not None:
+                index.put(path, record)
+            if subtitles is not None:
+                for name in record.files:
+                    if subtitles.accept(name):
+                        subtitles.add(os.path.join(path, name))
+                files = [f for f in files if os.path.splitext(f)[1].lower() in file_type]
+            for name in files:
+                yield os.path.join(path, name)
+            children = [os.path.join(path, name) for name in record.dirs if name not in escape_folders]
+            stack.extend((child, pool.submit(_scan_dir, child, list_type, index)) for child in reversed(children))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class MovieList:
+    """
+    movie_lists 的结果, 按遍历顺序迭代影片路径
+
+    后台线程遍历目录并过滤, 迭代时随时取得已经找到的影片, 不必等待遍历结束;
+    total() 等待遍历结束并返回准确的影片数量, 用于显示进度百分比.
+    遍历正常结束后字幕索引才标记为完整
+    """
+
+    def __init__(
+        self,
+        movies: typing.Iterable[str],
+        index: typing.Optional[ScanIndex] = None,
+        subtitles: typing.Optional[SubtitleIndex] = None,
+        failed: typing.Optional[FailedList] = None,
+    ):
+        self.index = index
+        self.subtitles = subtitles
+        self.failed = failed
+        self._items: typing.List[str] = []
+        self._done: typing.Set[str] = set()
+        self._finished = False
+        self._index = 0
+        self._error: typing.Optional[BaseException] = None
+        self._cond = threading.Condition()
+        threading.Thread(target=self._collect, args=(movies,), name="movie_list", daemon=True).start()
+
+    def _collect(self, movies: typing.Iterable[str]) -> None:
+        try:
+            for movie in movies:
+                with self._cond:
+                    self._items.append(movie)
+                    self._cond.notify_all()
+            if self.subtitles is not None:
+                self.subtitles.complete = True
+        except BaseException as e:
+            self._error = e
+        finally:
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+
+    def __iter__(self) -> "MovieList":
+        return self
+
+    def __next__(self) -> str:
+        with self._cond:
+            while self._index >= len(self._items) and not self._finished:
+                self._cond.wait()
+            if self._index < len(self._items):
+                self._index += 1
+                return self._items[self._index - 1]
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise error
+            raise StopIteration
+
+    def total(self) -> int:
+        with self._cond:
+            while not self._finished:
+                self._cond.wait()
+            return len(self._items)
+
+    def taken(self) -> typing.List[str]:
+        """已经取出(交给处理)的影片"""
+        with self._cond:
+            return self._items[: self._index]
+
+    def mark_done(self, movie: str) -> None:
+        """影片处理成功, 保存索引时记为已处理"""
+        with self._cond:
+            self._done.add(movie)
+
+    def save_index(self) -> None:
+        """
+        本次运行正常结束后保存增量扫描索引
+
+        只有 mark_done 过的影片记为已处理, 失败的和未处理的(如达到 stop_counter)下次扫描时仍会返回.
+        失败列表中的影片(本次因等待重试而跳过的)也不记入索引, 到了重试时间仍能被扫描到.
+        遍历未完成时不保存
+        """
+        if self.index is None:
+            return
+        with self._cond:
+            if not self._finished or self._error is not None:
+                return
+            pending = [movie for movie in self._items if movie not in self._done]
+        try:
+            if self.failed is not None:
+                pending += self.failed.paths_under(self.index.root)
+            self.index.save(pending)
+        except sqlite3.Error as e:
+            print(f"[-]Save scan index '{self.index.path}' failed: {e}")
+
+
+def movie_lists(source_folder: str, regexstr: str) -> MovieList:
     conf = config.getInstance()
     main_mode = conf.main_mode()
     debug = conf.debug()
     link_mode = conf.link_mode()
-    file_type = conf.media_type().lower().split(",")
+    file_type = set(conf.media_type().lower().split(","))
+    set_subtitle_index(None)
     trailerRE = re.compile(r"-trailer\.", re.IGNORECASE)
     cliRE = None
     if isinstance(regexstr, str) and len(regexstr):
@@ -19,55 +225,51 @@ def movie_lists(source_folder: str, regexstr: str) -> typing.Iterator[str]:
             cliRE = re.compile(regexstr, re.IGNORECASE)
         except re.error:
             pass
-    failed_list_txt_path = Path(conf.failed_folder()).resolve() / "failed_list.txt"
-    failed_set = set()
+    # 失败列表逐个查询, 不预先全部读入
+    failed = None
     if (main_mode == 3 or link_mode) and not conf.ignore_failed_list():
-        try:
-            flist = failed_list_txt_path.read_text(encoding="utf-8").splitlines()
-            failed_set = set(flist)
-            if len(flist) != len(
-                failed_set
-            ):  # 检查去重并写回，但是不改变failed_list.txt内条目的先后次序，重复的只保留最后的
-                fset = failed_set.copy()
-                for i in range(len(flist) - 1, -1, -1):
-                    fset.remove(flist[i]) if flist[i] in fset else flist.pop(i)
-                failed_list_txt_path.write_text("\n".join(flist) + "\n", encoding="utf-8")
-                assert len(fset) == 0 and len(flist) == len(failed_set)
-        except OSError:
-            pass
+        failed = get_failed_list()
     if not Path(source_folder).is_dir():
         print("[-]Source folder not found!")
-        return iter(())
+        return MovieList(())
     source = Path(source_folder).resolve()
     skip_failed_cnt = 0
-    escape_folder_set = set(re.split("[,，]", conf.escape_folder()))
+    escape_folder_set = set(re.split("[,，]", conf.escape_folder())) if main_mode != 3 else set()
+    if set(source.parts) & escape_folder_set:
+        return MovieList(())
+    scan_workers = conf.scan_workers()
+    # 按正则表达式只处理部分影片时, 其余影片不能记为已处理, 不使用增量扫描
+    # 字幕与影片在同一次遍历中找出, 处理每部影片时按文件名直接查找, 不再遍历影片所在目录
+    subtitles = SubtitleIndex(str(source), conf.sub_rule(), escape_folder_set)
+    set_subtitle_index(subtitles)
+    index = None
+    if cliRE is None:
+        signature = [sorted(file_type), sorted(escape_folder_set), sorted(subtitles.sub_types)]
+        index = open_scan_index(str(source), json.dumps(signature))
+        if index is not None and index.full:
+            print("[+]Full scan, building scan index.")
 
     def _iter_movies() -> typing.Iterator[str]:
         nonlocal skip_failed_cnt
-        for root, dirs, files in os.walk(source):
-            root_path = Path(root)
-            if main_mode != 3 and set(root_path.parts) & escape_folder_set:
-                dirs[:] = []
+        for absf in walk_movies(str(source), file_type, escape_folder_set, scan_workers, index, subtitles):
+            if failed is not None and failed.should_skip(absf):
+                skip_failed_cnt += 1
+                if debug:
+                    print(f"[!]Skip failed movie '{absf}'")
                 continue
-            for file in files:
-                full_name = root_path / file
-                if full_name.suffix.lower() not in file_type:
-                    continue
-                absf = str(full_name)
-                if absf in failed_set:
-                    skip_failed_cnt += 1
-                    if debug:
-                        print(f"[!]Skip failed movie '{absf}'")
-                    continue
-                if trailerRE.search(absf):
-                    if debug:
-                        print(f"[!]Skip trailer '{absf}'")
-                    continue
-                if cliRE and not cliRE.search(absf):
-                    continue
-                yield absf
+            if trailerRE.search(absf):
+                if debug:
+                    print(f"[!]Skip trailer '{absf}'")
+                continue
+            if cliRE and not cliRE.search(absf):
+                continue
+            yield absf
 
         if skip_failed_cnt:
-            print(f"[!]Skip {skip_failed_cnt} movies in failed list '{failed_list_txt_path}'.")
+            print(f"[!]Skip {skip_failed_cnt} movies in failed list '{failed.path}'.")
 
-    return _iter_movies()
+    # 失败的影片留在源文件夹中, 增量扫描时不能记为已处理, 否则到了重试时间也不会再返回
+    retry = None
+    if index is not None and (main_mode == 3 or link_mode):
+        retry = failed or get_failed_list()
+    return MovieList(_iter_movies(), index, subtitles, retry)
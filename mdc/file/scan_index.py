@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import typing
+from pathlib import Path
+
+from mdc.config import config
+
+
+class DirRecord(typing.NamedTuple):
+    """目录的扫描记录, mtime 为 st_mtime_ns, 为 None 时下次必须重新列出"""
+
+    mtime: typing.Optional[int]
+    entries: int
+    files: typing.Tuple[str, ...]
+    dirs: typing.Tuple[str, ...]
+
+
+class ScanIndex:
+    """
+    增量扫描索引
+
+    记录源文件夹下每个目录的修改时间、条目数、其中的影片文件和子目录.
+    再次扫描时修改时间未变的目录不再列出, 直接使用记录的子目录继续检查, 只返回新出现的影片文件.
+    目录的修改时间只随直接包含的条目变化, 因此每个目录仍需 stat 一次, 但不再读取目录内容.
+
+    以下情况进行完整扫描: 没有该源文件夹的记录, 扩展名或排除目录等设置改变,
+    曾经发现修改时间不可靠(目录内容变化但修改时间未变, 或修改时间为0)
+
+    :param path: 数据库文件路径
+    :param root: 源文件夹绝对路径
+    :param signature: 影响扫描结果的设置, 改变后重新完整扫描
+    """
+
+    # 修改时间的精度, 上次扫描前这段时间内修改过的目录仍重新列出
+    MTIME_GRANULARITY_NS = 2 * 10**9
+
+    def __init__(self, path: str, root: str, signature: str):
+        self.path = path
+        self.root = root
+        self.signature = signature
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS scan_root ("
+                "root TEXT PRIMARY KEY, signature TEXT, reliable INTEGER, scanned INTEGER, saved REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS scan_dir ("
+                "root TEXT, path TEXT, mtime INTEGER, entries INTEGER, files TEXT, dirs TEXT, PRIMARY KEY (root, path))"
+            )
+            row = self._conn.execute(
+                "SELECT signature, reliable, scanned FROM scan_root WHERE root = ?", (root,)
+            ).fetchone()
+            self.reliable = bool(row[1]) if row is not None else True
+            self.full = row is None or row[0] != signature or not self.reliable
+            self.last_scan: typing.Optional[int] = row[2] if row is not None else None
+            self._old: typing.Dict[str, DirRecord] = {}
+            if not self.full:
+                for path_, mtime, entries, files, dirs in self._conn.execute(
+                    "SELECT path, mtime, entries, files, dirs FROM scan_dir WHERE root = ?", (root,)
+                ):
+                    self._old[path_] = DirRecord(mtime, entries, tuple(json.loads(files)), tuple(json.loads(dirs)))
+        self._new: typing.Dict[str, DirRecord] = {}
+        self.started = time.time_ns()
+
+    def trusted(self, mtime: int) -> bool:
+        """修改时间在上次扫描开始前足够早, 相同就可以认为目录未变化"""
+        return self.last_scan is not None and mtime < self.last_scan - self.MTIME_GRANULARITY_NS
+
+    def get(self, path: str) -> typing.Optional[DirRecord]:
+        """上次的记录, 完整扫描时总是 None"""
+        return None if self.full else self._old.get(path)
+
+    def put(self, path: str, record: DirRecord) -> None:
+        self._new[path] = record
+
+    def mark_unreliable(self, path: str) -> None:
+        if self.reliable:
+            print(f"[!]Directory modification time is unreliable at '{path}', next scan will be a full scan.")
+        self.reliable = False
+
+    def save(self, pending: typing.Iterable[str] = ()) -> None:
+        """
+        保存本次扫描的结果, 只在本次运行正常结束后调用
+
+        :param pending: 找到但未处理的影片, 不记入索引, 所在目录下次重新列出
+        """
+        pending_files: typing.Dict[str, typing.Set[str]] = {}
+        for p in pending:
+            pending_files.setdefault(os.path.dirname(p), set()).add(os.path.basename(p))
+        rows = []
+        for path, rec in self._new.items():
+            skip = pending_files.get(path)
+            files = [f for f in rec.files if not skip or f not in skip]
+            mtime = None if skip else rec.mtime
+            rows.append((self.root, path, mtime, rec.entries, json.dumps(files), json.dumps(rec.dirs)))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM scan_dir WHERE root = ?", (self.root,))
+            self._conn.executemany(
+                "INSERT INTO scan_dir (root, path, mtime, entries, files, dirs) VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scan_root (root, signature, reliable, scanned, saved) VALUES (?, ?, ?, ?, ?)",
+                (self.root, self.signature, int(self.reliable), self.started, time.time()),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_scan_index(root: str, signature: str) -> typing.Optional[ScanIndex]:
+    """按配置打开源文件夹的扫描索引, 未开启或无法打开时返回 None"""
+    conf = config.getInstance()
+    if not conf.incremental_scan():
+        return None
+    try:
+        return ScanIndex(conf.scan_index_file(), root, signature)
+    except sqlite3.Error as e:
+        print(f"[-]Open scan index '{conf.scan_index_file()}' failed: {e}")
+        return None
@@ -0,0 +1,84 @@
+import os
+import threading
+import typing
+
+
+def subtitle_key(name: str) -> str:
+    """字幕与影片按文件名第一个点之前的部分(忽略大小写)对应, 如 ABC-123.chs.srt -> abc-123"""
+    return name.split(".")[0].lower()
+
+
+class SubtitleIndex:
+    """
+    扫描源文件夹时建立的字幕索引
+
+    按文件名前缀和所在目录记录字幕文件, 每部影片查找字幕时不再递归遍历目录.
+    只有遍历完成(complete)后, 在源文件夹范围内的查询才使用索引, 其他情况由调用方遍历目录
+
+    :param root: 源文件夹绝对路径
+    :param sub_types: 小写的字幕扩展名集合
+    :param escape_folders: 遍历时没有进入的目录名, 这些目录下的查询不使用索引
+    """
+
+    def __init__(self, root: str, sub_types: typing.Collection[str], escape_folders: typing.Collection[str] = ()):
+        self.root = os.path.abspath(root)
+        self.sub_types = sub_types
+        self.escape_folders = escape_folders
+        self.complete = False
+        self._by_key: typing.Dict[str, typing.List[str]] = {}
+        self._by_dir: typing.Dict[str, typing.List[str]] = {}
+        self._lock = threading.Lock()
+
+    def accept(self, name: str) -> bool:
+        return os.path.splitext(name)[1].lower() in self.sub_types
+
+    def add(self, path: str) -> None:
+        directory, name = os.path.split(path)
+        with self._lock:
+            self._by_key.setdefault(subtitle_key(name), []).append(path)
+            self._by_dir.setdefault(directory, []).append(path)
+
+    def discard(self, path: str) -> None:
+        """字幕被移走后从索引中删除"""
+        directory, name = os.path.split(path)
+        with self._lock:
+            for paths in (self._by_key.get(subtitle_key(name)), self._by_dir.get(directory)):
+                if paths and path in paths:
+                    paths.remove(path)
+
+    def covers(self, directory: str) -> bool:
+        """directory 下的字幕是否都在索引中"""
+        if not self.complete:
+            return False
+        rel = os.path.relpath(os.path.abspath(directory), self.root)
+        if rel == os.curdir:
+            return True
+        if rel.startswith(os.pardir) or os.path.isabs(rel):
+            return False
+        return not any(part in self.escape_folders for part in rel.split(os.sep))
+
+    def find(self, directory: str, key: str) -> typing.List[str]:
+        """directory 及其子目录中文件名前缀为 key 的字幕"""
+        prefix = os.path.join(os.path.abspath(directory), "")
+        with self._lock:
+            paths = list(self._by_key.get(key.lower(), ()))
+        return [p for p in paths if p.startswith(prefix) and os.path.isfile(p)]
+
+    def list_dir(self, directory: str) -> typing.List[str]:
+        """directory 中(不含子目录)的字幕"""
+        with self._lock:
+            paths = list(self._by_dir.get(os.path.abspath(directory), ()))
+        return [p for p in paths if os.path.isfile(p)]
+
+
+_current: typing.Optional[SubtitleIndex] = None
+
+
+def set_subtitle_index(index: typing.Optional[SubtitleIndex]) -> None:
+    global _current
+    _current = index
+
+
+def get_subtitle_index() -> typing.Optional[SubtitleIndex]:
+    """本次扫描的字幕索引, 没有扫描源文件夹(如单文件模式)时为 None"""
+    return _current
@@ -0,0 +1,245 @@
+import os
+import re
+import threading
+import time
+import typing
+
+from mdc.config import config
+from mdc.file.movie_list import walk_movies
+from mdc.file.subtitle_index import set_subtitle_index
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # 未安装 watchdog 时定时扫描源文件夹
+    FileSystemEventHandler = object
+    Observer = None
+
+TRAILER_RE = re.compile(r"-trailer\.", re.IGNORECASE)
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "MovieWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def _notify(self, path: str, is_directory: bool) -> None:
+        if is_directory:
+            self.watcher.notify_dir(path)
+        else:
+            self.watcher.notify(path)
+
+    def on_created(self, event) -> None:
+        self._notify(event.src_path, event.is_directory)
+
+    def on_modified(self, event) -> None:
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_moved(self, event) -> None:
+        self._notify(event.dest_path, event.is_directory)
+
+
+class MovieWatcher:
+    """
+    监视源文件夹中新出现的影片
+
+    安装了 watchdog 时使用系统的文件变化通知(inotify 等), 否则每隔 interval 秒遍历一次源文件夹.
+    新影片的大小和修改时间连续 settle 秒不变(下载或复制完成)后才交给处理函数, 每个文件只处理一次.
+    在首次扫描之前调用 start(), 扫描期间出现的影片也不会遗漏; 首次扫描处理过的影片用 mark_known() 排除
+
+    :param source: 源文件夹
+    :param file_type: 小写的扩展名集合
+    :param escape_folders: 不处理的目录名
+    :param exclude_dirs: 不处理的目录路径, 如成功和失败输出文件夹
+    :param regex: 只处理路径匹配的影片
+    :param settle: 文件保持不变多少秒后处理
+    :param interval: 没有 watchdog 时遍历的间隔秒数
+    """
+
+    # 检查等待中文件的间隔秒数
+    TICK = 1.0
+
+    def __init__(
+        self,
+        source: str,
+        file_type: typing.Collection[str],
+        escape_folders: typing.Collection[str] = (),
+        exclude_dirs: typing.Iterable[str] = (),
+        regex: typing.Optional[typing.Pattern] = None,
+        settle: float = 10,
+        interval: float = 5,
+        workers: int = 8,
+    ):
+        self.source = os.path.abspath(source)
+        self.file_type = file_type
+        self.escape_folders = escape_folders
+        self.exclude_dirs = tuple(os.path.abspath(d) + os.sep for d in exclude_dirs)
+        self.regex = regex
+        self.settle = settle
+        self.interval = interval
+        self.workers = workers
+        # 路径 -> ((大小, 修改时间), 开始保持不变的时间)
+        self._pending: typing.Dict[str, typing.Tuple[typing.Optional[tuple], float]] = {}
+        self._known: typing.Set[str] = set()
+        self._lock = threading.Lock()
+        self._started = False
+        self._observer = None
+
+    def accept(self, path: str) -> bool:
+        if os.path.splitext(path)[1].lower() not in self.file_type:
+            return False
+        if TRAILER_RE.search(path) or (self.regex and not self.regex.search(path)):
+            return False
+        if path.startswith(self.exclude_dirs):
+            return False
+        rel = os.path.relpath(path, self.source)
+        if rel.startswith(os.pardir):
+            return False
+        return not any(part in self.escape_folders for part in rel.split(os.sep)[:-1])
+
+    def notify(self, path: str) -> None:
+        """文件新建或变化, 加入等待列表"""
+        path = os.path.abspath(path)
+        if not self.accept(path):
+            return
+        with self._lock:
+            if path not in self._known and path not in self._pending:
+                self._pending[path] = (None, 0.0)
+
+    def notify_dir(self, path: str) -> None:
+        """目录新建或移入, 其中的影片都加入等待列表"""
+        for movie in walk_movies(os.path.abspath(path), self.file_type, self.escape_folders, self.workers):
+            self.notify(movie)
+
+    def _walk(self) -> typing.Iterator[str]:
+        return walk_movies(self.source, self.file_type, self.escape_folders, self.workers)
+
+    def snapshot(self) -> None:
+        """记录当前已有的影片, 之后只处理新出现的"""
+        known = set(self._walk())
+        with self._lock:
+            self._known |= known
+
+    def mark_known(self, paths: typing.Iterable[str]) -> None:
+        """这些影片已经处理过(如首次扫描中), 不再处理"""
+        paths = {os.path.abspath(p) for p in paths}
+        with self._lock:
+            self._known |= paths
+            for path in paths:
+                self._pending.pop(path, None)
+
+    def start(self) -> None:
+        """开始监视: 启动文件变化通知, 没有 watchdog 时记录当前已有的影片"""
+        if self._started:
+            return
+        self._started = True
+        if Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.source, recursive=True)
+            self._observer.start()
+        else:
+            self.snapshot()
+
+    def poll(self) -> None:
+        for movie in self._walk():
+            self.notify(movie)
+
+    def ready(self, now: typing.Optional[float] = None) -> typing.List[str]:
+        """返回保持不变超过 settle 秒的影片, 它们不会再次返回"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            pending = list(self._pending.items())
+        result = []
+        for path, (signature, since) in pending:
+            try:
+                st = os.stat(path)
+            except OSError:
+                # 已被删除或移走
+                with self._lock:
+                    self._pending.pop(path, None)
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            with self._lock:
+                if current != signature:
+                    self._pending[path] = (current, now)
+                elif st.st_size > 0 and now - since >= self.settle:
+                    del self._pending[path]
+                    self._known.add(path)
+                    result.append(path)
+        result.sort()
+        return result
+
+    def run(self, handler: typing.Callable[[str], None], stop: typing.Optional[threading.Event] = None) -> None:
+        """处理新影片直到 stop 被设置"""
+        stop = stop or threading.Event()
+        self.start()
+        observer = self._observer
+        if observer is not None:
+            print(f"[+]Watching '{self.source}' for new movies.")
+        else:
+            print(
+                f"[+]Watching '{self.source}' for new movies, scan every {self.interval}s (install watchdog to avoid scanning)."
+            )
+        last_poll = time.monotonic()
+        try:
+            while not stop.is_set():
+                if observer is None and time.monotonic() - last_poll >= self.interval:
+                    self.poll()
+                    last_poll = time.monotonic()
+                for path in self.ready():
+                    if stop.is_set():
+                        break
+                    try:
+                        handler(path)
+                    except Exception as e:
+                        # debug 模式下 create_data_and_move 不捕获异常, 监视不能因此停止
+                        print(f"[-]Process '{path}' failed: {e}")
+                stop.wait(self.TICK)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+                self._observer = None
+            self._started = False
+
+
+def movie_watcher(source: str, regexstr: str = "") -> MovieWatcher:
+    """按配置创建源文件夹的监视器"""
+    conf = config.getInstance()
+    regex = None
+    if regexstr:
+        try:
+            regex = re.compile(regexstr, re.IGNORECASE)
+        except re.error:
+            pass
+    escape_folders = set(re.split("[,，]", conf.escape_folder())) if conf.main_mode() != 3 else set()
+    return MovieWatcher(
+        source,
+        set(conf.media_type().lower().split(",")),
+        escape_folders,
+        (conf.success_folder(), conf.failed_folder()),
+        regex,
+        conf.watch_settle(),
+        conf.watch_poll_interval(),
+        conf.scan_workers(),
+    )
+
+
+def watch_movies(
+    source: str,
+    handler: typing.Callable[[str], None],
+    regexstr: str = "",
+    stop: typing.Optional[threading.Event] = None,
+    watcher: typing.Optional[MovieWatcher] = None,
+) -> None:
+    """
+    按配置监视源文件夹, 新影片下载完成后调用 handler(影片路径)
+
+    :param watcher: 首次扫描前已经 start() 的监视器, 不给出时从现在开始监视
+    """
+    # 新影片的字幕可能在首次扫描之后才出现, 不使用扫描时的字幕索引
+    set_subtitle_index(None)
+    if watcher is None:
+        watcher = movie_watcher(source, regexstr)
+    watcher.run(handler, stop)
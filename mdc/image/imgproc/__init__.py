@@ -1,13 +1,14 @@
 import importlib
 import logging
 import os
-import shutil
+import sqlite3
 from pathlib import Path
 
 from PIL import Image
 
 from mdc.config import config
-from mdc.file.common_utils import file_not_exist_or_empty
+from mdc.download.image_store import file_digest, get_image_store
+from mdc.file.common_utils import file_not_exist_or_empty, link_or_copy
 
 
 def face_crop_width(filename, width, height):
@@ -70,6 +71,21 @@ def cutImage(imagecut, path, thumb_path, poster_path, skip_facerec=False):
         return
     # imagecut为4时同时也是有码影片 也用人脸识别裁剪封面
     if imagecut == 1 or imagecut == 4:  # 剪裁大封面
+        store = get_image_store() if conf.image_store() else None
+        key = None
+        if store is not None and os.path.isfile(fullpath_fanart):
+            # 同一封面按相同参数裁剪过时直接链接
+            model = conf.face_locations_model()
+            try:
+                key = f"poster:{file_digest(fullpath_fanart)}:{imagecut}:{int(skip_facerec)}:{aspect_ratio}:{model}"
+                blob = store.get_derived(key)
+                if blob is not None:
+                    link_or_copy(blob, fullpath_poster)
+                    print(f"[+]Image Linked!     {Path(fullpath_poster).name}")
+                    return
+            except (OSError, sqlite3.Error) as e:
+                print(f"[-]Image store lookup failed: {e}")
+                key = None
         try:
             img = Image.open(fullpath_fanart)
             width, height = img.size
@@ -88,13 +104,22 @@ def cutImage(imagecut, path, thumb_path, poster_path, skip_facerec=False):
                 img2 = img.crop(face_crop_height(fullpath_fanart, width, height))
             else:  # 如果等于2/3
                 img2 = img
+            # 海报可能是链接, 先删除再写入新文件
+            if os.path.lexists(fullpath_poster):
+                os.unlink(fullpath_poster)
             img2.save(fullpath_poster)
             print(f"[+]Image Cutted!     {Path(fullpath_poster).name}")
         except Exception as e:
             print(e)
             print("[-]Cover cut failed!")
-    elif imagecut == 0:  # 复制封面
-        shutil.copyfile(fullpath_fanart, fullpath_poster)
+            return
+        if key is not None:
+            try:
+                store.put_derived(key, fullpath_poster)
+            except (OSError, sqlite3.Error) as e:
+                print(f"[-]Add poster to image store failed: {e}")
+    elif imagecut == 0:  # 复制封面, 内容相同时使用链接
+        link_or_copy(fullpath_fanart, fullpath_poster)
         print(f"[+]Image Copyed!     {Path(fullpath_poster).name}")
 
 
@@ -37,7 +37,7 @@ class Airav(Parser):
             if javbusinfo == 404:
                 self.javbus = {"title": ""}
             else:
-                self.javbus = json.loads(javbusinfo)
+                self.javbus = javbusinfo
         self.htmlcode = self.getHtml(self.detailurl)
         # htmltree = etree.fromstring(self.htmlcode, etree.HTMLParser())
         # result = self.dictformat(htmltree)
@@ -1,11 +1,8 @@
 # -*- coding: utf-8 -*-
 
-import json
 import re
 from urllib.parse import quote
 
-from mdc.utils.http import request as httprequest
-
 from .parser import Parser
 
 
@@ -24,7 +21,7 @@ class Getchu:
         for i in sort:
             try:
                 dic = eval(i)
-                if dic is not None and json.loads(dic).get("title") != "":
+                if dic is not None and dic.get("title") != "":
                     break
             except Exception:
                 pass
@@ -32,6 +29,7 @@ class Getchu:
 
 
 class wwwGetchu(Parser):
+    html_encoding = "euc_jis_2004"
     expr_title = '//*[@id="soft-title"]/text()'
     expr_cover = '//head/meta[@property="og:image"]/@content'
     expr_director = "//td[contains(text(),'ブランド')]/following-sibling::td/a[1]/text()"
@@ -70,27 +68,6 @@ class wwwGetchu(Parser):
             return None
         return detailurl.replace("../", "http://www.getchu.com/")
 
-    def getHtml(self, url, type=None):
-        """访问网页(指定EUC-JP)"""
-        resp = httprequest.get(
-            url,
-            cookies=self.cookies,
-            proxies=self.proxies,
-            extra_headers=self.extraheader,
-            encoding="euc_jis_2004",
-            verify=self.verify,
-            return_type=type,
-        )
-        if (
-            "<title>404 Page Not Found" in resp
-            or "<title>未找到页面" in resp
-            or "404 Not Found" in resp
-            or "<title>404" in resp
-            or "<title>お探しの商品が見つかりません" in resp
-        ):
-            return 404
-        return resp
-
     def getNum(self, htmltree):
         return (
             "GETCHU-"
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-import json
+import functools
 import re
 import traceback
 
@@ -8,10 +8,98 @@ from lxml import etree, html
 
 from mdc.config import config
 from mdc.utils.http import request as httprequest
+from mdc.utils.http.cache import get_http_cache
 from mdc.utils.logger import info as print
 from mdc.utils.logger import warn
 
-from .utils import getTreeAll, getTreeElement
+from .result import ScrapeResult
+from .run_cache import get_run_cache
+from .utils import compileXPath, getTreeAll, getTreeElement, parseHtmlBytes
+
+# dictformat 中调用的字段方法, 同一页面只解析一次
+FIELD_GETTERS = (
+    "getNum",
+    "getTitle",
+    "getStudio",
+    "getRelease",
+    "getYear",
+    "getOutline",
+    "getRuntime",
+    "getDirector",
+    "getActors",
+    "getActorPhoto",
+    "getCover",
+    "getSmallCover",
+    "getExtrafanart",
+    "getTrailer",
+    "getTags",
+    "getLabel",
+    "getSeries",
+    "getUserRating",
+    "getUserVotes",
+    "getUncensored",
+    "getImagecut",
+)
+
+# 页面不存在/需要验证的标记, 在原始字节中查找
+NOT_FOUND_MARKERS = (
+    "<title>404 Page Not Found",
+    "<title>未找到页面",
+    "404 Not Found",
+    "<title>404",
+    "AVが見つかりませんでした。",
+    "<title>お探しの商品が見つかりません",
+)
+FORBIDDEN_MARKERS = ("ネットワークの安全性をご確認ください。",)
+
+
+@functools.lru_cache(maxsize=32)
+def _encoded_markers(encoding: str):
+    """按网页编码转换标记, 无法用该编码表示的标记不会出现在页面中, 直接跳过"""
+
+    def encode(markers):
+        result = []
+        for marker in markers:
+            try:
+                result.append(marker.encode(encoding))
+            except (UnicodeError, LookupError):
+                pass
+        return tuple(result)
+
+    return encode(NOT_FOUND_MARKERS), encode(FORBIDDEN_MARKERS)
+
+
+def _discard_http_cache(response) -> None:
+    """验证页面和未找到页面的状态码也可能是 200, 从 HTTP 缓存中删除, 下次重新获取"""
+    cache = get_http_cache()
+    if cache is not None:
+        cache.discard(response)
+
+
+def _memoize_field(func):
+    """dictformat 期间按页面缓存字段方法的结果
+
+    以方法本身为键, 子类通过 super() 调用父类方法时互不影响.
+    只缓存参数为当前页面的调用, 返回的列表/字典是副本, 调用方修改不影响缓存
+    """
+    if getattr(func, "_field_memo", False):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(self, htmltree, *args, **kwargs):
+        memo = self.__dict__.get("_memo")
+        if memo is None or args or kwargs or htmltree is not self._memo_tree:
+            return func(self, htmltree, *args, **kwargs)
+        if func in memo:
+            value = memo[func]
+        else:
+            value = memo[func] = func(self, htmltree)
+        if isinstance(value, (list, dict)):
+            return value.copy()
+        return value
+
+    wrapper._field_memo = True
+    return wrapper
 
 
 class Parser:
@@ -59,6 +147,24 @@ class Parser:
     expr_userrating = ""  # 用户评分匹配规则(0-5分)
     expr_uservotes = ""  # 评分人数匹配规则
 
+    # 强制使用的网页编码, 为空时按 头部/<meta>/全文检测 确定
+    html_encoding = None
+
+    def __init_subclass__(cls, **kwargs):
+        """子类定义时预先编译 expr_* 表达式, 并为字段方法加上按页面的缓存"""
+        super().__init_subclass__(**kwargs)
+        for name, value in vars(cls).items():
+            if name.startswith("expr_") and isinstance(value, str) and value:
+                try:
+                    compileXPath(value)
+                except etree.XPathError:
+                    # 保持原有行为, 使用时再报错
+                    pass
+        for name in FIELD_GETTERS:
+            func = cls.__dict__.get(name)
+            if callable(func):
+                setattr(cls, name, _memoize_field(func))
+
     def init(self):
         """初始化参数"""
         # 推荐剪切poster封面:
@@ -75,12 +181,17 @@ class Parser:
         self.cookies = None
         self.morestoryline = False
         self.specifiedUrl = None
+        self._fetched_urls = set()
         self.extraInit()
 
     def extraInit(self):
         """自定义初始化内容"""
         pass
 
+    def reset(self):
+        """清除上次刮削留下的属性, 实例可重复使用"""
+        self.__dict__.clear()
+
     def scrape(self, number, core: None):
         """刮削番号"""
         # 每次调用，初始化参数
@@ -140,37 +251,78 @@ class Parser:
         return url
 
     def getHtml(self, url, type=None):
-        """访问网页"""
-        resp = httprequest.get(
-            url,
-            cookies=self.cookies,
-            proxies=self.proxies,
-            extra_headers=self.extraheader,
-            verify=self.verify,
-            return_type=type,
-        )
-        if (
-            "<title>404 Page Not Found" in resp
-            or "<title>未找到页面" in resp
-            or "404 Not Found" in resp
-            or "<title>404" in resp
-            or "AVが見つかりませんでした。" in resp
-            or "<title>お探しの商品が見つかりません" in resp
-        ):
+        """访问网页
+
+        :param type: 'object' | 'content' 时直接返回响应对象/二进制内容, 否则返回解码后的文本
+        """
+        if type is not None:
+            return httprequest.get(
+                url,
+                cookies=self.cookies,
+                proxies=self.proxies,
+                extra_headers=self.extraheader,
+                verify=self.verify,
+                return_type=type,
+            )
+        page = self.getHtmlBytes(url)
+        if isinstance(page, int):
+            return page
+        content, encoding = page
+        return content.decode(encoding, errors="replace")
+
+    def getHtmlBytes(self, url):
+        """访问网页, 返回 (原始字节, 编码), 页面不存在返回 404, 需要验证返回 403
+
+        本次运行已经获取过的页面直接使用, 例如剧情简介查询与刮削访问同一详情页.
+        同一次刮削中再次访问同一网址(重试)时总是重新获取.
+        其他错误状态(429, 5xx 等)抛出 requests.HTTPError, 不当作页面内容解析
+        """
+        run_cache = get_run_cache()
+        fetched = self.__dict__.setdefault("_fetched_urls", set())
+        resp = None if url in fetched else run_cache.get_page(url, self.cookies)
+        fetched.add(url)
+        cached = resp is not None
+        if resp is None:
+            resp = httprequest.get(
+                url,
+                cookies=self.cookies,
+                proxies=self.proxies,
+                extra_headers=self.extraheader,
+                verify=self.verify,
+                return_type="object",
+            )
+        if resp.status_code == 404:
+            return 404
+        if resp.status_code == 403:
+            return 403
+        resp.raise_for_status()
+        content = resp.content
+        encoding = self.html_encoding or httprequest.detect_encoding(resp)
+        not_found, forbidden = _encoded_markers(encoding)
+        if any(marker in content for marker in not_found):
+            _discard_http_cache(resp)
             return 404
-        if "ネットワークの安全性をご確認ください。" in resp:
+        if any(marker in content for marker in forbidden):
+            _discard_http_cache(resp)
             return 403
-        return resp
+        if not cached:
+            # 只缓存正常的页面, 未找到和验证页面下次重新获取
+            run_cache.put_page(url, self.cookies, resp)
+        return content, encoding
 
     def getHtmlTree(self, url, type=None):
-        """访问网页,返回`etree`"""
-        resp = self.getHtml(url, type)
-        if resp == 404:
+        """访问网页,返回`etree`, lxml 直接解析原始字节"""
+        page = self.getHtmlBytes(url)
+        if page == 404:
             return 404
-        ret = etree.fromstring(resp, etree.HTMLParser())
-        return ret
-
-    def dictformat(self, htmltree):
+        if page == 403:
+            raise ValueError(f"Access denied: {url}")
+        return parseHtmlBytes(*page)
+
+    def dictformat(self, htmltree) -> ScrapeResult:
+        """解析页面, 返回`ScrapeResult`. 子类通过 extradict 修改字段"""
+        self._memo = {}
+        self._memo_tree = htmltree
         try:
             dic = {
                 "number": self.getNum(htmltree),
@@ -207,8 +359,10 @@ class Parser:
                 else:
                     traceback.print_exception(e)
             dic = {"title": ""}
-        js = json.dumps(dic, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
-        return js
+        finally:
+            self._memo = None
+            self._memo_tree = None
+        return ScrapeResult.from_dict(dic)
 
     def _is_known_no_trace_exception(self, e: Exception) -> bool:
         msg = str(e)
@@ -360,3 +514,7 @@ class Parser:
             return result
         except Exception:
             return []
+
+
+for _name in FIELD_GETTERS:
+    setattr(Parser, _name, _memoize_field(getattr(Parser, _name)))
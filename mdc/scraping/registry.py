@@ -0,0 +1,140 @@
+# build-in lib
+import importlib
+import threading
+from importlib.metadata import entry_points
+from typing import Dict, List, Tuple, Union
+
+# 内置数据源, 模块 mdc.scraping.<名称> 中的 <名称首字母大写> 类, 第一次使用时才导入
+ADULT_SOURCES = [
+    "javlibrary",
+    "javdb",
+    "javbus",
+    "airav",
+    "fanza",
+    "xcity",
+    "jav321",
+    "mgstage",
+    "fc2",
+    "avsox",
+    "dlsite",
+    "carib",
+    "madou",
+    "msin",
+    "av123",
+    "getchu",
+    "gcolle",
+    "javday",
+    "pissplay",
+    "javmenu",
+    "pcolle",
+    "caribpr",
+    "madouji",
+]
+GENERAL_SOURCES = ["tmdb", "imdb"]
+
+# 第三方包可以在这两个 entry point 组中声明数据源, 格式 名称 = "包.模块:类名"
+ENTRY_POINT_GROUPS = {"adult": "mdc.scrapers.adult", "general": "mdc.scrapers.general"}
+
+# 名称 -> (类型, Parser 子类或 "模块:类名")
+_specs: Dict[str, Tuple[str, Union[type, str]]] = {}
+# 已导入的类
+_classes: Dict[str, type] = {}
+_lock = threading.RLock()
+_local = threading.local()
+_generation = 0
+_entry_points_loaded = False
+
+
+def register(name: str, parser: Union[type, str], kind: str = "adult") -> None:
+    """
+    注册数据源
+
+    :param name: 数据源名称, 即配置文件 [priority]website 中使用的名称
+    :param parser: Parser 子类, 或 "包.模块:类名" 字符串(第一次使用时才导入模块)
+    :param kind: "adult" 或 "general"
+    """
+    global _generation
+    with _lock:
+        _specs[name] = (kind, parser)
+        _classes.pop(name, None)
+        _generation += 1
+
+
+def _load_entry_points() -> None:
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    with _lock:
+        if _entry_points_loaded:
+            return
+        _entry_points_loaded = True
+        for kind, group in ENTRY_POINT_GROUPS.items():
+            try:
+                eps = entry_points(group=group)
+            except Exception as e:
+                print(f"[-]Load scraper entry points '{group}' failed: {e}")
+                continue
+            for ep in eps:
+                if ep.name not in _specs:
+                    register(ep.name, ep.value, kind)
+
+
+def sources(kind: str = "adult") -> List[str]:
+    """已注册的数据源名称, 内置数据源在前"""
+    _load_entry_points()
+    with _lock:
+        return [name for name, spec in _specs.items() if spec[0] == kind]
+
+
+def get_parser_class(name: str) -> type:
+    """返回数据源对应的类, 模块只导入一次. 未注册时抛出 KeyError"""
+    parser_type = _classes.get(name)
+    if parser_type is not None:
+        return parser_type
+    if name not in _specs:
+        _load_entry_points()
+    with _lock:
+        if name in _classes:
+            return _classes[name]
+        if name not in _specs:
+            raise KeyError(f"Scraper source '{name}' not registered")
+        parser = _specs[name][1]
+        if isinstance(parser, str):
+            module, _, attr = parser.partition(":")
+            parser = getattr(importlib.import_module(module, "mdc.scraping"), attr)
+        _classes[name] = parser
+        return parser
+
+
+def get_parser(name: str):
+    """
+    返回本线程可重复使用的数据源实例
+
+    实例在返回前清除上次刮削留下的属性, 与新建实例等价
+    """
+    instances = getattr(_local, "instances", None)
+    if instances is None or getattr(_local, "generation", None) != _generation:
+        instances = _local.instances = {}
+        _local.generation = _generation
+    parser = instances.get(name)
+    if parser is None:
+        parser = instances[name] = get_parser_class(name)()
+    else:
+        reset = getattr(parser, "reset", None)
+        if reset is not None:
+            reset()
+    return parser
+
+
+def clear_cache() -> None:
+    """丢弃已导入的类和各线程的实例, 下次使用时重新导入"""
+    global _generation
+    with _lock:
+        _classes.clear()
+        _generation += 1
+
+
+for _name in ADULT_SOURCES:
+    register(_name, f".{_name}:{_name.capitalize()}", "adult")
+for _name in GENERAL_SOURCES:
+    register(_name, f".{_name}:{_name.capitalize()}", "general")
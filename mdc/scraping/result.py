@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import json
+from collections.abc import MutableMapping
+
+# 刮削结果的标准字段及默认值, 顺序即导出顺序
+FIELDS = {
+    "number": "",
+    "title": "",
+    "studio": "",
+    "release": "",
+    "year": "",
+    "outline": "",
+    "runtime": "",
+    "director": "",
+    "actor": list,
+    "actor_photo": dict,
+    "cover": "",
+    "cover_small": "",
+    "extrafanart": list,
+    "trailer": "",
+    "tag": list,
+    "label": "",
+    "series": "",
+    "userrating": "",
+    "uservotes": "",
+    "uncensored": False,
+    "website": "",
+    "source": "",
+    "imagecut": 1,
+    "allow_number_change": False,
+}
+
+
+def _plain(value):
+    """lxml 的文本结果(smart string)引用整个文档树, 转为普通字符串后文档树可以释放"""
+    if isinstance(value, str):
+        return value if type(value) is str else str(value)
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {_plain(k): _plain(v) for k, v in value.items()}
+    return value
+
+
+def _default(name):
+    value = FIELDS[name]
+    return value() if callable(value) else value
+
+
+class ScrapeResult(MutableMapping):
+    """
+    数据源刮削结果
+
+    标准字段保存在 __slots__ 中, 数据源额外返回的字段(如 headers)保存在 extra 中.
+    支持字典的读写方式, 需要 JSON 时使用 to_json()
+    """
+
+    __slots__ = tuple(FIELDS) + ("extra",)
+
+    def __init__(self, **kwargs):
+        for name in FIELDS:
+            setattr(self, name, kwargs.pop(name) if name in kwargs else _default(name))
+        self.extra = kwargs
+
+    @classmethod
+    def from_dict(cls, dic: dict) -> "ScrapeResult":
+        return cls(**dic)
+
+    def __getitem__(self, key):
+        if key in FIELDS:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __setitem__(self, key, value):
+        if key in FIELDS:
+            setattr(self, key, value)
+        else:
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        """标准字段恢复为默认值"""
+        if key in FIELDS:
+            setattr(self, key, _default(key))
+        else:
+            del self.extra[key]
+
+    def __iter__(self):
+        yield from FIELDS
+        yield from self.extra
+
+    def __len__(self):
+        return len(FIELDS) + len(self.extra)
+
+    def __contains__(self, key):
+        return key in FIELDS or key in self.extra
+
+    def __repr__(self):
+        return f"ScrapeResult({self.to_dict()!r})"
+
+    def to_dict(self) -> dict:
+        dic = {name: _plain(getattr(self, name)) for name in FIELDS}
+        dic.update(_plain(self.extra))
+        return dic
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, sort_keys=True, separators=(",", ":"))
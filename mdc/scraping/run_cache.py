@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import requests
+
+
+def _page_key(url: str, cookies: Optional[dict]) -> tuple:
+    # 不同 cookies 可能得到不同内容(登录状态等), 分开缓存
+    return str(url), tuple(sorted((cookies or {}).items()))
+
+
+class RunCache:
+    """
+    本次运行内存中共享的页面和数据源结果
+
+    Scraping 和剧情简介(storyline)查询同一个数据源的同一番号时,
+    后查询的一方直接使用已经获取的详情页面或刮削结果, 不再重复请求.
+    两者都按最近使用保留固定数量, 超出时丢弃最久未用的.
+    保存超过 max_age 秒的条目视为过期, 监视模式长时间运行时不会使用很久以前的页面和结果
+
+    :param max_pages: 最多保留的页面数量
+    :param max_results: 最多保留的刮削结果数量
+    :param max_age: 条目保留的秒数
+    """
+
+    def __init__(self, max_pages: int = 32, max_results: int = 256, max_age: float = 600):
+        self.max_pages = max_pages
+        self.max_results = max_results
+        self.max_age = max_age
+        self._pages = OrderedDict()
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, store: OrderedDict, key):
+        entry = store.get(key)
+        if entry is None:
+            return None
+        value, stored = entry
+        if time.monotonic() - stored > self.max_age:
+            del store[key]
+            return None
+        store.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _put(store: OrderedDict, key, value, limit: int) -> None:
+        store[key] = (value, time.monotonic())
+        store.move_to_end(key)
+        while len(store) > limit:
+            store.popitem(last=False)
+
+    def get_page(self, url: str, cookies: Optional[dict] = None) -> Optional[requests.Response]:
+        with self._lock:
+            return self._get(self._pages, _page_key(url, cookies))
+
+    def put_page(self, url: str, cookies: Optional[dict], response: requests.Response) -> None:
+        """只保存 2xx 响应, 出错的页面下次重新获取"""
+        if not 200 <= response.status_code < 300:
+            return
+        with self._lock:
+            self._put(self._pages, _page_key(url, cookies), response, self.max_pages)
+
+    def get_result(self, source: str, number: str) -> Optional[dict]:
+        """返回副本, 调用方可以修改"""
+        with self._lock:
+            data = self._get(self._results, (source, str(number).strip().upper()))
+        return copy.deepcopy(data)
+
+    def put_result(self, source: str, number: str, data: dict) -> None:
+        """保存副本, 之后修改 data 不影响缓存的结果"""
+        data = copy.deepcopy(data)
+        with self._lock:
+            self._put(self._results, (source, str(number).strip().upper()), data, self.max_results)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pages.clear()
+            self._results.clear()
+
+
+_run_cache = RunCache()
+
+
+def get_run_cache() -> RunCache:
+    return _run_cache
@@ -4,13 +4,12 @@
 
 """
 
-import builtins
-import json
-import os
 import re
 import secrets
+import threading
 import time
-from multiprocessing.dummy import Pool as ThreadPool
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from urllib.parse import urljoin
 
 from lxml.html import fromstring
@@ -24,6 +23,7 @@ from mdc.utils.http.request import (
 from mdc.utils.translation import is_japanese
 
 from .airav import Airav
+from .run_cache import get_run_cache
 from .xcity import Xcity
 
 # 舍弃 Amazon 源
@@ -32,30 +32,91 @@ G_registered_storyline_site = {"airavwiki", "airav", "avno1", "xcity", "58avgo"}
 G_mode_txt = ("顺序执行", "线程池")
 
 
-class noThread(object):
-    def map(self, fn, param):
-        return list(builtins.map(fn, param))
+_executor = None
+_slots = None
+_site_slots = None
+_executor_lock = threading.Lock()
 
-    def __enter__(self):
-        return self
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+def _get_executor():
+    """
+    所有影片共用的线程池和查询名额, 第一次使用时按同时处理的影片数创建
+
+    每次查询占用一个名额, 选出结果后即释放, 超时后不再等待的站点任务在后台继续运行.
+    每个站点同时运行的任务数不超过名额数的两倍(正在等待的和放弃等待的各一半),
+    站点上仍有这么多任务未结束时本次查询跳过该站点.
+    线程池大小为 站点任务上限 * 站点数, 提交的任务总能立即开始, 不会排在其他影片的慢任务之后
+    """
+    global _executor, _slots, _site_slots
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                conf = config.getInstance()
+                calls = conf.concurrent_movies() if conf.multi_threading() else 1
+                _slots = threading.BoundedSemaphore(calls)
+                _site_slots = {site: threading.BoundedSemaphore(calls * 2) for site in G_registered_storyline_site}
+                _executor = ThreadPoolExecutor(
+                    max_workers=calls * 2 * len(G_registered_storyline_site), thread_name_prefix="storyline"
+                )
+    return _executor, _slots, _site_slots
+
+
+class _SiteTask:
+    """单个站点的查询任务, 记录开始时间, 超时从任务开始时计算"""
+
+    def __init__(self, args):
+        self.args = args
+        self.started = threading.Event()
+        self.start_time = 0.0
+
+    def run(self):
+        self.start_time = time.monotonic()
+        self.started.set()
+        return getStoryline_mp(self.args)
+
+
+def _submit_all(mp_args):
+    """
+    占用一个查询名额并提交各站点任务, 返回 (任务, future, 释放名额的函数)
+
+    仍有过多未结束任务的站点不提交, 对应的 future 为 None. 每个站点任务结束(或被取消)后释放站点名额
+    """
+    executor, slots, site_slots = _get_executor()
+    slots.acquire()
+    tasks, futures = [], []
+    for args in mp_args:
+        site_slot = site_slots[args[0]]
+        task = _SiteTask(args)
+        future = None
+        if site_slot.acquire(blocking=False):
+            future = executor.submit(task.run)
+            future.add_done_callback(lambda _future, site_slot=site_slot: site_slot.release())
+        tasks.append(task)
+        futures.append(future)
+    return tasks, futures, slots.release
+
+
+def _wait_result(task, future, timeout):
+    """等待单个站点的结果, 该站点任务开始后超过 timeout 秒视为没有结果"""
+    if timeout <= 0:
+        return future.result()
+    task.started.wait()
+    try:
+        return future.result(max(0.0, task.start_time + timeout - time.monotonic()))
+    except FutureTimeoutError:
+        return None
 
 
 # 获取剧情介绍 从列表中的站点同时查，取值优先级从前到后
 def getStoryline(number, title=None, sites: list = None, uncensored=None, proxies=None, verify=None):
     start_time = time.time()
     debug = False
-    storyine_sites = config.getInstance().storyline_site().split(",")  # "1:airav,4:airavwiki".split(',')
+    conf = config.getInstance()
+    storyine_sites = conf.storyline_site().split(",")  # "1:airav,4:airavwiki".split(',')
     if uncensored:
-        storyine_sites = (
-            config.getInstance().storyline_uncensored_site().split(",") + storyine_sites
-        )  # "3:58avgo".split(',')
+        storyine_sites = conf.storyline_uncensored_site().split(",") + storyine_sites  # "3:58avgo".split(',')
     else:
-        storyine_sites = (
-            config.getInstance().storyline_censored_site().split(",") + storyine_sites
-        )  # "2:airav,5:xcity".split(',')
+        storyine_sites = conf.storyline_censored_site().split(",") + storyine_sites  # "2:airav,5:xcity".split(',')
     r_dup = set()
     sort_sites = []
     for s in storyine_sites:
@@ -63,29 +124,55 @@ def getStoryline(number, title=None, sites: list = None, uncensored=None, proxie
             sort_sites.append(s)
             r_dup.add(s)
     # sort_sites.sort()
-    mp_args = ((site, number, title, debug, proxies, verify) for site in sort_sites)
-    cores = min(len(sort_sites), os.cpu_count())
-    if cores == 0:
+    if not sort_sites:
         return ""
-    run_mode = 1
-    with ThreadPool(cores) if run_mode > 0 else noThread() as pool:
-        results = pool.map(getStoryline_mp, mp_args)
-    sel = ""
+    mp_args = [(site, number, title, debug, proxies, verify) for site in sort_sites]
+    run_mode = conf.storyline_mode()
+    if run_mode > 0:
+        # 各站点在共用线程池中同时查询, 每个站点从开始查询起最多等待 timeout 秒
+        tasks, futures, release = _submit_all(mp_args)
+        timeout = conf.storyline_timeout()
+    results = {}
+    sel_site, sel = "", ""
+    # 按优先级取值, 排在前面的站点返回中文简介后不再等待其余站点
+    busy = set()
+    try:
+        for i, site in enumerate(sort_sites):
+            if run_mode > 0:
+                if futures[i] is None:
+                    busy.add(site)
+                    continue
+                desc = _wait_result(tasks[i], futures[i], timeout)
+            else:
+                desc = getStoryline_mp(mp_args[i])
+            results[site] = desc
+            if isinstance(desc, str) and len(desc):
+                if not is_japanese(desc):
+                    sel_site, sel = site, desc
+                    break
+                if not len(sel_site):
+                    sel_site, sel = site, desc
+    finally:
+        if run_mode > 0:
+            # 选出结果后即释放名额; 未开始的查询直接取消, 已开始的查询在后台结束, 结果丢弃
+            release()
+            for future in futures:
+                if future is not None:
+                    future.cancel()
 
     # 以下debug结果输出会写入日志
-    s = f"[!]Storyline{G_mode_txt[run_mode]}模式运行{len(sort_sites)}个任务共耗时(含启动开销){time.time() - start_time:.3f}秒，结束于{time.strftime('%H:%M:%S')}"
-    sel_site = ""
-    for site, desc in zip(sort_sites, results):
-        if isinstance(desc, str) and len(desc):
-            if not is_japanese(desc):
-                sel_site, sel = site, desc
-                break
-            if not len(sel_site):
-                sel_site, sel = site, desc
-    for site, desc in zip(sort_sites, results):
+    s = f"[!]Storyline{G_mode_txt[run_mode]}模式运行{len(results)}/{len(sort_sites)}个任务共耗时{time.time() - start_time:.3f}秒，结束于{time.strftime('%H:%M:%S')}"
+    for site in sort_sites:
+        if site in busy:
+            s += f"，{site}:繁忙跳过"
+            continue
+        if site not in results:
+            s += f"，{site}:未等待"
+            continue
+        desc = results[site]
         sl = len(desc) if isinstance(desc, str) else 0
         s += f"，[选中{site}字数:{sl}]" if site == sel_site else f"，{site}字数:{sl}" if sl else f"，{site}:空"
-    if config.getInstance().debug():
+    if conf.debug():
         print(s)
     return sel
 
@@ -159,13 +246,16 @@ def getStoryline_airav(number, debug, proxies, verify):
 
 def getStoryline_airavwiki(number, debug, proxies, verify):
     try:
+        data = get_run_cache().get_result("airav", number)
+        if data is not None:
+            return data.get("outline")
         kwd = number[:6] if re.match(r"\d{6}[\-_]\d{2,3}", number) else number
         airavwiki = Airav()
+        airavwiki.init()
         airavwiki.addtion_Javbus = False
         airavwiki.proxies = proxies
         airavwiki.verify = verify
-        jsons = airavwiki.search(kwd)
-        outline = json.loads(jsons).get("outline")
+        outline = airavwiki.search(kwd).get("outline")
         return outline
     except Exception as e:
         if debug:
@@ -307,11 +397,14 @@ def getStoryline_avno1OLD(number, debug, proxies, verify):  # 获取剧情介绍
 
 def getStoryline_xcity(number, debug, proxies, verify):  # 获取剧情介绍 从xcity取得
     try:
+        data = get_run_cache().get_result("xcity", number)
+        if data is not None:
+            return data.get("outline")
         xcityEngine = Xcity()
+        xcityEngine.init()
         xcityEngine.proxies = proxies
         xcityEngine.verify = verify
-        jsons = xcityEngine.search(number)
-        outline = json.loads(jsons).get("outline")
+        outline = xcityEngine.search(number).get("outline")
         return outline
     except Exception as e:
         if debug:
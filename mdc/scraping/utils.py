@@ -1,17 +1,40 @@
 # -*- coding: utf-8 -*-
 
+import threading
+from typing import Dict, Union
+
+from lxml import etree
 from lxml.html import HtmlElement
 
+# 表达式字符串 -> 编译后的 XPath, 同一表达式只编译一次
+_compiled: Dict[str, etree.XPath] = {}
+_compiled_lock = threading.Lock()
+
+
+def compileXPath(expr: Union[str, etree.XPath]) -> etree.XPath:
+    """返回表达式编译后的`etree.XPath`, 结果按表达式缓存
+    文本结果为普通字符串(smart_strings=False), 不引用所在的文档树
+    :param expr 表达式字符串, 已编译的 XPath 原样返回
+    """
+    if isinstance(expr, etree.XPath):
+        return expr
+    compiled = _compiled.get(expr)
+    if compiled is None:
+        compiled = etree.XPath(expr, smart_strings=False)
+        with _compiled_lock:
+            compiled = _compiled.setdefault(expr, compiled)
+    return compiled
+
 
 def getTreeElement(tree: HtmlElement, expr="", index=0):
     """根据表达式从`xmltree`中获取匹配值,默认 index 为 0
     :param tree (html.HtmlElement)
-    :param expr
+    :param expr 表达式字符串或已编译的 XPath
     :param index
     """
     if expr == "":
         return ""
-    result = tree.xpath(expr)
+    result = compileXPath(expr)(tree)
     try:
         return result[index]
     except Exception:
@@ -21,13 +44,24 @@ def getTreeElement(tree: HtmlElement, expr="", index=0):
 def getTreeAll(tree: HtmlElement, expr=""):
     """根据表达式从`xmltree`中获取全部匹配值
     :param tree (html.HtmlElement)
-    :param expr
+    :param expr 表达式字符串或已编译的 XPath
     :param index
     """
     if expr == "":
         return []
-    result = tree.xpath(expr)
+    result = compileXPath(expr)(tree)
     try:
         return result
     except Exception:
         return []
+
+
+def parseHtmlBytes(content: bytes, encoding=None):
+    """解析网页原始字节, 返回`etree`
+    :param content 网页原始字节
+    :param encoding 网页编码, lxml 不支持该编码名称时先用 Python 解码
+    """
+    try:
+        return etree.fromstring(content, etree.HTMLParser(encoding=encoding))
+    except LookupError:
+        return etree.fromstring(content.decode(encoding, errors="replace"), etree.HTMLParser())
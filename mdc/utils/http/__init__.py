@@ -4,6 +4,9 @@ from .request import (
 from .request import (
     TimeoutHTTPAdapter as TimeoutHTTPAdapter,
 )
+from .request import (
+    detect_encoding as detect_encoding,
+)
 from .request import (
     get_html as get_html,
 )
@@ -22,3 +25,6 @@ from .request import (
 from .request import (
     post_html as post_html,
 )
+from .request import (
+    shared_session as shared_session,
+)
@@ -0,0 +1,255 @@
+# build-in lib
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# third party lib
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# project wide
+from mdc.config import config
+
+# 只缓存网页和接口数据, 图片视频等由下载流程自行处理
+CACHEABLE_TYPES = ("text/", "json", "xml", "javascript")
+# 单个响应超过该大小不缓存
+MAX_ENTRY_SIZE = 4 * 1024 * 1024
+
+
+class HttpCache:
+    """
+    HTTP 响应磁盘缓存
+
+    每个响应保存为 <key>.json(状态码/头部/写入时间) 和 <key>.body 两个文件,
+    过期后如有 ETag/Last-Modified 则发送条件请求, 服务器返回 304 时继续使用缓存.
+    body 文件的修改时间记录最近一次命中, 总大小超过上限时按 LRU 删除
+
+    :param folder: 缓存目录
+    :param ttl: 未单独配置的站点缓存有效秒数
+    :param host_rules: [(站点关键字, 有效秒数)], 关键字出现在域名中即匹配
+    :param max_size: 缓存总大小上限(字节), <=0 表示不限制
+    """
+
+    def __init__(
+        self, folder: str, ttl: float, host_rules: Optional[List[Tuple[str, float]]] = None, max_size: int = 0
+    ):
+        self.folder = Path(folder)
+        self.ttl = ttl
+        self.host_rules = host_rules or []
+        self.max_size = max_size
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def ttl_for(self, url: str) -> float:
+        host = (urlsplit(str(url)).hostname or "").lower()
+        for keyword, ttl in self.host_rules:
+            if keyword in host:
+                return ttl
+        return self.ttl
+
+    @staticmethod
+    def key_for(request: requests.PreparedRequest) -> str:
+        """按 请求方法 + URL + 影响内容的请求头(cookies/语言/接受类型) 生成缓存键"""
+        parts = [request.method or "GET", request.url or ""]
+        for name in ("Cookie", "Accept", "Accept-Language"):
+            parts.append(request.headers.get(name, ""))
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        base = self.folder / key[:2] / key
+        return base.with_suffix(".json"), base.with_suffix(".body")
+
+    def cacheable(self, request: requests.PreparedRequest, stream: bool = False) -> bool:
+        return request.method == "GET" and not stream and self.ttl_for(request.url) > 0
+
+    def load(self, key: str) -> Optional[Tuple[dict, bytes]]:
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        return meta, body
+
+    def is_fresh(self, meta: dict, url: str) -> bool:
+        return time.time() - meta.get("stored", 0) < self.ttl_for(url)
+
+    @staticmethod
+    def validators(meta: dict) -> dict:
+        """过期缓存的条件请求头"""
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def touch(self, key: str, meta: Optional[dict] = None) -> None:
+        """记录命中时间, meta 不为空时同时刷新写入时间(304 重新验证成功)"""
+        meta_path, body_path = self._paths(key)
+        try:
+            if meta is not None:
+                meta["stored"] = time.time()
+                self._write(meta_path, json.dumps(meta).encode("utf-8"))
+            os.utime(body_path)
+        except OSError:
+            pass
+
+    def store(self, key: str, response: requests.Response) -> None:
+        if response.status_code != 200:
+            return
+        content_type = response.headers.get("Content-Type", "").lower()
+        if not any(t in content_type for t in CACHEABLE_TYPES):
+            return
+        if "no-store" in response.headers.get("Cache-Control", "").lower():
+            return
+        body = response.content
+        if len(body) > MAX_ENTRY_SIZE:
+            return
+        # 正文已解压, 去掉与原始传输相关的头部
+        headers = {
+            k: v
+            for k, v in response.headers.items()
+            if k.lower() not in ("content-encoding", "content-length", "transfer-encoding", "set-cookie")
+        }
+        meta = {
+            "url": response.url,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": headers,
+            "stored": time.time(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        meta_path, body_path = self._paths(key)
+        try:
+            meta_path.parent.mkdir(parents=True, exist_ok=True)
+            old_size = body_path.stat().st_size if body_path.exists() else 0
+            self._write(body_path, body)
+            self._write(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as e:
+            print(f"[-]Http cache write failed: {e}")
+            return
+        self._grow(len(body) - old_size)
+
+    def discard(self, response: requests.Response) -> None:
+        """
+        删除该响应对应的缓存
+
+        状态码为 200 但内容是验证页面或未找到页面(由刮削时的页面标记判断)时调用, 下次重新获取
+        """
+        if response.request is None:
+            return
+        meta_path, body_path = self._paths(self.key_for(response.request))
+        try:
+            size = body_path.stat().st_size
+        except OSError:
+            return
+        for path in (body_path, meta_path):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _grow(self, delta: int) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = sum(p.stat().st_size for p in self.folder.glob("*/*.body"))
+            else:
+                self._size += delta
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self) -> None:
+        """删除最久未命中的缓存, 直到总大小降到上限的 90%"""
+        entries = []
+        for body_path in self.folder.glob("*/*.body"):
+            try:
+                st = body_path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, body_path))
+        entries.sort()
+        self._size = sum(e[1] for e in entries)
+        target = self.max_size * 0.9
+        for _, size, body_path in entries:
+            if self._size <= target:
+                break
+            for path in (body_path, body_path.with_suffix(".json")):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            self._size -= size
+
+    @staticmethod
+    def build_response(request: requests.PreparedRequest, meta: dict, body: bytes) -> requests.Response:
+        response = requests.Response()
+        response.status_code = meta.get("status", 200)
+        response.reason = meta.get("reason", "OK")
+        response.headers = CaseInsensitiveDict(meta.get("headers", {}))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        return response
+
+
+def parse_ttl_rules(value: str) -> List[Tuple[str, float]]:
+    """
+    解析站点缓存有效期配置(小时)
+    >>> parse_ttl_rules("javdb:12, javbus:72")
+    [('javdb', 43200.0), ('javbus', 259200.0)]
+    """
+    rules = []
+    for item in value.split(","):
+        parts = [p.strip() for p in item.split(":")]
+        if len(parts) != 2 or not parts[0]:
+            continue
+        try:
+            rules.append((parts[0].lower(), float(parts[1]) * 3600))
+        except ValueError:
+            print(f"[-]Http cache rule '{item.strip()}' invalid, ignored.")
+    return rules
+
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    """按配置创建全局缓存, 未开启时返回 None"""
+    global _cache
+    conf = config.getInstance()
+    if not conf.http_cache_switch():
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = HttpCache(
+                    conf.http_cache_folder(),
+                    conf.http_cache_ttl() * 3600,
+                    parse_ttl_rules(conf.http_cache_hosts()),
+                    conf.http_cache_max_size() * 1024 * 1024,
+                )
+    return _cache
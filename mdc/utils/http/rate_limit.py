@@ -0,0 +1,136 @@
+# build-in lib
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# project wide
+from mdc.config import config
+
+
+class TokenBucket:
+    """令牌桶: 平均每秒 rate 个请求, 最多允许 burst 个请求连续发出"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        预定一个令牌, 返回需要等待的秒数
+
+        令牌不足时允许计数变为负数, 相当于排队预约, 后来的请求等待时间顺延
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> float:
+        """阻塞直到获得令牌, 返回实际等待的秒数"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostRateLimiter:
+    """
+    按站点分配令牌桶
+
+    :param rate: 未单独配置的站点默认每秒请求数, <=0 表示不限速
+    :param burst: 未单独配置的站点默认突发请求数
+    :param host_rules: [(站点关键字, 每秒请求数, 突发数)], 关键字出现在域名中即匹配,
+        同一关键字的多个镜像域名(如 javdb565.com / javdb.com)共用一个令牌桶
+    """
+
+    def __init__(self, rate: float, burst: int, host_rules: Optional[List[Tuple[str, float, int]]] = None):
+        self.rate = rate
+        self.burst = burst
+        self.host_rules = host_rules or []
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._lock = threading.Lock()
+
+    def _rule_for(self, host: str) -> Tuple[str, float, int]:
+        for keyword, rate, burst in self.host_rules:
+            if keyword in host:
+                return keyword, rate, burst
+        return host, self.rate, self.burst
+
+    def bucket_for(self, url: str) -> Optional[TokenBucket]:
+        host = (urlsplit(str(url)).hostname or "").lower()
+        if not host:
+            return None
+        with self._lock:
+            if host in self._buckets:
+                return self._buckets[host]
+            key, rate, burst = self._rule_for(host)
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(rate, burst) if rate > 0 else None
+            self._buckets[host] = self._buckets[key]
+            return self._buckets[host]
+
+    def acquire(self, url: str) -> float:
+        bucket = self.bucket_for(url)
+        if bucket is None:
+            return 0.0
+        return bucket.acquire()
+
+
+def parse_host_rules(value: str) -> List[Tuple[str, float, int]]:
+    """
+    解析站点限速配置
+    >>> parse_host_rules("javdb:0.5:2, javbus:1")
+    [('javdb', 0.5, 2), ('javbus', 1.0, 1)]
+    """
+    rules = []
+    for item in value.split(","):
+        parts = [p.strip() for p in item.split(":")]
+        if len(parts) < 2 or not parts[0]:
+            continue
+        try:
+            rate = float(parts[1])
+            burst = int(parts[2]) if len(parts) > 2 and parts[2] else 1
+        except ValueError:
+            print(f"[-]Rate limit rule '{item.strip()}' invalid, ignored.")
+            continue
+        rules.append((parts[0].lower(), rate, burst))
+    return rules
+
+
+_limiter: Optional[HostRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[HostRateLimiter]:
+    """按配置创建全局限速器, 未开启时返回 None"""
+    global _limiter
+    conf = config.getInstance()
+    if not conf.rate_limit_switch():
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = HostRateLimiter(
+                    conf.rate_limit_rate(),
+                    conf.rate_limit_burst(),
+                    parse_host_rules(conf.rate_limit_hosts()),
+                )
+    return _limiter
+
+
+def rate_limit(url: str) -> None:
+    """请求 url 前调用, 超出该站点请求频率时阻塞等待"""
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return
+    waited = limiter.acquire(url)
+    if waited > 0 and config.getInstance().debug():
+        print(f"[!]Rate limit: wait {waited:.2f}s for '{urlsplit(str(url)).hostname}'")
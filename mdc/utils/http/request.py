@@ -1,5 +1,9 @@
 # build-in lib
-from typing import Any, Optional, Tuple, Union
+import codecs
+import http.cookiejar
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple, Union
 
 import mechanicalsoup
 
@@ -11,8 +15,15 @@ from urllib3.util.retry import Retry
 
 # project wide
 from mdc.config import config
+from mdc.utils.http.cache import get_http_cache
+from mdc.utils.http.rate_limit import rate_limit
 from mdc.utils.http.ssl_warnings import disable_insecure_request_warning
 
+# 只在网页开头查找 <meta charset>, 避免扫描整个页面
+META_SCAN_SIZE = 4096
+_CONTENT_TYPE_CHARSET = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.I)
+_META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.I)
+
 G_USER_AGENT = r"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.133 Safari/537.36"
 
 
@@ -21,14 +32,19 @@ class TimeoutHTTPAdapter(HTTPAdapter):
         """
         初始化 TimeoutHTTPAdapter
         :param args: 位置参数
-        :param kwargs: 关键字参数, 支持 timeout 参数
+        :param kwargs: 关键字参数, 支持 timeout 和 rate_limited 参数
         """
         self.timeout = 10  # seconds
         if "timeout" in kwargs:
             self.timeout = kwargs["timeout"]
             del kwargs["timeout"]
+        self.rate_limited = kwargs.pop("rate_limited", True)
         super().__init__(*args, **kwargs)
 
+    def _rate_limit(self, url: str) -> None:
+        if self.rate_limited:
+            rate_limit(url)
+
     def send(self, request, **kwargs) -> requests.Response:
         """
         发送请求
@@ -39,7 +55,210 @@ class TimeoutHTTPAdapter(HTTPAdapter):
         timeout = kwargs.get("timeout")
         if timeout is None:
             kwargs["timeout"] = self.timeout
-        return super().send(request, **kwargs)
+        # 所有 Session (包括 cloudscraper 和 mechanicalsoup) 的请求都经过这里, 统一缓存和按站点限速.
+        # 图片、预告片等文件下载的 Session 不限速, 只限制刮削网页的请求
+        cache = get_http_cache()
+        if cache is None or not cache.cacheable(request, kwargs.get("stream", False)):
+            self._rate_limit(request.url)
+            return super().send(request, **kwargs)
+
+        key = cache.key_for(request)
+        cached = cache.load(key)
+        if cached is not None:
+            meta, body = cached
+            if cache.is_fresh(meta, request.url):
+                cache.touch(key)
+                return cache.build_response(request, meta, body)
+            request.headers.update(cache.validators(meta))
+        self._rate_limit(request.url)
+        response = super().send(request, **kwargs)
+        if cached is not None and response.status_code == 304:
+            response.close()
+            cache.touch(key, meta)
+            return cache.build_response(request, meta, body)
+        cache.store(key, response)
+        return response
+
+
+class _NoStoreCookiePolicy(http.cookiejar.DefaultCookiePolicy):
+    """不保存服务器设置的 cookies, 调用方传入的 cookies 和同一请求重定向过程中的 cookies 不受影响"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+_sessions: Dict[tuple, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def _freeze(value: Any) -> Any:
+    """将 dict 转换为可哈希的 tuple, 用作 Session 缓存键"""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _new_session(
+    cookies: Optional[dict],
+    ua: str,
+    retry: int,
+    timeout: Optional[int],
+    proxies: Optional[dict],
+    verify: Optional[Union[bool, str]],
+    use_scraper: bool,
+    rate_limited: bool = True,
+    shared: bool = True,
+) -> requests.Session:
+    conf = config.getInstance()
+    session = create_scraper(browser={"custom": ua}) if use_scraper else requests.Session()
+    if retry:
+        retries = Retry(
+            total=retry,
+            connect=retry,
+            backoff_factor=1,
+            status_forcelist=[429, 500, 502, 503, 504],
+        )
+    else:
+        # 由调用方自行循环重试, 保持与 requests.get 相同的行为
+        retries = 0
+    # http 和 https 共用一个 adapter, 连接池按站点划分
+    adapter = TimeoutHTTPAdapter(
+        max_retries=retries,
+        timeout=timeout,
+        pool_connections=conf.http_pool_connections(),
+        pool_maxsize=conf.http_pool_maxsize(),
+        rate_limited=rate_limited,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if isinstance(cookies, dict) and len(cookies):
+        requests.utils.add_dict_to_cookiejar(session.cookies, cookies)
+    if shared and not use_scraper:
+        # 共享 Session 被多个线程和影片共用, 服务器设置的 cookies 不能带到其他请求中
+        # CloudScraper 需要保存通过验证后的 cookies, 它们对整个站点有效
+        session.cookies.set_policy(_NoStoreCookiePolicy())
+    if verify is not None:
+        session.verify = verify
+    if proxies is not None:
+        session.proxies = proxies
+    if not use_scraper:
+        session.headers.update({"User-Agent": ua})
+    return session
+
+
+def shared_session(
+    cookies: Optional[dict] = None,
+    ua: Optional[str] = None,
+    retry: int = 0,
+    timeout: Optional[int] = None,
+    proxies: Optional[dict] = None,
+    verify: Optional[Union[bool, str]] = None,
+    use_scraper: bool = False,
+    rate_limited: bool = True,
+) -> requests.Session:
+    """
+    获取进程内共享的 Session
+
+    代理、证书校验、cookies、User-Agent 等参数相同的请求复用同一个 Session,
+    保持长连接, 避免每次请求都重新进行 TCP/TLS 握手.
+    服务器设置的 cookies 不保存(CloudScraper 除外), 需要保持会话状态的流程(如提交表单)使用 private_session
+
+    :param retry: urllib3 层面的重试次数, 0 表示由调用方自行重试
+    :param use_scraper: 使用 CloudScraper
+    :param rate_limited: 按[rate_limit]限制请求频率, 下载文件时为 False
+    :return: Session 对象, 多线程共用, 调用方不应修改其 headers/proxies 等属性
+    """
+    ua = ua or G_USER_AGENT
+    key = (use_scraper, _freeze(cookies), ua, retry, timeout, _freeze(proxies), verify, rate_limited)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _new_session(cookies, ua, retry, timeout, proxies, verify, use_scraper, rate_limited)
+            _sessions[key] = session
+        return session
+
+
+def private_session(
+    cookies: Optional[dict] = None,
+    ua: Optional[str] = None,
+    retry: int = 0,
+    timeout: Optional[int] = None,
+    proxies: Optional[dict] = None,
+    verify: Optional[Union[bool, str]] = None,
+    use_scraper: bool = False,
+) -> requests.Session:
+    """
+    创建不共享的 Session, 保存服务器设置的 cookies, 用于需要保持会话状态的多步请求
+
+    参数与 shared_session 相同, 使用完毕后由调用方(或持有它的 StatefulBrowser)关闭
+    """
+    return _new_session(cookies, ua or G_USER_AGENT, retry, timeout, proxies, verify, use_scraper, shared=False)
+
+
+def close_sessions() -> None:
+    """关闭全部共享 Session, 释放连接"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def _proxy_settings(
+    proxies: Optional[dict] = None, verify: Optional[bool] = None
+) -> Tuple[Optional[dict], Optional[bool]]:
+    """未指定代理时使用配置文件中的代理, 此时默认不校验证书"""
+    config_proxy = config.getInstance().proxy()
+    if proxies is None and config_proxy.enable:
+        proxies = config_proxy.proxies()
+        if verify is None:
+            disable_insecure_request_warning()
+            verify = False
+    return proxies, verify
+
+
+def _cacert_proxy_settings(
+    proxies: Optional[dict] = None, verify: Optional[Union[bool, str]] = None
+) -> Tuple[Optional[dict], Optional[Union[bool, str]]]:
+    """未指定代理时使用配置文件中的代理, 此时使用配置的 cacert_file 校验证书"""
+    config_proxy = config.getInstance().proxy()
+    if config_proxy.enable:
+        if verify is None:
+            verify = config.getInstance().cacert_file()
+        if proxies is None:
+            proxies = config_proxy.proxies()
+    return proxies, verify
+
+
+def _valid_encoding(name) -> Optional[str]:
+    if isinstance(name, bytes):
+        name = name.decode("ascii", "ignore")
+    try:
+        codecs.lookup(name)
+    except (LookupError, TypeError):
+        return None
+    return name
+
+
+def detect_encoding(response: requests.Response) -> str:
+    """
+    确定网页编码
+
+    依次使用 Content-Type 头部的 charset, BOM, 网页开头的 <meta charset>,
+    都没有时才对全文做编码检测(apparent_encoding), 大页面上检测很慢
+    """
+    content_type = response.headers.get("Content-Type", "")
+    match = _CONTENT_TYPE_CHARSET.search(content_type)
+    if match and _valid_encoding(match.group(1)):
+        return match.group(1)
+    content = response.content or b""
+    if content.startswith(codecs.BOM_UTF8):
+        return "utf-8"
+    if "json" in content_type.lower():
+        return "utf-8"
+    match = _META_CHARSET.search(content[:META_SCAN_SIZE])
+    if match and _valid_encoding(match.group(1)):
+        return match.group(1).decode("ascii")
+    return response.apparent_encoding or "utf-8"
 
 
 def get(
@@ -56,35 +275,20 @@ def get(
 ) -> Union[requests.Response, bytes, str]:
     config_proxy = config.getInstance().proxy()
     errors = ""
-    headers = {"User-Agent": ua or G_USER_AGENT}
-    if extra_headers is not None:
-        headers.update(extra_headers)
     retry = config_proxy.retry if retry is None else retry
     timeout = config_proxy.timeout if timeout is None else timeout
+    proxies, verify = _proxy_settings(proxies, verify)
+    session = shared_session(cookies=cookies, ua=ua, timeout=timeout, proxies=proxies, verify=verify)
 
     for i in range(retry):
         try:
-            effective_proxies = proxies
-            effective_verify = verify
-            if effective_proxies is None and config_proxy.enable:
-                effective_proxies = config_proxy.proxies()
-                if effective_verify is None:
-                    disable_insecure_request_warning()
-                    effective_verify = False
-            result = requests.get(
-                str(url),
-                headers=headers,
-                timeout=timeout,
-                proxies=effective_proxies,
-                verify=effective_verify,
-                cookies=cookies,
-            )
+            result = session.get(str(url), headers=extra_headers, timeout=timeout)
             if return_type == "object":
                 return result
             elif return_type == "content":
                 return result.content
             else:
-                result.encoding = encoding or result.apparent_encoding
+                result.encoding = encoding or detect_encoding(result)
                 return result.text
         except Exception as e:
             if config.getInstance().debug():
@@ -115,35 +319,20 @@ def post(
 ) -> Union[requests.Response, bytes, str]:
     config_proxy = config.getInstance().proxy()
     errors = ""
-    headers = {"User-Agent": ua or G_USER_AGENT}
     retry = config_proxy.retry if retry is None else retry
     timeout = config_proxy.timeout if timeout is None else timeout
+    proxies, verify = _proxy_settings(proxies, verify)
+    session = shared_session(cookies=cookies, ua=ua, timeout=timeout, proxies=proxies, verify=verify)
 
     for i in range(retry):
         try:
-            effective_proxies = proxies
-            effective_verify = verify
-            if effective_proxies is None and config_proxy.enable:
-                effective_proxies = config_proxy.proxies()
-                if effective_verify is None:
-                    disable_insecure_request_warning()
-                    effective_verify = False
-            result = requests.post(
-                str(url),
-                data=data,
-                files=files,
-                headers=headers,
-                timeout=timeout,
-                proxies=effective_proxies,
-                verify=effective_verify,
-                cookies=cookies,
-            )
+            result = session.post(str(url), data=data, files=files, timeout=timeout)
             if return_type == "object":
                 return result
             elif return_type == "content":
                 return result.content
             elif return_type == "text":
-                result.encoding = encoding or result.apparent_encoding
+                result.encoding = encoding or detect_encoding(result)
                 return result.text
             else:
                 return result
@@ -184,37 +373,19 @@ def get_html(
     config_proxy = config.getInstance().proxy()
     errors = ""
 
-    headers = {"User-Agent": ua or G_USER_AGENT}  # noqa
-    if json_headers is not None:
-        headers.update(json_headers)
+    proxies, verify = _proxy_settings()
+    session = shared_session(cookies=cookies, ua=ua, timeout=config_proxy.timeout, proxies=proxies, verify=verify)
 
     for i in range(config_proxy.retry):
         try:
-            if config_proxy.enable:
-                proxies = config_proxy.proxies()
-                disable_insecure_request_warning()
-                result = requests.get(
-                    str(url),
-                    headers=headers,
-                    timeout=config_proxy.timeout,
-                    proxies=proxies,
-                    verify=False,
-                    cookies=cookies,
-                )
-            else:
-                result = requests.get(
-                    str(url),
-                    headers=headers,
-                    timeout=config_proxy.timeout,
-                    cookies=cookies,
-                )
+            result = session.get(str(url), headers=json_headers, timeout=config_proxy.timeout)
 
             if return_type == "object":
                 return result
             elif return_type == "content":
                 return result.content
             else:
-                result.encoding = encoding or result.apparent_encoding
+                result.encoding = encoding or detect_encoding(result)
                 return result.text
         except Exception as e:
             print("[-]Connect retry {}/{}".format(i + 1, config_proxy.retry))
@@ -247,19 +418,12 @@ def post_html(url: str, query: dict, headers: Optional[dict] = None) -> requests
     else:
         headers.update(headers_ua)
 
+    proxies = config_proxy.proxies() if config_proxy.enable else None
+    session = shared_session(timeout=config_proxy.timeout, proxies=proxies)
+
     for i in range(config_proxy.retry):
         try:
-            if config_proxy.enable:
-                proxies = config_proxy.proxies()
-                result = requests.post(
-                    url,
-                    data=query,
-                    proxies=proxies,
-                    headers=headers,
-                    timeout=config_proxy.timeout,
-                )
-            else:
-                result = requests.post(url, data=query, headers=headers, timeout=config_proxy.timeout)
+            result = session.post(url, data=query, headers=headers, timeout=config_proxy.timeout)
             return result
         except Exception as e:
             print("[-]Connect retry {}/{}".format(i + 1, config_proxy.retry))
@@ -276,43 +440,21 @@ def request_session(
     timeout: Optional[int] = None,
     proxies: Optional[dict] = None,
     verify: Optional[bool] = None,
+    rate_limited: bool = True,
 ) -> requests.Session:
     config_proxy = config.getInstance().proxy()
     retry = config_proxy.retry if retry is None else retry
     timeout = config_proxy.timeout if timeout is None else timeout
-
-    session = requests.Session()
-    retries = Retry(
-        total=retry,
-        connect=retry,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-    )
-    session.mount(
-        "https://",
-        TimeoutHTTPAdapter(max_retries=retries, timeout=timeout),
-    )
-    session.mount(
-        "http://",
-        TimeoutHTTPAdapter(max_retries=retries, timeout=timeout),
+    proxies, verify = _proxy_settings(proxies, verify)
+    return shared_session(
+        cookies=cookies,
+        ua=ua,
+        retry=retry,
+        timeout=timeout,
+        proxies=proxies,
+        verify=verify,
+        rate_limited=rate_limited,
     )
-    if isinstance(cookies, dict) and len(cookies):
-        requests.utils.add_dict_to_cookiejar(session.cookies, cookies)
-
-    effective_proxies = proxies
-    effective_verify = verify
-    if effective_proxies is None and config_proxy.enable:
-        effective_proxies = config_proxy.proxies()
-        if effective_verify is None:
-            disable_insecure_request_warning()
-            effective_verify = False
-    if effective_verify is not None:
-        session.verify = effective_verify
-    if effective_proxies is not None:
-        session.proxies = effective_proxies
-
-    session.headers = {"User-Agent": ua or G_USER_AGENT}
-    return session
 
 
 def get_html_session(
@@ -340,25 +482,15 @@ def get_html_session(
     :return: Session | Response | 二进制内容 | 文本内容 | (Response, Session) | None
     """
     config_proxy = config.getInstance().proxy()
-    session = requests.Session()
-    if isinstance(cookies, dict) and len(cookies):
-        requests.utils.add_dict_to_cookiejar(session.cookies, cookies)
-    retries = Retry(
-        total=config_proxy.retry,
-        connect=config_proxy.retry,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
+    proxies, verify = _cacert_proxy_settings()
+    session = shared_session(
+        cookies=cookies,
+        ua=ua,
+        retry=config_proxy.retry,
+        timeout=config_proxy.timeout,
+        proxies=proxies,
+        verify=verify,
     )
-    session.mount(
-        "https://",
-        TimeoutHTTPAdapter(max_retries=retries, timeout=config_proxy.timeout),
-    )
-    session.mount("http://", TimeoutHTTPAdapter(max_retries=retries, timeout=config_proxy.timeout))
-    if config_proxy.enable:
-        session.verify = config.getInstance().cacert_file()
-        session.proxies = config_proxy.proxies()
-    headers = {"User-Agent": ua or G_USER_AGENT}
-    session.headers = headers
     try:
         if isinstance(url, str) and len(url):
             result = session.get(str(url))
@@ -393,32 +525,18 @@ def get_html_by_browser(
     use_scraper: bool = False,
 ):
     config_proxy = config.getInstance().proxy()
-    s = (
-        create_scraper(
-            browser={
-                "custom": ua or G_USER_AGENT,
-            }
-        )
-        if use_scraper
-        else requests.Session()
-    )
-    if isinstance(cookies, dict) and len(cookies):
-        requests.utils.add_dict_to_cookiejar(s.cookies, cookies)
-    retries = Retry(
-        total=config_proxy.retry,
-        connect=config_proxy.retry,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-    )
-    s.mount(
-        "https://",
-        TimeoutHTTPAdapter(max_retries=retries, timeout=config_proxy.timeout),
+    proxies, verify = _cacert_proxy_settings()
+    s = private_session(
+        cookies=cookies,
+        ua=ua,
+        retry=config_proxy.retry,
+        timeout=config_proxy.timeout,
+        proxies=proxies,
+        verify=verify,
+        use_scraper=use_scraper,
     )
-    s.mount("http://", TimeoutHTTPAdapter(max_retries=retries, timeout=config_proxy.timeout))
-    if config_proxy.enable:
-        s.verify = config.getInstance().cacert_file()
-        s.proxies = config_proxy.proxies()
     try:
+        # 浏览器保持会话状态, 使用自己的 Session, 浏览器销毁时一并关闭
         browser = mechanicalsoup.StatefulBrowser(user_agent=ua or G_USER_AGENT, session=s)
         if isinstance(url, str) and len(url):
             result = browser.open(url)
@@ -477,30 +595,10 @@ def get_html_by_form(
     config_proxy = config.getInstance().proxy()
     retry = config_proxy.retry if retry is None else retry
     timeout = config_proxy.timeout if timeout is None else timeout
-    s = requests.Session()
-    if isinstance(cookies, dict) and len(cookies):
-        requests.utils.add_dict_to_cookiejar(s.cookies, cookies)
-    retries = Retry(
-        total=retry,
-        connect=retry,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-    )
-    s.mount(
-        "https://",
-        TimeoutHTTPAdapter(max_retries=retries, timeout=timeout),
-    )
-    s.mount("http://", TimeoutHTTPAdapter(max_retries=retries, timeout=timeout))
-    if verify is not None:
-        s.verify = verify
-    elif config_proxy.enable:
-        s.verify = config.getInstance().cacert_file()
-
-    if proxies is not None:
-        s.proxies = proxies
-    elif config_proxy.enable:
-        s.proxies = config_proxy.proxies()
+    proxies, verify = _cacert_proxy_settings(proxies, verify)
+    s = private_session(cookies=cookies, ua=ua, retry=retry, timeout=timeout, proxies=proxies, verify=verify)
     try:
+        # 表单流程(如 ASP.NET 的会话 cookies)使用自己的 Session, 浏览器销毁时一并关闭
         browser = mechanicalsoup.StatefulBrowser(user_agent=ua or G_USER_AGENT, session=s)
         result = browser.open(url)
         if not result.ok:
@@ -558,33 +656,16 @@ def get_html_by_scraper(
     config_proxy = config.getInstance().proxy()
     retry = config_proxy.retry if retry is None else retry
     timeout = config_proxy.timeout if timeout is None else timeout
-    session = create_scraper(
-        browser={
-            "custom": ua or G_USER_AGENT,
-        }
-    )
-    if isinstance(cookies, dict) and len(cookies):
-        requests.utils.add_dict_to_cookiejar(session.cookies, cookies)
-    retries = Retry(
-        total=retry,
-        connect=retry,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-    )
-    session.mount(
-        "https://",
-        TimeoutHTTPAdapter(max_retries=retries, timeout=timeout),
+    proxies, verify = _cacert_proxy_settings(proxies, verify)
+    session = shared_session(
+        cookies=cookies,
+        ua=ua,
+        retry=retry,
+        timeout=timeout,
+        proxies=proxies,
+        verify=verify,
+        use_scraper=True,
     )
-    session.mount("http://", TimeoutHTTPAdapter(max_retries=retries, timeout=timeout))
-    if verify is not None:
-        session.verify = verify
-    elif config_proxy.enable:
-        session.verify = config.getInstance().cacert_file()
-
-    if proxies is not None:
-        session.proxies = proxies
-    elif config_proxy.enable:
-        session.proxies = config_proxy.proxies()
     try:
         if isinstance(url, str) and len(url):
             result = session.get(str(url))
@@ -1,11 +1,55 @@
 import builtins
 import logging
+import threading
+from contextlib import contextmanager
+
+_group_local = threading.local()
+_group_flush_lock = threading.Lock()
 
 
 def get_logger():
     return logging.getLogger("MDC")
 
 
+class _GroupedOutputFilter(logging.Filter):
+    """当前线程处于 grouped_output() 内时, 先缓存日志记录而不立即输出"""
+
+    def filter(self, record):
+        records = getattr(_group_local, "records", None)
+        if records is None:
+            return True
+        records.append(record)
+        return False
+
+
+_grouped_output_filter = _GroupedOutputFilter()
+
+
+@contextmanager
+def grouped_output():
+    """
+    将一段代码内本线程产生的日志整体输出
+
+    多线程刮削时各影片的输出会相互交错, 在此上下文内的 print/info 等输出会先缓存,
+    退出时一次性写入日志, 保证每部影片的输出连续完整
+    """
+    logger = get_logger()
+    if _grouped_output_filter not in logger.filters:
+        logger.addFilter(_grouped_output_filter)
+    if getattr(_group_local, "records", None) is not None:
+        yield  # 已在分组内, 嵌套调用直接复用外层缓存
+        return
+    _group_local.records = []
+    try:
+        yield
+    finally:
+        records = _group_local.records
+        _group_local.records = None
+        with _group_flush_lock:
+            for record in records:
+                logger.handle(record)
+
+
 def _join(args, sep=" "):
     return sep.join(map(str, args))
 
@@ -161,6 +161,28 @@ def is_number_equivalent(a: typing.Optional[str], b: typing.Optional[str]) -> bo
     return sa == nb or sb == na
 
 
+def get_number_prefix(number: typing.Optional[str]) -> str:
+    """
+    番号系列前缀, 用于按系列统计各数据源的命中率
+    >>> get_number_prefix("ssis-001")
+    'SSIS'
+    >>> get_number_prefix("FC2-PPV-1234567")
+    'FC2'
+    >>> get_number_prefix("300MAAN-797")
+    'MAAN'
+    >>> get_number_prefix("020317_001")
+    '#6-3'
+    """
+    number = _strip_leading_numeric_prefix(number)
+    if number.startswith("FC2"):
+        return "FC2"
+    m = re.match(r"^[A-Z]+", number)
+    if m:
+        return m.group()
+    # 纯数字番号(carib/1pondo等)按数字分段长度归类
+    return "#" + "-".join(str(len(d)) for d in re.findall(r"\d+", number))
+
+
 class Cache_uncensored_conf:
     prefix = None
 
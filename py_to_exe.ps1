@@ -13,6 +13,7 @@ mkdir __pycache__
 
 
 pyinstaller --collect-submodules "mdc.image.imgproc" `
+    --collect-submodules "mdc.scraping" `
     --collect-data "face_recognition_models" `
     --collect-data "cloudscraper" `
     --collect-data "opencc" `
@@ -0,0 +1,154 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from mdc.core.metadata_db import MetadataDB, sources_signature
+from mdc.core.scraper import Scraping
+from mdc.scraping import registry
+from mdc.scraping.custom_exceptions import QueryError
+
+
+class TestMetadataDB(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "metadata.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_metadata_roundtrip_normalized_number(self):
+        db = MetadataDB(self.path, ttl=3600)
+        db.put_metadata("abc-123", {"number": "ABC-123", "title": "标题", "source": "javbus"})
+        self.assertEqual(db.get_metadata(" ABC-123 ")["title"], "标题")
+        self.assertIsNone(db.get_metadata("ABC-123", "general"))
+        db.close()
+
+    def test_metadata_ignored_when_sources_change(self):
+        db = MetadataDB(self.path, ttl=3600)
+        db.put_metadata("ABC-123", {"title": "T", "source": "javbus"}, sources=sources_signature("javbus, fanza"))
+        self.assertEqual(db.get_metadata("ABC-123", sources=sources_signature(["javbus", "fanza"]))["title"], "T")
+        self.assertIsNone(db.get_metadata("ABC-123", sources=sources_signature("fanza,javbus")))
+        self.assertIsNone(db.get_metadata("ABC-123", sources=sources_signature("javdb")))
+        db.close()
+
+    def test_ttl_and_refresh(self):
+        db = MetadataDB(self.path, ttl=3600)
+        db.put_source_result("javbus", "ABC-123", {"title": "T"})
+        self.assertEqual(db.get_source_result("javbus", "abc-123"), {"title": "T"})
+        with patch("mdc.core.metadata_db.time.time", return_value=time.time() + 7200):
+            self.assertIsNone(db.get_source_result("javbus", "ABC-123"))
+        db.close()
+
+        db = MetadataDB(self.path, ttl=3600, refresh=True)
+        self.assertIsNone(db.get_source_result("javbus", "ABC-123"))
+        db.close()
+
+
+class TestScrapingWithMetadataDB(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = MetadataDB(os.path.join(self.tmp.name, "metadata.db"), ttl=3600)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+        Scraping.searchAdult.cache_clear()
+
+    @patch.object(Scraping, "load_cookies_for_source", return_value=None)
+    def test_search_uses_database_before_network(self, _):
+        data = {"number": "ABC-123", "title": "T", "cover": "c", "source": "javbus"}
+        with (
+            patch("mdc.core.scraper.get_metadata_db", return_value=self.db),
+            patch.object(Scraping, "searchAdult", return_value=data) as mock_adult,
+        ):
+            self.assertEqual(Scraping().search("ABC-123", ["javbus"]), data)
+            self.assertEqual(Scraping().search("abc-123", ["javbus"]), data)
+            mock_adult.assert_called_once()
+
+            # 指定网址时总是重新获取
+            Scraping().search("ABC-123", ["javbus"], specifiedSource="javbus", specifiedUrl="http://x")
+            self.assertEqual(mock_adult.call_count, 2)
+
+    def scrape_with(self, scrape):
+        scraper = Scraping()
+        scraper.db = self.db
+        scraper.dbcookies = {}
+        parser = MagicMock()
+        parser.scrape.side_effect = scrape
+        module = MagicMock()
+        module.Javbus.return_value = parser
+        registry.clear_cache()
+        try:
+            with patch("importlib.import_module", return_value=module):
+                return scraper._scrape_source("javbus", "FC2-123456"), parser
+        finally:
+            registry.clear_cache()
+
+    def test_miss_recorded_and_skipped(self):
+        self.db.miss_ttl = 3600
+        self.assertEqual(self.scrape_with(lambda number, core: 404)[0], {})
+        self.assertTrue(self.db.is_miss("javbus", "fc2-123456"))
+
+        result, parser = self.scrape_with(lambda number, core: 404)
+        self.assertEqual(result, {})
+        parser.scrape.assert_not_called()
+
+        self.db.put_source_result("javbus", "FC2-123456", {"title": "T"})
+        self.assertFalse(self.db.is_miss("javbus", "FC2-123456"))
+
+    def test_invalid_result_not_recorded(self):
+        self.db.miss_ttl = 3600
+        # 限流/验证页面解析后没有标题, 下次仍然查询
+        self.scrape_with(lambda number, core: '{"title": ""}')
+        self.assertFalse(self.db.is_miss("javbus", "FC2-123456"))
+
+        def http_error(number, core):
+            raise requests.HTTPError("503 Server Error")
+
+        self.scrape_with(http_error)
+        self.assertFalse(self.db.is_miss("javbus", "FC2-123456"))
+
+    def test_query_error_recorded_but_network_error_not(self):
+        self.db.miss_ttl = 3600
+
+        def network_error(number, core):
+            try:
+                raise requests.ConnectionError("timeout")
+            except requests.ConnectionError:
+                raise QueryError(number, "访问出错")
+
+        self.scrape_with(network_error)
+        self.assertFalse(self.db.is_miss("javbus", "FC2-123456"))
+
+        def not_found(number, core):
+            raise QueryError(number, "未找到")
+
+        self.scrape_with(not_found)
+        self.assertTrue(self.db.is_miss("javbus", "FC2-123456"))
+
+    @patch("mdc.core.scraper.config")
+    def test_route_sources_by_hits_per_second(self, mock_config):
+        mock_config.getInstance.return_value.database_route_samples.return_value = 2
+        for _ in range(2):
+            self.db.record_attempt("SSIS", "javbus", False, 5.0)
+            self.db.record_attempt("SSIS", "fanza", True, 4.0)
+            self.db.record_attempt("SSIS", "javmenu", True, 1.0)
+        self.db.record_attempt("SSIS", "airav", True, 1.0)
+
+        scraper = Scraping()
+        scraper.db = self.db
+        sources = ("javbus", "airav", "fanza", "xcity", "javmenu")
+        self.assertEqual(
+            scraper.routeSources(sources, "SSIS-001"),
+            ("javmenu", "fanza", "airav", "xcity", "javbus"),
+        )
+        # 其他系列没有统计, 保持原顺序
+        self.assertEqual(scraper.routeSources(sources, "ABP-001"), sources)
+
+
+if __name__ == "__main__":
+    unittest.main()
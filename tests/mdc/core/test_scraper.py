@@ -1,14 +1,20 @@
 import json
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
 
 from mdc.core.scraper import Scraping, get_data_from_json
+from mdc.scraping import registry
 
 
 class TestScraper(unittest.TestCase):
+    def setUp(self):
+        registry.clear_cache()
+
     def tearDown(self):
         Scraping.searchGeneral.cache_clear()
         Scraping.searchAdult.cache_clear()
+        registry.clear_cache()
 
     @patch("mdc.core.scraper.load_cookies")
     @patch("mdc.core.scraper.file_modification_days")
@@ -117,6 +123,88 @@ class TestScraper(unittest.TestCase):
 
         self.assertIsNone(result)
 
+    @patch("mdc.core.scraper.config")
+    def test_searchAdult_concurrent_keeps_priority(self, mock_config):
+        scraper = Scraping()
+        scraper.dbcookies = {}
+        scraper.concurrent = 3
+        mock_config.getInstance.return_value.anonymous_fill.return_value = False
+
+        release_first = threading.Event()
+        called = []
+
+        def scrape_source(source, number):
+            called.append(source)
+            if source == "javbus":
+                # 低优先级的 airav 先返回, 仍然要等待 javbus 的结果
+                release_first.wait(1)
+                return {"title": "bus", "number": number, "cover": "c", "source": source}
+            if source == "airav":
+                release_first.set()
+                return {"title": "airav", "number": number, "cover": "c", "source": source}
+            return {}
+
+        with patch.object(Scraping, "_scrape_source", side_effect=scrape_source):
+            result = scraper.searchAdult("ABC-123", ("javbus", "airav", "fanza", "xcity", "mgstage"))
+
+        self.assertEqual(result["source"], "javbus")
+        # 窗口大小为3, 找到结果后不再查询后面的数据源
+        self.assertNotIn("xcity", called)
+        self.assertNotIn("mgstage", called)
+
+    @patch("mdc.core.scraper.config")
+    def test_searchAdult_concurrent_slides_window(self, mock_config):
+        scraper = Scraping()
+        scraper.dbcookies = {}
+        scraper.concurrent = 2
+        mock_config.getInstance.return_value.anonymous_fill.return_value = False
+
+        def scrape_source(source, number):
+            if source == "javmenu":
+                return {"title": "menu", "number": number, "cover": "c", "source": source}
+            return {}
+
+        with patch.object(Scraping, "_scrape_source", side_effect=scrape_source):
+            result = scraper.searchAdult("ABC-123", ("javbus", "airav", "fanza", "javmenu"))
+
+        self.assertEqual(result["source"], "javmenu")
+
+    @patch("mdc.core.scraper.config")
+    def test_searchAdult_merges_fields_by_priority(self, mock_config):
+        scraper = Scraping()
+        scraper.dbcookies = {}
+        conf = mock_config.getInstance.return_value
+        conf.anonymous_fill.return_value = False
+        conf.field_priority_switch.return_value = True
+        conf.field_priority.return_value = {
+            "cover": ["javbus", "fanza", "javdb"],
+            "outline": ["airav"],
+            "trailer": [],
+        }
+
+        data = {
+            "javdb": {"title": "db", "number": "ABC-123", "cover": "db.jpg", "outline": "", "trailer": ""},
+            "fanza": {"title": "fz", "number": "ABC-123", "cover": "fz.jpg", "outline": "o", "trailer": "t.mp4"},
+            "airav": {"title": "av", "number": "ABC-123", "cover": "av.jpg", "outline": "中文简介"},
+            "mgstage": {"title": "mg", "number": "XYZ-999", "cover": "mg.jpg", "outline": "wrong"},
+        }
+        called = []
+
+        def scrape_source(source, number):
+            called.append(source)
+            return dict(data.get(source, {}), source=source)
+
+        with patch.object(Scraping, "_scrape_source", side_effect=scrape_source):
+            result = scraper.searchAdult("ABC-123", ("javbus", "javdb", "fanza", "airav", "mgstage"))
+
+        self.assertEqual(result["title"], "db")
+        self.assertEqual(result["cover"], "fz.jpg")
+        self.assertEqual(result["outline"], "中文简介")
+        # 未配置优先级的字段只用已查询到的结果补全
+        self.assertEqual(result["trailer"], "t.mp4")
+        self.assertNotIn("mgstage", called)
+        self.assertEqual(called.count("javbus"), 1)
+
     def test_get_data_state(self):
         scraper = Scraping()
 
@@ -0,0 +1,158 @@
+import io
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import requests
+
+from mdc.download.downloader import (
+    IncompleteDownload,
+    download_file_with_filename,
+    segmented_download,
+    stream_download,
+)
+from mdc.download.manager import DownloadManager
+
+DATA = bytes(range(256)) * 1024
+
+
+def make_response(status, body, headers):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    response.raw = io.BytesIO(body)
+    return response
+
+
+class RangeSession:
+    """支持 Range 的假 Session, cut 不为空时第 cut_at 个请求只返回前 cut 字节"""
+
+    def __init__(self, data=DATA, cut=None, ranges=True, cut_at=0):
+        self.data = data
+        self.cut = cut
+        self.cut_at = cut_at
+        self.ranges = ranges
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, url, headers=None, stream=False):
+        headers = headers or {}
+        with self.lock:
+            index = len(self.requests)
+            self.requests.append(headers)
+        start = 0
+        if self.ranges and "Range" in headers:
+            start, _, end = headers["Range"][len("bytes=") :].partition("-")
+            start, end = int(start), int(end) if end else len(self.data) - 1
+            if start >= len(self.data):
+                return make_response(416, b"", {})
+            body = self.data[start : end + 1]
+            response_headers = {"Content-Range": f"bytes {start}-{end}/{len(self.data)}"}
+            status = 206
+        else:
+            body = self.data
+            response_headers = {"Content-Length": str(len(self.data))}
+            status = 200
+        if self.cut is not None and index == self.cut_at:
+            body = body[: self.cut]
+        return make_response(status, body, response_headers)
+
+
+class DownloadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.target = Path(self.tmp.name) / "trailer.mp4"
+        self.part = Path(self.tmp.name) / "trailer.mp4.part"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+class TestStreamDownload(DownloadTestCase):
+    def download(self, session):
+        with patch("mdc.download.downloader.request_session", return_value=session):
+            return stream_download("http://example.test/trailer.mp4", self.target)
+
+    def test_interrupted_download_resumes_with_range(self):
+        session = RangeSession(cut=100000)
+        with self.assertRaises(IncompleteDownload):
+            self.download(session)
+        self.assertFalse(self.target.exists())
+        self.assertEqual(self.part.stat().st_size, 100000)
+
+        self.assertTrue(self.download(session))
+        self.assertEqual(session.requests[-1]["Range"], "bytes=100000-")
+        self.assertEqual(self.target.read_bytes(), DATA)
+        self.assertFalse(self.part.exists())
+
+    def test_server_without_range_restarts(self):
+        self.part.write_bytes(b"stale")
+        self.assertTrue(self.download(RangeSession(ranges=False)))
+        self.assertEqual(self.target.read_bytes(), DATA)
+
+    def test_unsatisfiable_range_restarts(self):
+        self.part.write_bytes(DATA + b"extra")
+        self.assertTrue(self.download(RangeSession()))
+        self.assertEqual(self.target.read_bytes(), DATA)
+
+    def test_error_status_leaves_nothing(self):
+        session = RangeSession()
+        session.get = lambda url, headers=None, stream=False: make_response(404, b"", {})
+        self.assertFalse(self.download(session))
+        self.assertFalse(self.target.exists())
+
+
+class TestSegmentedDownload(DownloadTestCase):
+    def segmented(self, session, segments=4, min_size=0):
+        with patch("mdc.download.downloader.request_session", return_value=session):
+            return segmented_download("http://example.test/trailer.mp4", self.target, segments, min_size)
+
+    def test_segments_cover_whole_file(self):
+        session = RangeSession()
+        self.assertTrue(self.segmented(session))
+        self.assertEqual(self.target.read_bytes(), DATA)
+        ranges = sorted(h["Range"] for h in session.requests[1:])
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [self.target])
+
+    def test_failed_segment_retried(self):
+        # 第 0 个请求是探测, 第一个分段请求被截断后续传
+        session = RangeSession(cut=1000, cut_at=1)
+        self.assertTrue(self.segmented(session, segments=2))
+        self.assertEqual(self.target.read_bytes(), DATA)
+        self.assertEqual(len(session.requests), 4)
+
+    def test_falls_back_without_range_or_small_file(self):
+        session = RangeSession(ranges=False)
+        self.assertTrue(self.segmented(session))
+        self.assertEqual(len(session.requests), 2)
+        self.assertEqual(self.target.read_bytes(), DATA)
+
+        self.target.unlink()
+        session = RangeSession()
+        self.assertTrue(self.segmented(session, min_size=len(DATA) + 1))
+        self.assertNotIn("Range", session.requests[-1])
+
+
+class TestDownloadFileWithFilename(DownloadTestCase):
+    def download(self, fetch):
+        with (
+            patch("mdc.download.downloader.get_download_manager", return_value=DownloadManager(workers=1)),
+            patch("mdc.download.downloader.fetch_with_retry", side_effect=fetch),
+        ):
+            return download_file_with_filename("http://x/trailer.mp4", "trailer.mp4", self.tmp.name)
+
+    def test_result_reports_failure(self):
+        self.assertTrue(self.download(lambda url, dest, **kwargs: True))
+        self.assertFalse(self.download(lambda url, dest, **kwargs: False))
+
+        def fail(url, dest, **kwargs):
+            raise IncompleteDownload("cut")
+
+        self.assertFalse(self.download(fail))
+
+
+if __name__ == "__main__":
+    unittest.main()
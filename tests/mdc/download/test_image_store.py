@@ -0,0 +1,202 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from PIL import Image
+
+from mdc.download.downloader import _download_via_store, actor_photo_download, image_download
+from mdc.download.image_store import ImageStore
+from mdc.download.manager import DownloadManager
+from mdc.file.common_utils import link_or_copy, unshare_file
+from mdc.image.imgproc import cutImage
+
+
+class TestLinkOrCopy(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = Path(self.tmp.name) / "src.jpg"
+        self.src.write_bytes(b"image")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hardlink_and_replace_existing(self):
+        dst = Path(self.tmp.name) / "a" / "dst.jpg"
+        dst.parent.mkdir()
+        dst.write_bytes(b"old")
+        self.assertEqual(link_or_copy(self.src, dst), "link")
+        self.assertTrue(os.path.samefile(self.src, dst))
+        # 已经是硬链接时不留下临时文件
+        self.assertEqual(link_or_copy(self.src, dst), "link")
+        self.assertEqual(os.listdir(dst.parent), ["dst.jpg"])
+
+    def test_copy_when_link_unsupported(self):
+        dst = Path(self.tmp.name) / "dst.jpg"
+        with (
+            patch("mdc.file.common_utils.os.link", side_effect=OSError("cross-device")),
+            patch("mdc.file.common_utils._reflink", return_value=False),
+        ):
+            self.assertEqual(link_or_copy(self.src, dst), "copy")
+        self.assertEqual(dst.read_bytes(), b"image")
+        self.assertFalse(os.path.samefile(self.src, dst))
+
+    def test_unshare_before_modify(self):
+        dst = Path(self.tmp.name) / "dst.jpg"
+        link_or_copy(self.src, dst)
+        self.assertTrue(unshare_file(dst))
+        dst.write_bytes(b"marked")
+        self.assertEqual(self.src.read_bytes(), b"image")
+        self.assertFalse(unshare_file(dst))
+
+
+class TestActorPhotoStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = ImageStore(os.path.join(self.tmp.name, "store"))
+        self.fetched = []
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def fake_download(self, dn_list, parallel=0, json_headers=None, priority=None):
+        result = []
+        for url, path in dn_list:
+            self.fetched.append(url)
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            # 两个 URL 内容相同
+            Path(path).write_bytes(b"same photo")
+            result.append(str(path))
+        return result
+
+    def download(self, movie, actors):
+        movie_dir = Path(self.tmp.name) / movie
+        movie_dir.mkdir(exist_ok=True)
+        with (
+            patch("mdc.download.downloader.get_image_store", return_value=self.store),
+            patch("mdc.download.downloader.parallel_download_files", side_effect=self.fake_download),
+            patch("mdc.download.downloader.config") as mock_config,
+        ):
+            mock_config.getInstance.return_value.download_only_missing_images.return_value = False
+            mock_config.getInstance.return_value.extrafanart_thread_pool_download.return_value = 2
+            actor_photo_download(actors, str(movie_dir), "ABC-123")
+        return movie_dir / ".actors"
+
+    def test_each_url_fetched_once_per_library(self):
+        actors = {"A": "http://x/a.jpg", "B": "http://x/b.jpg"}
+        first = self.download("m1", actors)
+        second = self.download("m2", actors)
+        self.assertEqual(self.fetched, ["http://x/a.jpg", "http://x/b.jpg"])
+        self.assertEqual((second / "A.jpg").read_bytes(), b"same photo")
+        # 内容相同的图片在库中只保存一份, 所有影片目录链接到同一个文件
+        blob = self.store.lookup("http://x/a.jpg")
+        self.assertEqual(blob, self.store.lookup("http://x/b.jpg"))
+        for path in (first / "A.jpg", first / "B.jpg", second / "A.jpg"):
+            self.assertTrue(os.path.samefile(blob, path))
+        self.assertEqual(os.listdir(self.store.root / "tmp"), [])
+
+    def test_missing_blob_fetched_again(self):
+        self.download("m1", {"A": "http://x/a.jpg"})
+        self.store.lookup("http://x/a.jpg").unlink()
+        self.download("m2", {"A": "http://x/a.jpg"})
+        self.assertEqual(len(self.fetched), 2)
+
+    def test_concurrent_movies_share_merged_download(self):
+        release = threading.Event()
+
+        def fetch(url, dest, **kwargs):
+            release.wait(5)
+            Path(dest).parent.mkdir(parents=True, exist_ok=True)
+            Path(dest).write_bytes(b"photo")
+            return True
+
+        results = {}
+
+        def run(movie):
+            path = Path(self.tmp.name) / movie / "A.jpg"
+            results[movie] = _download_via_store(self.store, [("http://x/a.jpg", path)], 1)
+
+        with (
+            patch("mdc.download.downloader.get_download_manager", return_value=DownloadManager(workers=2)),
+            patch("mdc.download.downloader.fetch_with_retry", side_effect=fetch) as mock_fetch,
+        ):
+            threads = [threading.Thread(target=run, args=(movie,)) for movie in ("m1", "m2")]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.1)
+            release.set()
+            for thread in threads:
+                thread.join(5)
+        # 两部影片的下载合并为一次, 都得到库文件
+        mock_fetch.assert_called_once()
+        blob = self.store.lookup("http://x/a.jpg")
+        for movie in ("m1", "m2"):
+            self.assertEqual(results[movie], [str(Path(self.tmp.name) / movie / "A.jpg")])
+            self.assertTrue(os.path.samefile(blob, results[movie][0]))
+
+
+class TestCoverStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = ImageStore(os.path.join(self.tmp.name, "store"))
+        self.downloads = 0
+        patchers = [
+            patch("mdc.download.downloader.get_image_store", return_value=self.store),
+            patch("mdc.image.imgproc.get_image_store", return_value=self.store),
+            patch("mdc.download.downloader.download_file_with_filename", side_effect=self.fake_download),
+            patch("mdc.download.downloader.config"),
+            patch("mdc.image.imgproc.config"),
+        ]
+        mocks = [p.start() for p in patchers]
+        for p in patchers:
+            self.addCleanup(p.stop)
+        for mock_config in mocks[3:]:
+            conf = mock_config.getInstance.return_value
+            conf.download_only_missing_images.return_value = False
+            conf.jellyfin.return_value = 0
+            conf.face_aways_imagecut.return_value = False
+            conf.face_aspect_ratio.return_value = 2
+            conf.face_locations_model.return_value = "hog"
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def fake_download(self, url, filename, path, filepath, headers=None, **kwargs):
+        self.downloads += 1
+        Image.new("RGB", (800, 538), "red").save(os.path.join(path, filename))
+
+    def process(self, folder):
+        path = os.path.join(self.tmp.name, folder)
+        os.makedirs(path, exist_ok=True)
+        image_download("http://x/cover.jpg", "fanart.jpg", "thumb.jpg", path, "movie.mp4")
+        with patch("mdc.image.imgproc.face_crop_width", return_value=(0, 0, 358, 538)) as mock_crop:
+            cutImage(1, path, "thumb.jpg", "poster.jpg")
+        return Path(path), mock_crop
+
+    def test_cover_and_poster_reused(self):
+        first, crop = self.process("m1")
+        crop.assert_called_once()
+        self.assertTrue(os.path.samefile(first / "thumb.jpg", first / "fanart.jpg"))
+
+        second, crop = self.process("m2")
+        crop.assert_not_called()
+        self.assertEqual(self.downloads, 1)
+        for name in ("thumb.jpg", "fanart.jpg", "poster.jpg"):
+            self.assertTrue(os.path.samefile(first / name, second / name))
+
+        # 加水印只改变该影片的文件
+        unshare_file(second / "poster.jpg")
+        Image.new("RGB", (358, 538), "blue").save(second / "poster.jpg")
+        with Image.open(first / "poster.jpg") as img:
+            red, _, blue = img.getpixel((0, 0))
+        self.assertGreater(red, 200)
+        self.assertLess(blue, 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
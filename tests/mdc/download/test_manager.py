@@ -0,0 +1,114 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from mdc.download.manager import PRIORITY_COVER, PRIORITY_TRAILER, DownloadManager
+
+
+class TestDownloadManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_priority_order(self):
+        manager = DownloadManager(workers=1)
+        release = threading.Event()
+        order = []
+
+        def fetch(url, dest):
+            if url.endswith("block"):
+                release.wait(5)
+            order.append(url)
+            return True
+
+        first = manager.submit("http://a/block", self.path("0"), fetch)
+        time.sleep(0.1)
+        trailer = manager.submit("http://a/trailer", self.path("1"), fetch, PRIORITY_TRAILER)
+        cover = manager.submit("http://a/cover", self.path("2"), fetch, PRIORITY_COVER)
+        release.set()
+        for future in (first, trailer, cover):
+            future.result(5)
+        self.assertEqual(order, ["http://a/block", "http://a/cover", "http://a/trailer"])
+
+    def test_inflight_url_downloaded_once(self):
+        manager = DownloadManager(workers=2)
+        release = threading.Event()
+        calls = []
+
+        def fetch(url, dest):
+            calls.append(dest)
+            release.wait(5)
+            with open(dest, "wb") as f:
+                f.write(b"cover")
+            return True
+
+        f1 = manager.submit("http://a/cover.jpg", self.path("cd1.jpg"), fetch)
+        f2 = manager.submit("http://a/cover.jpg", self.path("cd2.jpg"), fetch)
+        release.set()
+        self.assertEqual(f1.result(5), self.path("cd1.jpg"))
+        self.assertEqual(f2.result(5), self.path("cd2.jpg"))
+        self.assertEqual(calls, [self.path("cd1.jpg")])
+        with open(self.path("cd2.jpg"), "rb") as f:
+            self.assertEqual(f.read(), b"cover")
+
+    def test_not_found_and_error_results(self):
+        manager = DownloadManager(workers=1)
+        self.assertIsNone(manager.submit("http://a/missing", self.path("x"), lambda u, d: False).result(5))
+
+        def fail(url, dest):
+            raise OSError("boom")
+
+        with self.assertRaises(OSError):
+            manager.submit("http://a/error", self.path("y"), fail).result(5)
+
+    def test_host_limit(self):
+        manager = DownloadManager(workers=4, host_workers=1)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def fetch(url, dest):
+            with lock:
+                running.append(url)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(url)
+            return True
+
+        futures = [manager.submit(f"http://same.host/{i}", self.path(str(i)), fetch) for i in range(4)]
+        for future in futures:
+            future.result(5)
+        self.assertEqual(max(peak), 1)
+
+    def test_slow_host_does_not_block_other_hosts(self):
+        manager = DownloadManager(workers=2, host_workers=1)
+        release = threading.Event()
+        order = []
+
+        def fetch(url, dest):
+            if "slow" in url:
+                release.wait(5)
+            order.append(url)
+            return True
+
+        slow = [manager.submit(f"http://slow.host/{i}", self.path(f"s{i}"), fetch, PRIORITY_COVER) for i in range(3)]
+        time.sleep(0.1)
+        # 慢站点的任务在排队, 另一个线程仍然下载其他站点
+        other = manager.submit("http://fast.host/a", self.path("f"), fetch, PRIORITY_TRAILER)
+        self.assertEqual(other.result(5), self.path("f"))
+        release.set()
+        for future in slow:
+            future.result(5)
+        self.assertEqual(order[0], "http://fast.host/a")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from mdc.file.failed_list import DAY, FailedList, get_failed_list
+from mdc.file.file_utils import finishMovie, moveFailedFolder
+
+
+class TestFailedList(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "failed_list.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_backoff_doubles_until_max(self):
+        failed = FailedList(self.path, retry_days=1, retry_max_days=3)
+        failed.record("/a.mp4", "metadata not found", ["javbus", "fanza"])
+        record = failed.get("/a.mp4")
+        self.assertEqual((record["attempts"], record["sources"]), (1, "javbus,fanza"))
+        last = record["last_failed"]
+        self.assertTrue(failed.should_skip("/a.mp4", now=last + 0.5 * DAY))
+        self.assertFalse(failed.should_skip("/a.mp4", now=last + 1.5 * DAY))
+        self.assertFalse(failed.should_skip("/b.mp4"))
+
+        failed.record("/a.mp4", "timeout")
+        failed.record("/a.mp4", "timeout")
+        record = failed.get("/a.mp4")
+        self.assertEqual((record["attempts"], record["reason"]), (3, "timeout"))
+        # 1, 2, 4 -> 最多 3 天
+        self.assertEqual(failed.retry_after(3, 0), 3 * DAY)
+        failed.close()
+
+    def test_no_retry(self):
+        failed = FailedList(self.path, retry_days=0)
+        failed.record("/a.mp4")
+        self.assertTrue(failed.should_skip("/a.mp4", now=time.time() + 365 * DAY))
+        failed.close()
+
+    def test_import_legacy_txt(self):
+        txt = Path(self.tmp.name) / "failed_list.txt"
+        txt.write_text("/a.mp4\n/b.mp4\n/a.mp4\n", encoding="utf-8")
+        failed = FailedList(self.path)
+        self.assertTrue(failed.should_skip("/a.mp4"))
+        self.assertTrue(failed.should_skip("/b.mp4"))
+        self.assertFalse(txt.exists())
+        self.assertTrue(Path(f"{txt}.imported").exists())
+        failed.close()
+
+    def test_concurrent_writers(self):
+        failed = FailedList(self.path)
+        threads = [threading.Thread(target=lambda: [failed.record("/a.mp4") for _ in range(20)]) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(failed.get("/a.mp4")["attempts"], 80)
+        failed.close()
+
+    @patch("mdc.file.failed_list.config")
+    @patch("mdc.file.file_utils.config")
+    def test_move_failed_folder_records_reason(self, file_config, list_config):
+        for mock_config in (file_config, list_config):
+            conf = mock_config.getInstance.return_value
+            conf.failed_folder.return_value = self.tmp.name
+            conf.main_mode.return_value = 3
+            conf.link_mode.return_value = 0
+            conf.failed_retry_days.return_value = 1
+            conf.failed_retry_max_days.return_value = 30
+        moveFailedFolder("/movies/a.mp4", "metadata not found", ["javbus"])
+        failed = FailedList(self.path)
+        self.assertEqual(failed.get(os.path.abspath("/movies/a.mp4"))["reason"], "metadata not found")
+        failed.close()
+        # 本次失败, 记录保留
+        self.assertFalse(finishMovie("/movies/a.mp4"))
+        self.assertIsNotNone(get_failed_list().get(os.path.abspath("/movies/a.mp4")))
+        # 之后重试成功, 记录删除
+        self.assertTrue(finishMovie("/movies/a.mp4"))
+        self.assertIsNone(get_failed_list().get(os.path.abspath("/movies/a.mp4")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,15 @@
+import os
 import shutil
 import tempfile
+import time
 import unittest
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
-from mdc.file.movie_list import movie_lists
+from mdc.file.failed_list import FailedList
+from mdc.file.movie_list import MovieList, _list_dir, movie_lists, walk_movies
+from mdc.file.scan_index import ScanIndex
+from mdc.file.subtitle_index import get_subtitle_index
 
 
 class TestMovieList(unittest.TestCase):
@@ -43,6 +48,11 @@ class TestMovieList(unittest.TestCase):
         self.config_mock.failed_folder.return_value = self.test_dir
         self.config_mock.ignore_failed_list.return_value = True  # Default to ignore failed list check
         self.config_mock.escape_folder.return_value = "escaped,hidden"
+        self.config_mock.scan_workers.return_value = 4
+        self.config_mock.incremental_scan.return_value = False
+        self.config_mock.failed_retry_days.return_value = 1
+        self.config_mock.failed_retry_max_days.return_value = 30
+        self.config_mock.sub_rule.return_value = {".srt", ".ass"}
 
         # Patch config.getInstance
         self.patcher = patch("mdc.config.config.getInstance", return_value=self.config_mock)
@@ -84,6 +94,158 @@ class TestMovieList(unittest.TestCase):
         self.assertNotIn("movie1.mp4", filenames)
         self.assertIn("movie2.avi", filenames)
 
+    def test_movie_lists_stable_order_and_total(self):
+        (self.source / "subdir" / "a").mkdir()
+        (self.source / "subdir" / "a" / "movie5.mp4").touch()
+        (self.source / "subdir" / "escaped").mkdir()
+        (self.source / "subdir" / "escaped" / "movie6.mp4").touch()
+        (self.source / "zdir").mkdir()
+        (self.source / "zdir" / "movie7.MP4").touch()
+
+        movies = movie_lists(str(self.source), "")
+        self.assertEqual(movies.total(), 5)
+        # 每个目录先返回文件再按名称进入子目录
+        self.assertEqual(
+            [Path(f).relative_to(self.source.resolve()).as_posix() for f in movies],
+            ["movie1.mp4", "movie2.avi", "subdir/movie3.mkv", "subdir/a/movie5.mp4", "zdir/movie7.MP4"],
+        )
+
+    def test_subtitles_indexed_during_walk(self):
+        from mdc.core.core import has_subtitles, move_subtitles
+
+        (self.source / "movie1.chs.srt").touch()
+        (self.source / "subdir" / "subs").mkdir()
+        (self.source / "subdir" / "subs" / "MOVIE3.ass").touch()
+        (self.source / "escaped" / "movie1.srt").touch()
+        dest = self.source / "out"
+        dest.mkdir()
+
+        movies = movie_lists(str(self.source), "")
+        self.assertEqual(movies.total(), 3)
+        root = self.source.resolve()
+        index = get_subtitle_index()
+        self.assertTrue(index.complete)
+        self.assertEqual(index.find(str(root), "movie1"), [str(root / "movie1.chs.srt")])
+        self.assertEqual(index.find(str(root / "subdir"), "movie3"), [str(root / "subdir" / "subs" / "MOVIE3.ass")])
+        self.assertFalse(index.covers(str(root / "escaped")))
+
+        # 查找字幕不再遍历影片所在目录
+        with patch("pathlib.Path.glob", side_effect=AssertionError("glob called")):
+            self.assertTrue(has_subtitles(str(root / "movie1.mp4"), str(dest), False, "ABC-1", "", "", "", ""))
+            self.assertTrue(move_subtitles(str(root / "movie1.mp4"), str(root), False, "ABC-1", "", "", "", ""))
+            self.assertFalse(has_subtitles(str(root / "movie2.avi"), str(dest), False, "ABC-2", "", "", "", ""))
+        self.assertTrue((root / "ABC-1.chs.srt").is_file())
+        self.assertEqual(index.find(str(root), "movie1"), [])
+        self.assertEqual(index.list_dir(str(root)), [])
+
+
+class TestIncrementalScan(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = Path(self.tmp.name) / "source"
+        (self.source / "a").mkdir(parents=True)
+        (self.source / "b").mkdir()
+        (self.source / "a" / "m1.mp4").touch()
+        (self.source / "b" / "m2.mp4").touch()
+        self.db = os.path.join(self.tmp.name, "scan_index.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def scan(self, index_path=None):
+        index = ScanIndex(index_path or self.db, str(self.source), "sig")
+        files = [Path(f).name for f in walk_movies(str(self.source), {".mp4"}, index=index)]
+        return index, files
+
+    def age(self, path, seconds=60):
+        # 让修改时间早于上次扫描, 视为可信
+        t = time.time() - seconds
+        os.utime(path, (t, t))
+
+    def test_only_new_files_after_first_scan(self):
+        for d in (self.source, self.source / "a", self.source / "b"):
+            self.age(d)
+        index, files = self.scan()
+        self.assertTrue(index.full)
+        self.assertEqual(files, ["m1.mp4", "m2.mp4"])
+        index.save()
+        index.close()
+
+        (self.source / "b" / "m3.mp4").touch()
+        self.age(self.source / "b", 30)
+        with patch("mdc.file.movie_list._list_dir", wraps=_list_dir) as mock_list:
+            index, files = self.scan()
+        self.assertFalse(index.full)
+        self.assertEqual(files, ["m3.mp4"])
+        # 只重新列出修改时间变化的目录
+        self.assertEqual([c.args[0] for c in mock_list.call_args_list], [str(self.source / "b")])
+        index.close()
+
+    def test_pending_files_returned_again(self):
+        for d in (self.source, self.source / "a", self.source / "b"):
+            self.age(d)
+        index, files = self.scan()
+        index.save(pending=[str(self.source / "b" / "m2.mp4")])
+        index.close()
+
+        index, files = self.scan()
+        self.assertEqual(files, ["m2.mp4"])
+        index.close()
+
+    def test_failed_movies_returned_again(self):
+        for d in (self.source, self.source / "a", self.source / "b"):
+            self.age(d)
+        failed = FailedList(os.path.join(self.tmp.name, "failed_list.db"))
+        failed.record(str(self.source / "b" / "m2.mp4"), "metadata not found")
+        # 失败列表中的影片即使本次被跳过或失败, 也不记入扫描索引
+        for _ in range(2):
+            index = ScanIndex(self.db, str(self.source), "sig")
+            movies = MovieList(walk_movies(str(self.source), {".mp4"}, index=index), index, failed=failed)
+            files = [Path(f).name for f in movies]
+            for movie in movies._items:
+                movies.mark_done(movie)
+            movies.save_index()
+            index.close()
+        self.assertEqual(files, ["m2.mp4"])
+        failed.close()
+
+    def test_only_done_movies_saved(self):
+        for d in (self.source, self.source / "a", self.source / "b"):
+            self.age(d)
+        # 没有失败列表(模式1/2)时, 处理失败的影片下次扫描时仍会返回
+        index = ScanIndex(self.db, str(self.source), "sig")
+        movies = MovieList(walk_movies(str(self.source), {".mp4"}, index=index), index)
+        self.assertEqual(movies.total(), 2)
+        movies.mark_done(next(movies))
+        movies.save_index()
+        index.close()
+
+        index, files = self.scan()
+        self.assertEqual(files, ["m2.mp4"])
+        index.close()
+
+    def test_unreliable_mtime_forces_full_scan(self):
+        # a 的修改时间接近上次扫描, 不可信, 每次都重新列出并比较条目数
+        for d in (self.source, self.source / "b"):
+            self.age(d)
+        index, _ = self.scan()
+        index.save()
+        index.close()
+
+        # 目录内容变化但修改时间保持不变
+        st = os.stat(self.source / "a")
+        (self.source / "a" / "m3.mp4").touch()
+        os.utime(self.source / "a", ns=(st.st_atime_ns, st.st_mtime_ns))
+        index, files = self.scan()
+        self.assertEqual(files, ["m3.mp4"])
+        self.assertFalse(index.reliable)
+        index.save()
+        index.close()
+
+        index, _ = self.scan()
+        self.assertTrue(index.full)
+        index.close()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from mdc.file.watcher import MovieWatcher
+
+
+class TestMovieWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = Path(self.tmp.name)
+        (self.source / "old.mp4").write_bytes(b"old")
+        (self.source / "JAV_output").mkdir()
+        self.watcher = MovieWatcher(
+            str(self.source), {".mp4"}, {"escaped"}, [str(self.source / "JAV_output")], settle=10
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_new_movies_after_snapshot(self):
+        self.watcher.snapshot()
+        (self.source / "new.mp4").write_bytes(b"new")
+        (self.source / "new-trailer.mp4").write_bytes(b"t")
+        (self.source / "escaped").mkdir()
+        (self.source / "escaped" / "e.mp4").write_bytes(b"e")
+        (self.source / "JAV_output" / "done.mp4").write_bytes(b"d")
+        self.watcher.poll()
+        self.assertEqual(list(self.watcher._pending), [str(self.source / "new.mp4")])
+
+    def test_wait_until_size_is_stable(self):
+        movie = self.source / "new.mp4"
+        movie.write_bytes(b"part")
+        self.watcher.notify(str(movie))
+        self.assertEqual(self.watcher.ready(now=100), [])
+        # 仍在写入
+        with open(movie, "ab") as f:
+            f.write(b"more")
+        self.assertEqual(self.watcher.ready(now=105), [])
+        self.assertEqual(self.watcher.ready(now=114), [])
+        self.assertEqual(self.watcher.ready(now=115), [str(movie)])
+        # 每个文件只处理一次
+        self.watcher.notify(str(movie))
+        self.assertEqual(self.watcher.ready(now=200), [])
+
+    def test_deleted_file_dropped(self):
+        movie = self.source / "new.mp4"
+        movie.write_bytes(b"part")
+        self.watcher.notify(str(movie))
+        os.unlink(movie)
+        self.assertEqual(self.watcher.ready(now=100), [])
+        self.assertEqual(self.watcher._pending, {})
+
+    @patch("mdc.file.watcher.Observer", None)
+    def test_movies_added_during_first_scan(self):
+        # 首次扫描前开始监视
+        self.watcher.start()
+        # 扫描期间出现两部影片, 扫描只取到其中一部
+        (self.source / "taken.mp4").write_bytes(b"t")
+        (self.source / "late.mp4").write_bytes(b"l")
+        self.watcher.mark_known([str(self.source / "taken.mp4")])
+        self.watcher.poll()
+        self.assertEqual(list(self.watcher._pending), [str(self.source / "late.mp4")])
+
+    @patch("mdc.file.watcher.Observer", None)
+    @patch.object(MovieWatcher, "TICK", 0.01)
+    def test_run_with_polling(self):
+        watcher = MovieWatcher(str(self.source), {".mp4"}, settle=0, interval=0)
+        stop = threading.Event()
+        handled = []
+
+        def handler(path):
+            handled.append(Path(path).name)
+            if len(handled) == 1:
+                (self.source / "second.mp4").write_bytes(b"2")
+            else:
+                stop.set()
+                # 处理出错不会停止监视
+                raise RuntimeError("scrape failed")
+
+        timer = threading.Timer(0.05, (self.source / "first.mp4").write_bytes, (b"1",))
+        timer.start()
+        # 出错时不会一直等待
+        guard = threading.Timer(10, stop.set)
+        guard.start()
+        watcher.run(handler, stop)
+        guard.cancel()
+        timer.join()
+        # 启动时已有的 old.mp4 不处理
+        self.assertEqual(handled, ["first.mp4", "second.mp4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
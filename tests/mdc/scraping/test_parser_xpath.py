@@ -0,0 +1,129 @@
+import pytest
+import requests
+from lxml import etree
+
+from mdc.scraping import utils
+from mdc.scraping.parser import Parser
+from mdc.scraping.run_cache import get_run_cache
+from mdc.utils.http import request as httprequest
+
+HTML = """
+<html>
+    <head><title>ABC-123 無修正 タイトル</title></head>
+    <body>
+        <span class="release">2020/01/02</span>
+        <a class="tag">ドラマ, 無修正</a>
+        <a class="actor">Actor A</a>
+    </body>
+</html>
+"""
+
+
+class CountingParser(Parser):
+    source = "counting"
+    expr_title = "//title/text()"
+    expr_release = '//span[@class="release"]/text()'
+    expr_tags = '//a[@class="tag"]/text()'
+    expr_actor = '//a[@class="actor"]/text()'
+
+    def extraInit(self):
+        self.calls = {}
+
+    def getTreeAll(self, tree, expr):
+        self.calls[expr] = self.calls.get(expr, 0) + 1
+        return super().getTreeAll(tree, expr)
+
+    def getTreeElement(self, tree, expr, index=0):
+        self.calls[expr] = self.calls.get(expr, 0) + 1
+        return super().getTreeElement(tree, expr, index)
+
+    def getTags(self, htmltree):
+        tags = super().getTags(htmltree)
+        tags.append("extra")
+        return tags
+
+
+def test_subclass_expressions_compiled_at_class_creation():
+    assert isinstance(utils._compiled.get(CountingParser.expr_title), etree.XPath)
+    # 类属性仍然是字符串, 子类可以继续拼接或直接调用 tree.xpath
+    assert isinstance(CountingParser.expr_title, str)
+    compiled = utils.compileXPath(CountingParser.expr_title)
+    assert utils.compileXPath(CountingParser.expr_title) is compiled
+    assert utils.compileXPath(compiled) is compiled
+
+
+def test_dictformat_evaluates_each_expression_once():
+    parser = CountingParser()
+    parser.init()
+    parser.detailurl = "http://example.test"
+    tree = etree.fromstring(HTML, etree.HTMLParser())
+
+    data = parser.dictformat(tree)
+
+    assert data["year"] == "2020"
+    assert data["release"] == "2020-01-02"
+    assert data["tag"] == ["ドラマ", "無修正", "extra"]
+    assert data["uncensored"] is True
+    assert parser.calls[CountingParser.expr_title] == 1
+    assert parser.calls[CountingParser.expr_release] == 1
+    assert parser.calls[CountingParser.expr_tags] == 1
+
+
+def test_getters_not_memoized_outside_dictformat():
+    parser = CountingParser()
+    parser.init()
+    tree = etree.fromstring(HTML, etree.HTMLParser())
+
+    assert parser.getTags(tree) == ["ドラマ", "無修正", "extra"]
+    assert parser.getTags(tree) == ["ドラマ", "無修正", "extra"]
+    assert parser.calls[CountingParser.expr_tags] == 2
+
+
+@pytest.fixture(autouse=True)
+def clear_run_cache():
+    get_run_cache().clear()
+    yield
+    get_run_cache().clear()
+
+
+def fake_get(content: bytes, content_type: str, status: int = 200):
+    def get(url, **kwargs):
+        response = requests.Response()
+        response.status_code = status
+        response.headers["Content-Type"] = content_type
+        response._content = content
+        return response
+
+    return get
+
+
+def test_get_html_tree_parses_raw_bytes(monkeypatch):
+    page = HTML.replace("<head>", '<head><meta charset="euc-jp">').encode("euc-jp")
+    monkeypatch.setattr(httprequest, "get", fake_get(page, "text/html"))
+    parser = CountingParser()
+    parser.init()
+
+    tree = parser.getHtmlTree("http://example.test")
+    assert parser.getTitle(tree) == "ABC-123 無修正 タイトル"
+    assert "タイトル" in parser.getHtml("http://example.test")
+
+
+def test_not_found_marker_checked_in_page_encoding(monkeypatch):
+    page = "<html><title>お探しの商品が見つかりません</title></html>".encode("shift_jis")
+    monkeypatch.setattr(httprequest, "get", fake_get(page, "text/html; charset=shift_jis"))
+    parser = CountingParser()
+    parser.init()
+
+    assert parser.getHtmlTree("http://example.test") == 404
+
+
+def test_error_status_raised_not_parsed(monkeypatch):
+    parser = CountingParser()
+    parser.init()
+    monkeypatch.setattr(httprequest, "get", fake_get(HTML.encode(), "text/html", 404))
+    assert parser.getHtmlTree("http://example.test/gone") == 404
+    # 限流和服务器错误的页面不能当作刮削结果
+    for status in (429, 503):
+        monkeypatch.setattr(httprequest, "get", fake_get(HTML.encode(), "text/html", status))
+        with pytest.raises(requests.HTTPError):
+            parser.getHtmlTree(f"http://example.test/{status}")
@@ -0,0 +1,55 @@
+import sys
+import threading
+
+import pytest
+
+from mdc.scraping import registry
+from mdc.scraping.parser import Parser
+
+
+class Dummy(Parser):
+    source = "dummy"
+
+
+@pytest.fixture(autouse=True)
+def cleanup():
+    yield
+    registry._specs.pop("dummy", None)
+    registry.clear_cache()
+
+
+def test_builtin_sources_are_lazy():
+    assert "javbus" in registry.sources("adult")
+    assert "tmdb" in registry.sources("general")
+    assert "tmdb" not in registry.sources("adult")
+    registry.get_parser_class("imdb")
+    assert "mdc.scraping.imdb" in sys.modules
+
+
+def test_register_third_party_parser():
+    registry.register("dummy", Dummy)
+    assert "dummy" in registry.sources("adult")
+    assert registry.get_parser_class("dummy") is Dummy
+
+    registry.register("dummy", "mdc.scraping.parser:Parser")
+    assert registry.get_parser_class("dummy") is Parser
+
+
+def test_unknown_source_raises_key_error():
+    with pytest.raises(KeyError):
+        registry.get_parser_class("no-such-source")
+
+
+def test_parser_instances_reused_per_thread_and_reset():
+    registry.register("dummy", Dummy)
+    parser = registry.get_parser("dummy")
+    parser.number = "ABC-123"
+    again = registry.get_parser("dummy")
+    assert again is parser
+    assert not hasattr(again, "number")
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(registry.get_parser("dummy")))
+    t.start()
+    t.join()
+    assert other[0] is not parser
@@ -0,0 +1,59 @@
+import json
+
+from lxml import etree
+
+from mdc.core.scraper import Scraping
+from mdc.scraping import registry, utils
+from mdc.scraping.result import FIELDS, ScrapeResult
+
+
+def test_scrape_result_mapping_interface():
+    result = ScrapeResult(title="T", number="ABC-123", headers={"referer": "http://x"})
+    assert result["title"] == "T"
+    assert result.get("cover") == ""
+    assert result["actor"] == [] and result["actor"] is not ScrapeResult()["actor"]
+    assert result["headers"] == {"referer": "http://x"}
+    assert result.get("missing") is None
+
+    result["tag"] = ["a"]
+    result["custom"] = 1
+    assert result.tag == ["a"]
+    assert result.extra == {"headers": {"referer": "http://x"}, "custom": 1}
+
+    dic = result.to_dict()
+    assert list(dic)[: len(FIELDS)] == list(FIELDS)
+    assert json.loads(result.to_json()) == dic
+    assert result == dic
+
+
+def test_to_dict_drops_document_references():
+    tree = etree.fromstring("<html><h1>T</h1><a>x</a></html>", etree.HTMLParser())
+    title = tree.xpath("//h1/text()")[0]
+    assert type(title) is not str
+    dic = ScrapeResult(title=title, tag=tree.xpath("//a/text()"), headers={"k": title}).to_dict()
+    assert type(dic["title"]) is str and type(dic["tag"][0]) is str and type(dic["headers"]["k"]) is str
+    assert utils.getTreeElement(tree, "//h1/text()") == "T"
+    assert type(utils.getTreeElement(tree, "//h1/text()")) is str
+
+
+def test_scraping_accepts_scrape_result_and_json():
+    class ResultParser:
+        def scrape(self, number, core):
+            return ScrapeResult(number=number, title="T", cover="c")
+
+    class JsonParser:
+        def scrape(self, number, core):
+            return json.dumps({"number": number, "title": "J"})
+
+    registry.register("test_result", ResultParser)
+    registry.register("test_json", JsonParser)
+    try:
+        scraper = Scraping()
+        data = scraper._scrape_source("test_result", "ABC-123")
+        assert type(data) is dict
+        assert data["title"] == "T" and data["actor"] == []
+        assert scraper._scrape_source("test_json", "ABC-123") == {"number": "ABC-123", "title": "J"}
+    finally:
+        registry._specs.pop("test_result", None)
+        registry._specs.pop("test_json", None)
+        registry.clear_cache()
@@ -0,0 +1,85 @@
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from mdc.scraping import storyline
+from mdc.scraping.parser import Parser
+from mdc.scraping.run_cache import RunCache, get_run_cache
+
+
+def make_response(status=200, content=b"<html><title>T</title></html>"):
+    response = requests.Response()
+    response.status_code = status
+    response.headers["Content-Type"] = "text/html; charset=utf-8"
+    response._content = content
+    return response
+
+
+def test_lru_limits_and_cookie_keys():
+    cache = RunCache(max_pages=2, max_results=2)
+    cache.put_page("http://a", None, make_response())
+    cache.put_page("http://b", {"k": "v"}, make_response())
+    cache.put_page("http://err", None, make_response(500))
+    assert cache.get_page("http://a") is not None
+    assert cache.get_page("http://b") is None
+    assert cache.get_page("http://err") is None
+    cache.put_page("http://c", None, make_response())
+    assert cache.get_page("http://b", {"k": "v"}) is None
+    assert cache.get_page("http://a") is not None
+
+    data = {"outline": "o", "tag": ["t"]}
+    cache.put_result("xcity", "abc-123", data)
+    # 修改保存时的和取出的结果都不影响缓存
+    data["tag"].append("changed")
+    cache.get_result("xcity", "ABC-123")["outline"] = "changed"
+    assert cache.get_result("xcity", " ABC-123 ") == {"outline": "o", "tag": ["t"]}
+
+
+def test_entries_expire():
+    cache = RunCache(max_age=60)
+    with patch("mdc.scraping.run_cache.time.monotonic", return_value=1000):
+        cache.put_result("xcity", "ABC-123", {"outline": "o"})
+    with patch("mdc.scraping.run_cache.time.monotonic", return_value=1059):
+        assert cache.get_result("xcity", "ABC-123") == {"outline": "o"}
+    with patch("mdc.scraping.run_cache.time.monotonic", return_value=1061):
+        assert cache.get_result("xcity", "ABC-123") is None
+
+
+def test_same_page_fetched_once_per_run():
+    get_run_cache().clear()
+    parser = Parser()
+    parser.init()
+    with patch("mdc.scraping.parser.httprequest.get", return_value=make_response()) as mock_get:
+        parser.getHtmlTree("http://example.test/detail")
+        other = Parser()
+        other.init()
+        assert "<title>T</title>" in other.getHtml("http://example.test/detail")
+    mock_get.assert_called_once()
+    get_run_cache().clear()
+
+
+def test_retry_and_error_pages_not_served_from_cache():
+    get_run_cache().clear()
+    parser = Parser()
+    parser.init()
+    challenge = make_response(content="<html>ネットワークの安全性をご確認ください。</html>".encode())
+    with patch("mdc.scraping.parser.httprequest.get", side_effect=[challenge, make_response()]) as mock_get:
+        # 验证页面不缓存, 其他实例重新获取
+        assert parser.getHtmlBytes("http://example.test/detail") == 403
+        other = Parser()
+        other.init()
+        assert other.getHtmlBytes("http://example.test/detail") != 403
+    assert mock_get.call_count == 2
+    with patch("mdc.scraping.parser.httprequest.get", return_value=make_response()) as mock_get:
+        # 同一次刮削中再次访问同一网址是重试, 不使用缓存
+        other.getHtmlBytes("http://example.test/detail")
+    mock_get.assert_called_once()
+    get_run_cache().clear()
+
+
+def test_storyline_uses_scraped_result():
+    get_run_cache().clear()
+    get_run_cache().put_result("xcity", "ABC-123", {"outline": "あらすじ", "title": "T"})
+    with patch.object(storyline, "Xcity", MagicMock(side_effect=AssertionError("should not scrape"))):
+        assert storyline.getStoryline_xcity("abc-123", False, None, None) == "あらすじ"
+    get_run_cache().clear()
@@ -0,0 +1,104 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+from mdc.scraping import storyline
+
+
+def make_config(run_mode=1, timeout=5):
+    conf = MagicMock()
+    conf.storyline_site.return_value = "airav,avno1,xcity"
+    conf.storyline_censored_site.return_value = ""
+    conf.storyline_mode.return_value = run_mode
+    conf.storyline_timeout.return_value = timeout
+    conf.debug.return_value = False
+    conf.multi_threading.return_value = False
+    conf.concurrent_movies.return_value = 1
+    return conf
+
+
+def test_returns_when_best_site_answers():
+    release = threading.Event()
+
+    def fake_mp(args):
+        site = args[0]
+        if site == "airav":
+            return "中文剧情简介"
+        release.wait(5)
+        return "其他站点简介"
+
+    with (
+        patch.object(storyline.config, "getInstance", return_value=make_config()),
+        patch.object(storyline, "getStoryline_mp", side_effect=fake_mp),
+    ):
+        start = time.monotonic()
+        assert storyline.getStoryline("ABC-123") == "中文剧情简介"
+        assert time.monotonic() - start < 2
+    release.set()
+
+
+def test_japanese_result_waits_for_lower_priority_and_timeout():
+    def fake_mp(args):
+        site = args[0]
+        if site == "airav":
+            return "日本語のあらすじです"
+        if site == "avno1":
+            time.sleep(1)
+            return "来得太晚的中文简介"
+        return ""
+
+    with (
+        patch.object(storyline.config, "getInstance", return_value=make_config(timeout=0.3)),
+        patch.object(storyline, "getStoryline_mp", side_effect=fake_mp),
+    ):
+        start = time.monotonic()
+        assert storyline.getStoryline("ABC-123") == "日本語のあらすじです"
+        assert time.monotonic() - start < 2
+
+
+def test_sequential_mode_stops_at_first_usable_site():
+    called = []
+
+    def fake_mp(args):
+        called.append(args[0])
+        return "中文剧情简介" if args[0] == "avno1" else ""
+
+    with (
+        patch.object(storyline.config, "getInstance", return_value=make_config(run_mode=0)),
+        patch.object(storyline, "getStoryline_mp", side_effect=fake_mp),
+    ):
+        assert storyline.getStoryline("ABC-123") == "中文剧情简介"
+    assert called == ["airav", "avno1"]
+
+
+def test_abandoned_sites_do_not_block_next_movie():
+    calls = []
+    release = threading.Event()
+
+    def fake_mp(args):
+        site, number = args[0], args[1]
+        calls.append((number, site))
+        if number.startswith("SLOW"):
+            release.wait(5)
+            return ""
+        time.sleep(0.2)
+        return "中文剧情简介" if site == "xcity" else ""
+
+    with (
+        patch.object(storyline.config, "getInstance", return_value=make_config(timeout=0.3)),
+        patch.object(storyline, "getStoryline_mp", side_effect=fake_mp),
+        patch.object(storyline, "_executor", None),
+        patch.object(storyline, "_slots", None),
+        patch.object(storyline, "_site_slots", None),
+    ):
+        assert storyline.getStoryline("SLOW-001") == ""
+        # 上一部影片超时放弃的查询还在运行, 下一部影片不等它们, 每个站点仍有完整的等待时间
+        start = time.monotonic()
+        assert storyline.getStoryline("ABC-123") == "中文剧情简介"
+        assert time.monotonic() - start < 0.5
+        # 每个站点放弃的查询数有上限, 达到上限后跳过该站点
+        assert storyline.getStoryline("SLOW-002") == ""
+        assert storyline.getStoryline("ABC-456") == ""
+        release.set()
+    assert sorted(site for number, site in calls if number == "ABC-123") == ["airav", "avno1", "xcity"]
+    assert not [site for number, site in calls if number == "ABC-456"]
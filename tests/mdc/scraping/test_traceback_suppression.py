@@ -1,5 +1,3 @@
-import json
-
 import mdc.scraping.parser as parser_mod
 from mdc.config import config as config_mod
 from mdc.scraping.parser import Parser
@@ -25,7 +23,7 @@ def test_known_scrape_error_no_traceback(monkeypatch):
 
         monkeypatch.setattr(parser_mod.traceback, "print_exception", _boom)
 
-        data = json.loads(parser.dictformat(None))
+        data = parser.dictformat(None)
         assert data["title"] == ""
     finally:
         conf.set_override("debug_mode:switch=0")
@@ -0,0 +1,39 @@
+import unittest
+from unittest.mock import PropertyMock, patch
+
+import requests
+
+from mdc.utils.http.request import detect_encoding
+
+
+def make_response(content: bytes, content_type: str = "text/html") -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = content_type
+    response._content = content
+    response._content_consumed = True
+    return response
+
+
+class TestDetectEncoding(unittest.TestCase):
+    def test_header_charset_skips_detection(self):
+        response = make_response("タイトル".encode("shift_jis"), "text/html; charset=Shift_JIS")
+        with patch.object(requests.Response, "apparent_encoding", new_callable=PropertyMock) as apparent:
+            self.assertEqual(detect_encoding(response), "Shift_JIS")
+            apparent.assert_not_called()
+
+    def test_meta_charset(self):
+        html = '<html><head><meta http-equiv="Content-Type" content="text/html; charset=EUC-JP"></head></html>'
+        self.assertEqual(detect_encoding(make_response(html.encode("ascii"))), "EUC-JP")
+        self.assertEqual(detect_encoding(make_response(b'<meta charset="utf-8">')), "utf-8")
+
+    def test_invalid_charset_falls_back_to_detection(self):
+        response = make_response("中文内容".encode("utf-8"), "text/html; charset=bogus")
+        with patch.object(requests.Response, "apparent_encoding", new_callable=PropertyMock) as apparent:
+            apparent.return_value = "utf-8"
+            self.assertEqual(detect_encoding(response), "utf-8")
+            apparent.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
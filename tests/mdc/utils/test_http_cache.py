@@ -0,0 +1,126 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from mdc.scraping.parser import Parser
+from mdc.scraping.run_cache import get_run_cache
+from mdc.utils.http.cache import HttpCache, parse_ttl_rules
+from mdc.utils.http.request import TimeoutHTTPAdapter
+
+
+def make_response(request, status=200, body=b"<html>ok</html>", headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers = requests.structures.CaseInsensitiveDict(
+        headers or {"Content-Type": "text/html; charset=utf-8", "ETag": '"v1"'}
+    )
+    response._content = body
+    response._content_consumed = True
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = HttpCache(self.tmp.name, ttl=3600, host_rules=[("javdb", 0)])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def prepare(self, url="https://www.javbus.com/ABC-123", cookies=None):
+        return requests.Request("GET", url, cookies=cookies).prepare()
+
+    def send(self, request, upstream):
+        adapter = TimeoutHTTPAdapter()
+        with (
+            patch("mdc.utils.http.request.get_http_cache", return_value=self.cache),
+            patch("mdc.utils.http.request.rate_limit"),
+            patch("requests.adapters.HTTPAdapter.send", side_effect=upstream) as mock_send,
+        ):
+            return adapter.send(request), mock_send
+
+    def test_fresh_entry_served_without_network(self):
+        request = self.prepare()
+        self.send(request, lambda req, **kw: make_response(req))
+        response, mock_send = self.send(self.prepare(), lambda req, **kw: make_response(req))
+        mock_send.assert_not_called()
+        self.assertEqual(response.text, "<html>ok</html>")
+
+    def test_cookies_are_part_of_key(self):
+        self.assertNotEqual(
+            HttpCache.key_for(self.prepare(cookies={"a": "1"})),
+            HttpCache.key_for(self.prepare(cookies={"a": "2"})),
+        )
+
+    def test_stale_entry_revalidated_with_etag(self):
+        self.send(self.prepare(), lambda req, **kw: make_response(req))
+        key = HttpCache.key_for(self.prepare())
+        meta, _ = self.cache.load(key)
+        meta["stored"] = 0
+        self.cache._write(self.cache._paths(key)[0], json.dumps(meta).encode())
+
+        seen = {}
+
+        def upstream(req, **kw):
+            seen["etag"] = req.headers.get("If-None-Match")
+            return make_response(req, status=304, body=b"")
+
+        response, _ = self.send(self.prepare(), upstream)
+        self.assertEqual(seen["etag"], '"v1"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"<html>ok</html>")
+        self.assertTrue(self.cache.is_fresh(self.cache.load(key)[0], self.prepare().url))
+
+    def test_host_ttl_zero_and_images_not_cached(self):
+        self.assertFalse(self.cache.cacheable(self.prepare("https://javdb.com/v/1")))
+        request = self.prepare("https://www.javbus.com/cover.jpg")
+        self.send(request, lambda req, **kw: make_response(req, headers={"Content-Type": "image/jpeg"}))
+        self.assertIsNone(self.cache.load(HttpCache.key_for(request)))
+
+    def test_challenge_page_discarded_by_parser(self):
+        challenge = "<html>ネットワークの安全性をご確認ください。</html>".encode()
+        request = self.prepare()
+        self.send(request, lambda req, **kw: make_response(req, body=challenge))
+        self.assertIsNotNone(self.cache.load(HttpCache.key_for(request)))
+
+        parser = Parser()
+        parser.init()
+        response, _ = self.send(self.prepare(), lambda req, **kw: make_response(req))
+        with (
+            patch("mdc.scraping.parser.httprequest.get", return_value=response),
+            patch("mdc.scraping.parser.get_http_cache", return_value=self.cache),
+        ):
+            get_run_cache().clear()
+            self.assertEqual(parser.getHtmlBytes(request.url), 403)
+        # 下次重新获取
+        self.assertIsNone(self.cache.load(HttpCache.key_for(request)))
+        response, mock_send = self.send(self.prepare(), lambda req, **kw: make_response(req))
+        mock_send.assert_called_once()
+        self.assertEqual(response.content, b"<html>ok</html>")
+
+    def test_lru_eviction(self):
+        self.cache.max_size = 250
+        urls = [f"https://www.javbus.com/{i}" for i in range(3)]
+        for i, url in enumerate(urls):
+            request = self.prepare(url)
+            self.cache.store(HttpCache.key_for(request), make_response(request, body=b"x" * 100))
+            os.utime(self.cache._paths(HttpCache.key_for(request))[1], (i, i))
+        request = self.prepare("https://www.javbus.com/3")
+        self.cache.store(HttpCache.key_for(request), make_response(request, body=b"x" * 100))
+        self.assertIsNone(self.cache.load(HttpCache.key_for(self.prepare(urls[0]))))
+        self.assertIsNotNone(self.cache.load(HttpCache.key_for(request)))
+
+
+class TestParseTtlRules(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_ttl_rules("javdb:12, bad, javbus:x"), [("javdb", 43200.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
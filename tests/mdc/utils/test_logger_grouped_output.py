@@ -0,0 +1,61 @@
+import logging
+import threading
+
+from mdc.utils.logger import get_logger, grouped_output, info
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_grouped_output_keeps_each_thread_contiguous():
+    logger = get_logger()
+    handler = _ListHandler()
+    old_level = logger.level
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    barrier = threading.Barrier(2)
+
+    def _work(name):
+        with grouped_output():
+            for i in range(3):
+                info(f"{name}-{i}")
+                if i == 0:
+                    barrier.wait()
+
+    try:
+        threads = [threading.Thread(target=_work, args=(n,)) for n in ("a", "b")]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(old_level)
+
+    assert len(handler.messages) == 6
+    first = handler.messages[0].split("-")[0].split()[-1]
+    assert [m.split()[-1] for m in handler.messages[:3]] == [f"{first}-{i}" for i in range(3)]
+
+
+def test_grouped_output_passes_through_outside_group():
+    logger = get_logger()
+    handler = _ListHandler()
+    old_level = logger.level
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    try:
+        with grouped_output():
+            info("buffered")
+            assert handler.messages == []
+        assert handler.messages == ["[*] buffered"]
+        info("direct")
+        assert handler.messages[-1] == "[*] direct"
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(old_level)
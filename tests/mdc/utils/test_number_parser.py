@@ -2,6 +2,7 @@ from mdc.utils.number_parser import (
     G_TAKE_NUM_RULES,
     get_number,
     get_number_by_dict,
+    get_number_prefix,
     is_number_equivalent,
     is_uncensored,
 )
@@ -112,3 +113,11 @@ class TestNumberParser:
         assert is_number_equivalent("GANA-1234", "200GANA-1234")
         assert not is_number_equivalent("200GANA-1234", "300GANA-1234")
         assert not is_number_equivalent("1PONDO-010101_001", "PONDO-010101_001")
+
+    def test_get_number_prefix(self):
+        """测试番号系列前缀"""
+        assert get_number_prefix("ssis-001") == "SSIS"
+        assert get_number_prefix("FC2-PPV-1234567") == "FC2"
+        assert get_number_prefix("300MAAN-797") == "MAAN"
+        assert get_number_prefix("HEYZO-1234") == "HEYZO"
+        assert get_number_prefix("020317_001") == "#6-3"
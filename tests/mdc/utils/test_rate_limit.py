@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from mdc.utils.http.rate_limit import HostRateLimiter, TokenBucket, parse_host_rules
+from mdc.utils.http.request import TimeoutHTTPAdapter
+
+
+class TestTokenBucket(unittest.TestCase):
+    @patch("mdc.utils.http.rate_limit.time")
+    def test_burst_then_wait(self, mock_time):
+        mock_time.monotonic.return_value = 100.0
+        bucket = TokenBucket(rate=2, burst=2)
+
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        # 令牌用完后按 rate 排队
+        self.assertAlmostEqual(bucket.reserve(), 0.5)
+        self.assertAlmostEqual(bucket.reserve(), 1.0)
+
+        # 时间推进后令牌恢复
+        mock_time.monotonic.return_value = 102.0
+        self.assertEqual(bucket.reserve(), 0.0)
+
+
+class TestHostRateLimiter(unittest.TestCase):
+    def test_rules_share_bucket_between_mirrors(self):
+        limiter = HostRateLimiter(1, 3, [("javdb", 0.5, 2)])
+        b1 = limiter.bucket_for("https://javdb565.com/search?q=ABC-123")
+        b2 = limiter.bucket_for("https://javdb.com/v/xyz")
+        b3 = limiter.bucket_for("https://www.javbus.com/ABC-123")
+        self.assertIs(b1, b2)
+        self.assertIsNot(b1, b3)
+        self.assertEqual(b1.rate, 0.5)
+        self.assertEqual(b3.burst, 3)
+
+    def test_zero_rate_is_unlimited(self):
+        limiter = HostRateLimiter(0, 1, [])
+        self.assertIsNone(limiter.bucket_for("https://example.com/"))
+        self.assertEqual(limiter.acquire("https://example.com/"), 0.0)
+
+    def test_parse_host_rules(self):
+        self.assertEqual(
+            parse_host_rules("javdb:0.5:2, javbus:1,bad,fanza:x:1"),
+            [("javdb", 0.5, 2), ("javbus", 1.0, 1)],
+        )
+
+
+class TestAdapterRateLimit(unittest.TestCase):
+    def send(self, adapter):
+        request = requests.Request("GET", "https://pics.dmm.co.jp/cover.jpg").prepare()
+        with (
+            patch("mdc.utils.http.request.get_http_cache", return_value=None),
+            patch("mdc.utils.http.request.rate_limit") as mock_limit,
+            patch("requests.adapters.HTTPAdapter.send", return_value=requests.Response()),
+        ):
+            adapter.send(request)
+        return mock_limit
+
+    def test_download_sessions_not_limited(self):
+        self.send(TimeoutHTTPAdapter()).assert_called_once()
+        # 图片和预告片下载不占用刮削网页的请求额度
+        self.send(TimeoutHTTPAdapter(rate_limited=False)).assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
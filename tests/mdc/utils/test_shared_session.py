@@ -0,0 +1,51 @@
+import http.client
+import unittest
+from types import SimpleNamespace
+
+import requests
+
+from mdc.utils.http.request import close_sessions, private_session, shared_session
+
+
+def set_cookie(session, value):
+    """与 Session.send 相同, 把响应的 Set-Cookie 记入 session.cookies"""
+    msg = http.client.HTTPMessage()
+    msg["Set-Cookie"] = value
+    request = requests.Request("GET", "http://example.com/").prepare()
+    requests.cookies.extract_cookies_to_jar(
+        session.cookies, request, SimpleNamespace(_original_response=SimpleNamespace(msg=msg))
+    )
+
+
+class TestSharedSession(unittest.TestCase):
+    def tearDown(self):
+        close_sessions()
+
+    def test_same_profile_reuses_session(self):
+        s1 = shared_session(cookies={"a": "1"}, timeout=10)
+        s2 = shared_session(cookies={"a": "1"}, timeout=10)
+        self.assertIs(s1, s2)
+        # http 和 https 共用同一个连接池
+        self.assertIs(s1.get_adapter("http://example.com"), s1.get_adapter("https://example.com"))
+
+    def test_different_profile_gets_new_session(self):
+        s1 = shared_session(cookies={"a": "1"}, timeout=10)
+        self.assertIsNot(s1, shared_session(cookies={"a": "2"}, timeout=10))
+        self.assertIsNot(s1, shared_session(cookies={"a": "1"}, ua="test-agent", timeout=10))
+        self.assertIsNot(s1, shared_session(cookies={"a": "1"}, timeout=10, verify=False))
+        self.assertIsNot(s1, shared_session(cookies={"a": "1"}, timeout=10, proxies={"http": "http://127.0.0.1:1"}))
+
+    def test_server_cookies_not_kept_by_shared_session(self):
+        session = shared_session(cookies={"a": "1"}, timeout=10)
+        set_cookie(session, "ASP.NET_SessionId=x; Path=/")
+        self.assertEqual(session.cookies.get_dict(), {"a": "1"})
+        # 表单等多步流程使用自己的 Session, 保持会话 cookies
+        private = private_session(cookies={"a": "1"}, timeout=10)
+        set_cookie(private, "ASP.NET_SessionId=x; Path=/")
+        self.assertEqual(private.cookies.get("ASP.NET_SessionId"), "x")
+        self.assertIsNot(private, private_session(cookies={"a": "1"}, timeout=10))
+        private.close()
+
+
+if __name__ == "__main__":
+    unittest.main()